@@ -1,96 +1,155 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 import pandas as pd
 import numpy as np
 import logging
-import re
+import os
+from agents.earnings import extract_earnings_batch, extract_earnings_details
+from agents.exposure import ClassificationIndex, ExposureBook
+from agents.indicators import IndicatorStore
 
 app = FastAPI()
 logging.basicConfig(level=logging.INFO)
 
+# Rolling indicator state, updated incrementally as bars arrive
+indicators = IndicatorStore(
+    window=int(os.getenv("INDICATOR_WINDOW", "252")),
+    fast_window=int(os.getenv("INDICATOR_FAST_MA", "20")),
+    slow_window=int(os.getenv("INDICATOR_SLOW_MA", "50")),
+    var_confidence=float(os.getenv("INDICATOR_VAR_CONFIDENCE", "0.95")),
+)
+
+# Symbol -> region/sector/currency, plus uploaded holdings and their daily exposure snapshots
+CLASSIFICATION_PATH = os.getenv("EXPOSURE_CLASSIFICATION_PATH", os.path.join(os.path.dirname(__file__), "classifications.csv"))
+classifications = ClassificationIndex()
+try:
+    classifications.load_csv(CLASSIFICATION_PATH)
+except OSError as e:
+    logging.error(f"[Analysis Agent] Failed to load classifications from {CLASSIFICATION_PATH}: {e}")
+exposure_book = ExposureBook(
+    classifications,
+    root=os.getenv("EXPOSURE_STATE_DIR", "exposure_state"),
+    snapshot_days=int(os.getenv("EXPOSURE_SNAPSHOT_DAYS", "30")),
+    write_delay=float(os.getenv("EXPOSURE_SNAPSHOT_WRITE_SECONDS", "5")),
+)
+DEFAULT_PORTFOLIO_ID = os.getenv("DEFAULT_PORTFOLIO_ID", "default")
+
 def is_asia_tech(ticker):
-    asia_exchanges = [".KS", ".TW", ".HK"]
-    return any(ticker.endswith(ext) for ext in asia_exchanges)
+    return classifications.is_asia_tech(ticker)
 
 def analyze_earnings_snippet(snippet):
-    snippet = snippet.lower()
-    if "beat" in snippet:
-        match = re.search(r"beat.*by\s*(\d+\.?\d*%)", snippet)
-        return f"beat earnings estimates by {match.group(1)}" if match else "beat earnings estimates"
-    elif "miss" in snippet:
-        match = re.search(r"miss.*by\s*(\d+\.?\d*%)", snippet)
-        return f"missed earnings estimates by {match.group(1)}" if match else "missed earnings estimates"
-    return "no earnings data"
-
-def compute_aum_allocation(api_data, tickers, query):
+    return extract_earnings_details(snippet)["summary"]
+
+class BarMatrix:
+    """
+    Close and volume bars for many tickers as (tickers x bars) arrays, built once per
+    request. Rows are right-aligned so the last column is every ticker's latest bar;
+    missing bars are NaN.
+    """
+    def __init__(self, api_data, tickers):
+        self.tickers = list(dict.fromkeys(tickers))
+        self.rows = {ticker: i for i, ticker in enumerate(self.tickers)}
+        series = [api_data.get(ticker) if isinstance(api_data.get(ticker), list) else [] for ticker in self.tickers]
+        depth = max((len(records) for records in series), default=0)
+        self.close = np.full((len(self.tickers), max(depth, 1)), np.nan)
+        self.volume = np.full_like(self.close, np.nan)
+        for i, records in enumerate(series):
+            for j, record in enumerate(records, start=self.close.shape[1] - len(records)):
+                try:
+                    self.close[i, j] = record["Close"]
+                    self.volume[i, j] = record["Volume"]
+                except (KeyError, TypeError) as e:
+                    logging.error(f"[Analysis Agent] Error processing {self.tickers[i]}: {e}")
+
+    def select(self, tickers):
+        return np.array([self.rows[t] for t in tickers if t in self.rows], dtype=int)
+
+    def latest_volume(self):
+        return self.volume[:, -1]
+
+    def change_percent(self):
+        """
+        Latest vs. previous close, in percent; NaN where there are fewer than two bars.
+        """
+        if self.close.shape[1] < 2:
+            return np.full(len(self.tickers), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (self.close[:, -1] - self.close[:, -2]) / self.close[:, -2] * 100
+
+    def volatility(self):
+        """
+        Standard deviation of daily log returns; NaN with fewer than two returns.
+        """
+        if self.close.shape[1] < 3:
+            return np.full(len(self.tickers), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_returns = np.diff(np.log(self.close), axis=1)
+        counts = np.sum(~np.isnan(log_returns), axis=1)
+        filled = np.where(np.isnan(log_returns), 0.0, log_returns)
+        mean = filled.sum(axis=1) / np.maximum(counts, 1)
+        squares = np.where(np.isnan(log_returns), 0.0, (log_returns - mean[:, None]) ** 2).sum(axis=1)
+        return np.where(counts >= 2, np.sqrt(squares / np.maximum(counts - 1, 1)), np.nan)
+
+def compute_aum_allocation(api_data, tickers, query, matrix=None, portfolio_id=DEFAULT_PORTFOLIO_ID):
     if "asia tech" not in query.lower():
         return {"percentage": "N/A", "change": "N/A", "direction": "N/A"}
 
-    # Assume a hypothetical portfolio of $1M
+    # Uploaded holdings give the real Asia tech weight and its change since the last snapshot
+    # The request's bars were pushed into the indicators already, so they price the book too
+    exposure = exposure_book.exposure(portfolio_id, indicators)
+    if exposure is not None:
+        asia_tech = exposure["asia_tech"]
+        if asia_tech["percentage"] is None:
+            return {"percentage": "0%", "change": "0%", "direction": "N/A"}
+        result = {
+            "percentage": f"{asia_tech['percentage']:.1f}%",
+            "change": "N/A" if asia_tech["change"] is None else f"{asia_tech['change']:+.1f}%",
+            "direction": asia_tech["direction"] or "N/A",
+        }
+        logging.info(f"[Analysis Agent] AUM allocation for {portfolio_id}: {result}")
+        return result
+
+    # No holdings uploaded: assume a hypothetical portfolio of $1M
     total_portfolio_value = 1_000_000
-    allocation = 0
     asia_tech_tickers = [t for t in tickers if is_asia_tech(t)]
 
     if not asia_tech_tickers:
         logging.info("[Analysis Agent] No Asia tech tickers found")
         return {"percentage": "0%", "change": "0%", "direction": "N/A"}
 
-    total_volume = 0
-    for ticker in asia_tech_tickers:
-        if ticker in api_data and api_data[ticker] and "error" not in api_data.get(ticker, {}):
-            try:
-                latest_data = api_data[ticker][-1]
-                volume = latest_data["Volume"]
-                total_volume += volume
-            except (IndexError, KeyError) as e:
-                logging.error(f"[Analysis Agent] Error processing {ticker}: {e}")
-                continue
+    matrix = matrix if matrix is not None else BarMatrix(api_data, tickers)
+    volumes = matrix.latest_volume()[matrix.select(asia_tech_tickers)]
+    volumes = volumes[~np.isnan(volumes)]
+    total_volume = volumes.sum()
 
     if total_volume == 0:
         return {"percentage": "0%", "change": "0%", "direction": "N/A"}
 
-    for ticker in asia_tech_tickers:
-        if ticker in api_data and api_data[ticker] and "error" not in api_data.get(ticker, {}):
-            try:
-                latest_data = api_data[ticker][-1]
-                volume = latest_data["Volume"]
-                # Allocate based on volume proportion
-                allocation += (volume / total_volume) * total_portfolio_value * 0.1  # 10% of portfolio to Asia tech
-            except (IndexError, KeyError) as e:
-                logging.error(f"[Analysis Agent] Error processing {ticker}: {e}")
-                continue
+    # Allocate based on volume proportion, 10% of portfolio to Asia tech
+    allocation = (volumes / total_volume).sum() * total_portfolio_value * 0.1
 
     percentage = (allocation / total_portfolio_value) * 100
-    # Simulate a small previous change for demonstration
-    previous_percentage = max(0, percentage - 0.3)
-    direction = "up" if percentage > previous_percentage else "down"
+    # There is no prior allocation for a hypothetical book, so no change to report
     result = {
         "percentage": f"{percentage:.1f}%",
-        "change": f"{percentage - previous_percentage:.1f}%",
-        "direction": direction
+        "change": "N/A",
+        "direction": "N/A"
     }
     logging.info(f"[Analysis Agent] AUM allocation: {result}")
     return result
 
-def compute_sentiment(api_data, earnings, tickers):
-    sentiment_score = 0
-    for ticker in tickers:
-        # Check earnings
-        if "miss" in earnings.get(ticker, "").lower():
-            sentiment_score -= 1
-        elif "beat" in earnings.get(ticker, "").lower():
-            sentiment_score += 1
-        # Check price movement
-        if ticker in api_data and api_data[ticker] and len(api_data[ticker]) >= 2:
-            try:
-                latest_close = api_data[ticker][-1]["Close"]
-                previous_close = api_data[ticker][-2]["Close"]
-                change_percent = ((latest_close - previous_close) / previous_close) * 100
-                if change_percent < -2:
-                    sentiment_score -= 1
-                elif change_percent > 2:
-                    sentiment_score += 1
-            except (IndexError, KeyError):
-                continue
+def compute_sentiment(api_data, earnings, tickers, matrix=None):
+    matrix = matrix if matrix is not None else BarMatrix(api_data, tickers)
+    # Earnings: -1 for a miss, +1 for a beat
+    earnings_text = [earnings.get(ticker, "").lower() for ticker in tickers]
+    earnings_score = np.array([-1 if "miss" in e else 1 if "beat" in e else 0 for e in earnings_text])
+    # Price movement: -1 below -2%, +1 above +2%
+    change = matrix.change_percent()[matrix.select(tickers)]
+    price_score = np.where(change < -2, -1, 0) + np.where(change > 2, 1, 0)
+    # Moving-average trend, once a symbol has enough history: -1 bearish, +1 bullish
+    trends = [(indicators.get(ticker) or {}).get("trend") for ticker in tickers]
+    trend_score = sum(1 if t == "bullish" else -1 if t == "bearish" else 0 for t in trends)
+    sentiment_score = int(earnings_score.sum() + price_score.sum() + trend_score)
 
     if sentiment_score < 0:
         return "negative"
@@ -99,6 +158,46 @@ def compute_sentiment(api_data, earnings, tickers):
     else:
         return "neutral"
 
+def compute_metrics(matrix, tickers):
+    rows = matrix.select(tickers)
+    change = matrix.change_percent()[rows]
+    volatility = matrix.volatility()[rows]
+    return {
+        matrix.tickers[row]: {
+            "change_percent": None if np.isnan(c) else round(float(c), 4),
+            "volatility": None if np.isnan(v) else round(float(v), 6),
+        }
+        for row, c, v in zip(rows, change, volatility)
+    }
+
+def extract_earnings(api_data, scrape_data, tickers):
+    """
+    Returns ({ticker: summary}, {ticker: details}). Scraped snippets for every ticker
+    are parsed in one batch; earnings already in the API data are passed through.
+    """
+    earnings = {}
+    to_parse = {}
+    for ticker in tickers:
+        # Check if API data includes earnings
+        if ticker in api_data and "earnings" in api_data[ticker]:
+            earnings[ticker] = api_data[ticker]["earnings"]
+        else:
+            to_parse[ticker] = [item.get("snippet", "") for item in scrape_data.get(ticker, []) if isinstance(item, dict)]
+    details = extract_earnings_batch(to_parse)
+    for ticker, parsed in details.items():
+        earnings[ticker] = parsed["summary"]
+    return earnings, details
+
+def analyze_portfolio(matrix, api_data, earnings, details, tickers, query, portfolio_id=DEFAULT_PORTFOLIO_ID):
+    return {
+        "aum": compute_aum_allocation(api_data, tickers, query, matrix, portfolio_id),
+        "earnings": {ticker: earnings[ticker] for ticker in tickers},
+        "earnings_details": {ticker: details[ticker] for ticker in tickers if ticker in details},
+        "sentiment": compute_sentiment(api_data, earnings, tickers, matrix),
+        "metrics": compute_metrics(matrix, tickers),
+        "risk": {ticker: indicators.get(ticker) for ticker in tickers},
+    }
+
 @app.get("/health")
 async def health():
     return {"status": "Analysis Agent is running"}
@@ -110,26 +209,104 @@ async def analyze_data(request: Request):
     scrape_data = body.get("scrape_data", {})
     tickers = body.get("tickers", [])
     query = body.get("query", "")
+    portfolio_id = body.get("portfolio_id", DEFAULT_PORTFOLIO_ID)
 
     if not tickers:
         logging.error("[Analysis Agent] No tickers provided")
         return {"error": "No tickers provided"}
 
-    aum_allocation = compute_aum_allocation(api_data, tickers, query)
-    earnings = {}
-    for ticker in tickers:
-        # Check if API data includes earnings
-        if ticker in api_data and "earnings" in api_data[ticker]:
-            earnings[ticker] = api_data[ticker]["earnings"]
-        else:
-            snippets = [item["snippet"] for item in scrape_data.get(ticker, [])]
-            earnings[ticker] = analyze_earnings_snippet(" ".join(snippets))
+    indicators.push_records({ticker: api_data.get(ticker) for ticker in tickers})
+    matrix = BarMatrix(api_data, tickers)
+    earnings, details = extract_earnings(api_data, scrape_data, tickers)
+    result = analyze_portfolio(matrix, api_data, earnings, details, tickers, query, portfolio_id)
+    logging.info(f"[Analysis Agent] Sentiment: {result['sentiment']}")
+    return result
 
-    sentiment = compute_sentiment(api_data, earnings, tickers)
-    logging.info(f"[Analysis Agent] Sentiment: {sentiment}")
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request):
+    """
+    Analyzes many portfolios against one shared set of bars: the bars and earnings are
+    converted once for the union of tickers, then each portfolio is a row selection.
+    """
+    body = await request.json()
+    api_data = body.get("api_data", {})
+    scrape_data = body.get("scrape_data", {})
+    portfolios = body.get("portfolios", [])
 
-    return {
-        "aum": aum_allocation,
-        "earnings": earnings,
-        "sentiment": sentiment
-    }
\ No newline at end of file
+    if not portfolios:
+        logging.error("[Analysis Agent] No portfolios provided")
+        return {"error": "No portfolios provided"}
+
+    all_tickers = list(dict.fromkeys(t for p in portfolios for t in p.get("tickers", [])))
+    indicators.push_records({ticker: api_data.get(ticker) for ticker in all_tickers})
+    matrix = BarMatrix(api_data, all_tickers)
+    earnings, details = extract_earnings(api_data, scrape_data, all_tickers)
+
+    results = []
+    for i, portfolio in enumerate(portfolios):
+        tickers = portfolio.get("tickers", [])
+        portfolio_id = portfolio.get("id", i)
+        if not tickers:
+            results.append({"id": portfolio_id, "error": "No tickers provided"})
+            continue
+        result = analyze_portfolio(matrix, api_data, earnings, details, tickers, portfolio.get("query", ""),
+                                   portfolio.get("portfolio_id", DEFAULT_PORTFOLIO_ID))
+        results.append({"id": portfolio_id, **result})
+
+    logging.info(f"[Analysis Agent] Analyzed {len(results)} portfolios over {len(all_tickers)} tickers")
+    return {"results": results}
+
+@app.post("/indicators/bars")
+async def push_bars(request: Request):
+    """
+    Applies new bars, {"bars": {ticker: [{"Date", "Close", ...}, ...]}}, to the rolling
+    indicators. Bars before a ticker's last applied timestamp are skipped; a bar with the
+    same timestamp replaces it, so the forming bar can be sent again as it updates.
+    """
+    body = await request.json()
+    bars = body.get("bars", {})
+    if not isinstance(bars, dict) or not bars:
+        logging.error("[Analysis Agent] No bars provided")
+        return {"error": "No bars provided"}
+    applied = indicators.push_records(bars)
+    logging.info(f"[Analysis Agent] Applied {sum(applied.values())} bars for {len(applied)} tickers")
+    return {"applied": applied}
+
+@app.get("/indicators")
+async def get_indicators(tickers: str = ""):
+    """
+    Current indicators for a comma-separated ticker list, or for every tracked ticker.
+    """
+    names = [t.strip() for t in tickers.split(",") if t.strip()] or list(indicators.symbols)
+    return {ticker: indicators.get(ticker) for ticker in names}
+
+@app.post("/portfolio/holdings")
+async def upload_holdings(request: Request):
+    """
+    Replaces a portfolio's holdings: {"portfolio_id", "holdings": [{"ticker", "quantity",
+    "price"?, "market_value"?}, ...]}. Positions without a price or market value are
+    priced from the latest close the agent has seen.
+    """
+    body = await request.json()
+    portfolio_id = body.get("portfolio_id", DEFAULT_PORTFOLIO_ID)
+    positions = body.get("holdings", [])
+    if not isinstance(positions, list) or not positions:
+        logging.error("[Analysis Agent] No holdings provided")
+        return {"error": "No holdings provided"}
+    try:
+        holdings = exposure_book.upload(portfolio_id, positions)
+    except ValueError as e:
+        logging.error(f"[Analysis Agent] Rejected holdings for {portfolio_id}: {e}")
+        return JSONResponse(status_code=422, content={"error": str(e)})
+    logging.info(f"[Analysis Agent] Stored {len(holdings.symbols)} positions for {portfolio_id}")
+    return {"portfolio_id": portfolio_id, "positions": len(holdings.symbols)}
+
+@app.get("/portfolio/exposure")
+async def get_exposure(portfolio_id: str = DEFAULT_PORTFOLIO_ID):
+    """
+    Exposure by region, sector and currency, with the change since the previous day's snapshot.
+    """
+    exposure = exposure_book.exposure(portfolio_id, indicators)
+    if exposure is None:
+        return {"error": f"No holdings for portfolio {portfolio_id}"}
+    return exposure
@@ -1,33 +1,129 @@
 # agents/api_agent.py
-import yfinance as yf
+import asyncio
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI
-import pandas as pd
+from data_ingestion.api_data_fetcher import ALPHA_API_KEY, fetch_alphavantage_fallback, get_stored_stock_data, update_stock_store
 
 app = FastAPI()
+logging.basicConfig(level=logging.INFO)
+
+# One batched store refresh per refresh window, run off the event loop
+REFRESH_WINDOW_SECONDS = float(os.getenv("MARKET_DATA_REFRESH_SECONDS", "60"))
+FETCH_WORKERS = int(os.getenv("MARKET_DATA_FETCH_WORKERS", "4"))
+executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="market-data")
+
+latest_bars = {}  # ticker -> (fetched_at, [bar])
+inflight = {}     # ticker -> future of the batch currently fetching it
+# Bumped whenever a ticker's latest bar changes; the boot id keeps versions from
+# before a restart from ever matching ones after it
+data_versions = {}  # ticker -> int
+BOOT_ID = uuid.uuid4().hex[:8]
+
+def latest_bar(records):
+    """
+    Returns the most recent row with a real close, guarding against zero-filled rows
+    for days a ticker's market was closed.
+    """
+    for row in reversed(records):
+        if row.get("Close"):
+            timestamp = row.get("Date", row.get("Datetime"))
+            return {
+                "Date": str(timestamp.date()) if hasattr(timestamp, "date") else str(timestamp),
+                "Open": float(row["Open"]),
+                "High": float(row["High"]),
+                "Low": float(row["Low"]),
+                "Close": float(row["Close"]),
+                "Volume": float(row["Volume"]),
+            }
+    return None
+
+async def fetch_batch(tickers):
+    # Delta-only refresh of the local bar store, then read the latest bars from it.
+    # The blocking yfinance and store calls run on the pool; the budgeted Alpha Vantage
+    # fallback runs on the loop, and tickers it defers are retried on the next refresh
+    loop = asyncio.get_running_loop()
+    failed = await loop.run_in_executor(executor, update_stock_store, tickers, "5d")
+    if failed and ALPHA_API_KEY:
+        await fetch_alphavantage_fallback(failed)
+    data = await loop.run_in_executor(executor, get_stored_stock_data, tickers, "5d")
+    bars = {}
+    for ticker in tickers:
+        records = data.get(ticker)
+        bar = latest_bar(records) if isinstance(records, list) else None
+        bars[ticker] = [bar] if bar else []
+    return bars
+
+def store_batch(future, tickers):
+    if not future.cancelled() and future.exception() is None:
+        fetched_at = time.monotonic()
+        for ticker, bars in future.result().items():
+            if bars:
+                previous = latest_bars.get(ticker)
+                if previous is None or previous[1] != bars:
+                    data_versions[ticker] = data_versions.get(ticker, 0) + 1
+                latest_bars[ticker] = (fetched_at, bars)
+    for ticker in tickers:
+        if inflight.get(ticker) is future:
+            del inflight[ticker]
+
+async def get_latest_bars(tickers):
+    """
+    Serves fresh tickers from memory, joins batches already fetching the others and
+    downloads whatever is left in one batched call, so each symbol is fetched at most
+    once per refresh window however many requests ask for it.
+    """
+    now = time.monotonic()
+    stock_data = {}
+    pending = {}
+    to_fetch = []
+    for ticker in dict.fromkeys(tickers):
+        cached = latest_bars.get(ticker)
+        if cached and now - cached[0] < REFRESH_WINDOW_SECONDS:
+            stock_data[ticker] = cached[1]
+        elif ticker in inflight:
+            pending[ticker] = inflight[ticker]
+        else:
+            to_fetch.append(ticker)
+
+    if to_fetch:
+        batch = asyncio.ensure_future(fetch_batch(to_fetch))
+        batch.add_done_callback(lambda future, batch_tickers=to_fetch: store_batch(future, batch_tickers))
+        for ticker in to_fetch:
+            inflight[ticker] = batch
+            pending[ticker] = batch
+
+    if pending:
+        await asyncio.wait(set(pending.values()))
+    for ticker, future in pending.items():
+        if future.exception() is not None:
+            logging.error(f"[API Agent] Fetch failed for {ticker}: {future.exception()}")
+            stock_data[ticker] = []
+        else:
+            stock_data[ticker] = future.result().get(ticker, [])
+    return stock_data
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    executor.shutdown(wait=False, cancel_futures=True)
+
+@app.get("/versions")
+async def versions(tickers: str = ""):
+    """
+    Market-data version per comma-separated ticker, without fetching anything: it
+    changes whenever the ticker's latest bar does, and is null until first fetched.
+    """
+    names = [t.strip() for t in tickers.split(",") if t.strip()]
+    return {"versions": {ticker: f"{BOOT_ID}-{data_versions[ticker]}" if ticker in data_versions else None
+                         for ticker in names}}
 
 @app.post("/run")
 async def run(tickers: dict):
     tickers_list = tickers.get("tickers", [])
-    stock_data = {}
-    for ticker in tickers_list:
-        try:
-            stock = yf.Ticker(ticker)
-            # Fetch the latest available data (intraday or last close)
-            hist = stock.history(period="5d")  # Last 5 days to ensure we get May 29
-            if not hist.empty:
-                latest_data = hist.iloc[-1]  # Get the most recent row
-                stock_data[ticker] = [
-                    {
-                        "Date": str(latest_data.name.date()),
-                        "Open": latest_data["Open"],
-                        "High": latest_data["High"],
-                        "Low": latest_data["Low"],
-                        "Close": latest_data["Close"],
-                        "Volume": latest_data["Volume"],
-                    }
-                ]
-            else:
-                stock_data[ticker] = []
-        except Exception as e:
-            stock_data[ticker] = []
-    return stock_data
\ No newline at end of file
+    if not tickers_list:
+        return {}
+    stock_data = await get_latest_bars(tickers_list)
+    return {ticker: stock_data.get(ticker, []) for ticker in tickers_list}
@@ -0,0 +1,120 @@
+import re
+
+# Text beyond this per ticker is ignored, so parsing cost stays bounded however much is scraped
+MAX_TEXT_CHARS = 20000
+MAX_SENTENCE_CHARS = 600
+
+# Sentence ends are punctuation followed by a capital or quote, so "Oct. 30" stays whole
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z\"'])|\n+")
+
+# One alternation of literal words, scanned once per sentence with finditer. There is no
+# `.*` anywhere: every alternative is a bounded token, so matching is linear in the text.
+# Price and ranking verbs (below, lagged, ahead of) are not surprise verbs at all; the
+# generic comparisons topped/tops/short of only count next to an estimate word.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<beat>\b(?:beat|beats|beating|exceeded|exceeds|surpassed|surpasses)\b)
+  | (?P<miss>\b(?:miss|missed|misses|missing|fell\ short|falls\ short)\b)
+  | (?P<weak_beat>\b(?:topped|tops)\b)
+  | (?P<weak_miss>\bshort\ of\b)
+  | (?P<estimate>\b(?:estimates?|expectations?|consensus|expected)\b)
+  | (?P<eps>\b(?:eps|earnings\ per\ share|per-share\ earnings|profit|earnings|net\ income)\b)
+  | (?P<revenue>\b(?:revenue|revenues|sales|top\ line|top-line|turnover)\b)
+  | (?P<guidance>\b(?:guidance|outlook|forecast|forecasts|projections?)\b)
+  | (?P<raised>\b(?:raised|raises|raising|lifted|lifts|boosted|boosts|hiked|hikes|upgraded|increased)\b)
+  | (?P<lowered>\b(?:lowered|lowers|cut|cuts|slashed|slashes|trimmed|trims|reduced|downgraded)\b)
+  | (?P<maintained>\b(?:maintained|maintains|reaffirmed|reaffirms|reiterated|reiterates|affirmed|unchanged)\b)
+  | (?P<magnitude>\bby\s{1,3}(?:\$\s?\d{1,6}(?:\.\d{1,4})?(?:\s?(?:billion|million|bn|mn|b|m)\b)?|\d{1,6}(?:\.\d{1,4})?\s?(?:%|percent\b|cents?\b)))
+  | (?P<period>\b(?:q[1-4]\s?(?:fy)?\s?'?\d{2,4}|q[1-4]|(?:first|second|third|fourth)[\s-]quarter|fiscal(?:\s(?:year|yr))?\s\d{4}|fy\s?'?\d{2,4})\b)
+  | (?P<date>\b(?:\d{4}-\d{2}-\d{2}|(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]{0,6}\.?\s\d{1,2}(?:,\s\d{4})?)\b)
+""", re.VERBOSE | re.IGNORECASE)
+
+GUIDANCE_DIRECTIONS = ("raised", "lowered", "maintained")
+
+def parse_magnitude(token):
+    value = token[2:].strip().lower()
+    if value.endswith("percent"):
+        value = value[:-len("percent")].strip() + "%"
+    return " ".join(value.split()).replace(" %", "%")
+
+def extract_sentence(sentence, result):
+    """
+    Folds one sentence's tokens into `result`. A beat/miss verb opens a surprise, which
+    takes the nearest metric (the last one seen, else the next one) and the first
+    "by X" magnitude that follows it. Surprises without an EPS or revenue metric in the
+    sentence are dropped, as are topped/short of without an estimate word.
+    """
+    metric = None
+    pending = None
+    surprises = []
+    guidance = False
+    direction = None
+    estimate = False
+    for match in TOKEN_PATTERN.finditer(sentence):
+        kind = match.lastgroup
+        text = match.group(kind).lower()
+        if kind in ("beat", "miss", "weak_beat", "weak_miss"):
+            pending = {"direction": kind.replace("weak_", ""), "weak": kind.startswith("weak_"),
+                       "metric": metric, "magnitude": None}
+            surprises.append(pending)
+        elif kind == "estimate":
+            estimate = True
+        elif kind in ("eps", "revenue"):
+            if pending is not None and pending["metric"] is None:
+                pending["metric"] = kind
+            metric = kind
+        elif kind == "magnitude":
+            if pending is not None and pending["magnitude"] is None:
+                pending["magnitude"] = parse_magnitude(text)
+        elif kind == "guidance":
+            guidance = True
+        elif kind in GUIDANCE_DIRECTIONS:
+            direction = direction or kind
+        elif kind == "period":
+            if text not in result["periods"]:
+                result["periods"].append(text)
+        elif kind == "date":
+            if text not in result["dates"]:
+                result["dates"].append(text)
+
+    if guidance and direction and result["guidance"] is None:
+        result["guidance"] = direction
+    for surprise in surprises:
+        if surprise["metric"] is None or (surprise["weak"] and not estimate):
+            continue
+        key = f"{surprise['metric']}_surprise"
+        current = result[key]
+        # Keep the first surprise per metric, but let a later one fill in a missing magnitude
+        if current is None or (current["magnitude"] is None and surprise["magnitude"]
+                               and current["direction"] == surprise["direction"]):
+            result[key] = {"direction": surprise["direction"], "magnitude": surprise["magnitude"]}
+
+def summarize(result):
+    """
+    The one-line summary the rest of the pipeline reads ("beat"/"missed" earnings estimates).
+    """
+    surprise = result["eps_surprise"] or result["revenue_surprise"]
+    if surprise is None:
+        return "no earnings data"
+    verb = "beat" if surprise["direction"] == "beat" else "missed"
+    magnitude = surprise["magnitude"]
+    if magnitude and magnitude.endswith("%"):
+        return f"{verb} earnings estimates by {magnitude}"
+    return f"{verb} earnings estimates"
+
+def extract_earnings_details(text):
+    result = {"eps_surprise": None, "revenue_surprise": None, "guidance": None, "periods": [], "dates": []}
+    for sentence in SENTENCE_SPLIT.split(text[:MAX_TEXT_CHARS]):
+        if sentence:
+            extract_sentence(sentence[:MAX_SENTENCE_CHARS], result)
+    result["summary"] = summarize(result)
+    return result
+
+def extract_earnings_batch(snippets_by_ticker):
+    """
+    Structured earnings details for every ticker's snippets in one call:
+    {ticker: {"summary", "eps_surprise", "revenue_surprise", "guidance", "periods", "dates"}}.
+    """
+    return {
+        ticker: extract_earnings_details(" ".join(s for s in snippets if s))
+        for ticker, snippets in snippets_by_ticker.items()
+    }
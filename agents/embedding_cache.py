@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+import numpy as np
+
+class EmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by whitespace- and case-normalised text (the
+    MiniLM tokenizer is uncased, so case never changes the embedding). Misses from one
+    call are encoded together in a single model call.
+    """
+    def __init__(self, encode, max_entries=1024):
+        self.encode = encode
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query):
+        return " ".join(query.lower().split())
+
+    def get_many(self, queries):
+        """
+        Returns a float32 (len(queries), dimension) array of embeddings.
+        """
+        keys = [self.key(query) for query in queries]
+        missing = list(dict.fromkeys(key for key in keys if key not in self.entries))
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        if missing:
+            for key, embedding in zip(missing, np.asarray(self.encode(missing), dtype=np.float32)):
+                self.entries[key] = embedding
+        embeddings = []
+        for key in keys:
+            self.entries.move_to_end(key)
+            embeddings.append(self.entries[key])
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return np.stack(embeddings)
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,311 @@
+import csv
+import json
+import logging
+import os
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DIMENSIONS = ("region", "sector", "currency")
+
+# Listing suffix -> (region, currency) for symbols without an explicit classification
+SUFFIX_CLASSIFICATION = {
+    ".KS": ("Asia", "KRW"), ".KQ": ("Asia", "KRW"),
+    ".TW": ("Asia", "TWD"), ".TWO": ("Asia", "TWD"),
+    ".HK": ("Asia", "HKD"), ".T": ("Asia", "JPY"),
+    ".SS": ("Asia", "CNY"), ".SZ": ("Asia", "CNY"),
+    ".NS": ("Asia", "INR"), ".BO": ("Asia", "INR"),
+    ".SI": ("Asia", "SGD"), ".AX": ("Asia", "AUD"),
+    ".L": ("Europe", "GBP"), ".DE": ("Europe", "EUR"), ".PA": ("Europe", "EUR"),
+    ".AS": ("Europe", "EUR"), ".MI": ("Europe", "EUR"), ".SW": ("Europe", "CHF"),
+    ".TO": ("North America", "CAD"),
+}
+DEFAULT_REGION = "North America"
+DEFAULT_CURRENCY = "USD"
+UNKNOWN_SECTOR = "Unknown"
+
+# What the "Asia tech" brief counts as tech
+ASIA_TECH_REGION = "Asia"
+ASIA_TECH_SECTORS = ("Technology", "Communication Services", "Internet Retail")
+# Unclassified listings on these exchanges are still assumed to be tech
+ASIA_TECH_SUFFIXES = (".KS", ".TW", ".HK")
+
+class ClassificationIndex:
+    """
+    Symbol -> (region, sector, currency) codes. Labels are interned per dimension so a
+    book's classifications are an (n x 3) int array ready for np.bincount. Symbols not
+    loaded explicitly are classified once from their listing suffix and cached.
+    """
+    def __init__(self):
+        self.labels = {dimension: [] for dimension in DIMENSIONS}
+        self.label_ids = {dimension: {} for dimension in DIMENSIONS}
+        self.codes = {}
+
+    def label_id(self, dimension, label):
+        ids = self.label_ids[dimension]
+        if label not in ids:
+            ids[label] = len(self.labels[dimension])
+            self.labels[dimension].append(label)
+        return ids[label]
+
+    def add(self, symbol, region=None, sector=None, currency=None):
+        symbol = symbol.strip().upper()
+        suffix = "." + symbol.rsplit(".", 1)[1] if "." in symbol else ""
+        default_region, default_currency = SUFFIX_CLASSIFICATION.get(suffix, (DEFAULT_REGION, DEFAULT_CURRENCY))
+        self.codes[symbol] = (
+            self.label_id("region", region or default_region),
+            self.label_id("sector", sector or UNKNOWN_SECTOR),
+            self.label_id("currency", currency or default_currency),
+        )
+        return self.codes[symbol]
+
+    def load_csv(self, path):
+        """
+        Loads `symbol,region,sector,currency` rows; empty fields fall back to the suffix rules.
+        """
+        count = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                self.add(row["symbol"], row.get("region"), row.get("sector"), row.get("currency"))
+                count += 1
+        logging.info(f"[Exposure] Loaded {count} symbol classifications from {path}")
+        return count
+
+    def classify(self, symbol):
+        codes = self.codes.get(symbol)
+        return codes if codes is not None else self.add(symbol)
+
+    def encode(self, symbols):
+        return np.array([self.classify(symbol) for symbol in symbols], dtype=np.int32).reshape(-1, len(DIMENSIONS))
+
+    def is_asia_tech(self, symbol):
+        region, sector, _ = self.classify(symbol)
+        sector = self.labels["sector"][sector]
+        if sector == UNKNOWN_SECTOR:
+            return symbol.endswith(ASIA_TECH_SUFFIXES)
+        return self.labels["region"][region] == ASIA_TECH_REGION and sector in ASIA_TECH_SECTORS
+
+def parse_number(value, name, default=np.nan):
+    """
+    A finite float from a JSON number or numeric string; `default` for null.
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be finite, got {value!r}")
+    return number
+
+class Holdings:
+    """
+    One uploaded book as parallel arrays. `values` holds explicit market values and is
+    NaN where a position is priced from `prices` or the latest close instead.
+    """
+    def __init__(self, symbols, quantities, prices, values, index):
+        self.symbols = symbols
+        self.quantities = quantities
+        self.prices = prices
+        self.values = values
+        self.codes = index.encode(symbols)
+        self.asia_tech = np.array([index.is_asia_tech(symbol) for symbol in symbols], dtype=bool)
+        # Positions in the IndicatorStore's close array, resolved once per new symbol there
+        self.close_rows = np.full(len(symbols), -1, dtype=np.int64)
+        self.close_rows_seen = 0
+
+    @classmethod
+    def from_positions(cls, positions, index):
+        """
+        Builds holdings from uploaded positions. Raises ValueError naming the first
+        position that is not an object or has a non-numeric quantity, price or market value.
+        """
+        symbols, quantities, prices, values = [], [], [], []
+        for i, position in enumerate(positions):
+            if not isinstance(position, dict):
+                raise ValueError(f"Position {i} is not an object")
+            symbol = str(position.get("ticker") or position.get("symbol") or "").strip().upper()
+            if not symbol:
+                continue
+            symbols.append(symbol)
+            quantities.append(parse_number(position.get("quantity"), f"Position {i} ({symbol}) quantity", default=0.0))
+            prices.append(parse_number(position.get("price"), f"Position {i} ({symbol}) price"))
+            values.append(parse_number(position.get("market_value"), f"Position {i} ({symbol}) market_value"))
+        return cls(symbols, np.array(quantities, dtype=float), np.array(prices, dtype=float),
+                   np.array(values, dtype=float), index)
+
+    def to_json(self):
+        return {
+            "symbols": self.symbols,
+            "quantities": self.quantities.tolist(),
+            "prices": [None if np.isnan(p) else p for p in self.prices.tolist()],
+            "values": [None if np.isnan(v) else v for v in self.values.tolist()],
+        }
+
+    @classmethod
+    def from_json(cls, data, index):
+        as_array = lambda items: np.array([np.nan if x is None else x for x in items], dtype=float)
+        return cls(data["symbols"], np.array(data["quantities"], dtype=float), as_array(data["prices"]),
+                   as_array(data["values"]), index)
+
+    def market_values(self, closes):
+        """
+        Explicit market values, else quantity x (uploaded price, else the latest close in
+        the `closes` IndicatorStore). Positions with no price at all count as zero.
+        """
+        prices = self.prices.copy()
+        missing = np.isnan(prices) & np.isnan(self.values)
+        if missing.any():
+            if self.close_rows_seen != len(closes.rows):
+                unresolved = np.flatnonzero(missing & (self.close_rows < 0))
+                self.close_rows[unresolved] = closes.row_ids([self.symbols[i] for i in unresolved])
+                self.close_rows_seen = len(closes.rows)
+            prices[missing] = closes.closes_at(self.close_rows[missing])
+        values = np.where(np.isnan(self.values), self.quantities * prices, self.values)
+        return np.nan_to_num(values, nan=0.0)
+
+class ExposureBook:
+    """
+    Uploaded holdings per portfolio plus one exposure snapshot per portfolio per day,
+    persisted under `root` so day-over-day change survives restarts. Today's snapshot
+    always holds the latest exposure; changes are written out on a background thread at
+    most once per `write_delay` seconds.
+    """
+    def __init__(self, index, root, snapshot_days=30, write_delay=5.0):
+        self.index = index
+        self.root = root
+        self.snapshot_days = snapshot_days
+        self.write_delay = write_delay
+        self.holdings = {}
+        self.snapshots = {}
+        self.lock = threading.Lock()
+        self.write_pending = False
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exposure-writer")
+        self.load()
+
+    def holdings_path(self, portfolio_id):
+        return os.path.join(self.root, f"{re.sub(r'[^A-Za-z0-9_-]', '_', portfolio_id)}.holdings.json")
+
+    @property
+    def snapshots_path(self):
+        return os.path.join(self.root, "snapshots.json")
+
+    def load(self):
+        if not os.path.isdir(self.root):
+            return
+        try:
+            if os.path.exists(self.snapshots_path):
+                with open(self.snapshots_path, encoding="utf-8") as f:
+                    self.snapshots = json.load(f)
+            for name in os.listdir(self.root):
+                if name.endswith(".holdings.json"):
+                    with open(os.path.join(self.root, name), encoding="utf-8") as f:
+                        data = json.load(f)
+                    self.holdings[data["portfolio_id"]] = Holdings.from_json(data, self.index)
+            logging.info(f"[Exposure] Loaded {len(self.holdings)} portfolios from {self.root}")
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"[Exposure] Failed to load {self.root}: {e}")
+
+    def write_json(self, path, data):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"[Exposure] Failed to save {path}: {e}")
+
+    def upload(self, portfolio_id, positions):
+        holdings = Holdings.from_positions(positions, self.index)
+        self.holdings[portfolio_id] = holdings
+        self.write_json(self.holdings_path(portfolio_id), {"portfolio_id": portfolio_id, **holdings.to_json()})
+        return holdings
+
+    def exposure(self, portfolio_id, closes, day=None):
+        """
+        Aggregates the book by region, sector and currency in one np.bincount per
+        dimension, records today's snapshot and reports the change against the most
+        recent earlier day. Returns None for an unknown portfolio.
+        """
+        holdings = self.holdings.get(portfolio_id)
+        if holdings is None:
+            return None
+        day = day or time.strftime("%Y-%m-%d")
+        values = holdings.market_values(closes)
+        total = float(values.sum())
+
+        snapshot = {"total": total}
+        for column, dimension in enumerate(DIMENSIONS):
+            labels = self.index.labels[dimension]
+            sums = np.bincount(holdings.codes[:, column], weights=values, minlength=len(labels))
+            snapshot[dimension] = {labels[i]: float(sums[i]) for i in np.flatnonzero(sums)}
+
+        snapshot["asia_tech"] = float(values[holdings.asia_tech].sum())
+
+        previous_day, previous = self.previous_snapshot(portfolio_id, day)
+        self.record(portfolio_id, day, snapshot)
+
+        result = {"portfolio_id": portfolio_id, "date": day, "total_value": round(total, 2),
+                  "positions": len(holdings.symbols), "previous_date": previous_day}
+        for dimension in (*DIMENSIONS, "asia_tech"):
+            result[dimension] = self.describe(snapshot, previous, dimension)
+        return result
+
+    def describe(self, snapshot, previous, dimension):
+        def percentage(snap, label=None):
+            if not snap or not snap["total"]:
+                return None
+            value = snap[dimension] if label is None else snap[dimension].get(label, 0.0)
+            return value / snap["total"] * 100
+
+        def entry(value, current, prior):
+            change = None if current is None or prior is None else round(current - prior, 2)
+            return {
+                "value": round(value, 2),
+                "percentage": None if current is None else round(current, 2),
+                "change": change,
+                "direction": None if change is None else "up" if change > 0 else "down" if change < 0 else "flat",
+            }
+
+        if dimension == "asia_tech":
+            return entry(snapshot[dimension], percentage(snapshot), percentage(previous))
+        labels = set(snapshot[dimension]) | set((previous or {}).get(dimension, {}))
+        return {label: entry(snapshot[dimension].get(label, 0.0), percentage(snapshot, label), percentage(previous, label))
+                for label in sorted(labels)}
+
+    def previous_snapshot(self, portfolio_id, day):
+        days = [d for d in self.snapshots.get(portfolio_id, {}) if d < day]
+        if not days:
+            return None, None
+        latest = max(days)
+        return latest, self.snapshots[portfolio_id][latest]
+
+    def record(self, portfolio_id, day, snapshot):
+        with self.lock:
+            history = self.snapshots.setdefault(portfolio_id, {})
+            if history.get(day) == snapshot:
+                return
+            history[day] = snapshot
+            for old in sorted(history)[:-self.snapshot_days]:
+                del history[old]
+            if self.write_pending:
+                return
+            self.write_pending = True
+        self.writer.submit(self.save_snapshots)
+
+    def save_snapshots(self):
+        # Debounced: everything recorded during the delay goes out in this one write
+        time.sleep(self.write_delay)
+        with self.lock:
+            self.write_pending = False
+            # Snapshots are replaced, never mutated, so a two-level copy is safe to write
+            snapshots = {pid: dict(days) for pid, days in self.snapshots.items()}
+        self.write_json(self.snapshots_path, snapshots)
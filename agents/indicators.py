@@ -0,0 +1,280 @@
+import bisect
+import logging
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+class RollingWindow:
+    """
+    Fixed-size ring buffer with a running sum and sum of squares, so the mean and
+    standard deviation of the last `size` values cost O(1) per push.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.values = np.zeros(size)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, value):
+        """
+        Adds `value` and returns the value it evicted, or None while the window fills.
+        """
+        evicted = None
+        if self.count == self.size:
+            evicted = float(self.values[self.index])
+            self.total -= evicted
+            self.total_sq -= evicted * evicted
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.total_sq += value * value
+        self.index = (self.index + 1) % self.size
+        if self.index == 0:
+            # Once per lap, re-sum the buffer so floating-point drift cannot accumulate
+            self.total = float(self.values.sum())
+            self.total_sq = float(np.dot(self.values, self.values))
+        return evicted
+
+    def replace_last(self, value):
+        """
+        Overwrites the most recently pushed value; returns the value it replaced.
+        """
+        last = (self.index - 1) % self.size
+        old = float(self.values[last])
+        self.values[last] = value
+        self.total += value - old
+        self.total_sq += value * value - old * old
+        return old
+
+    def full(self):
+        return self.count == self.size
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def std(self):
+        if self.count < 2:
+            return None
+        variance = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+def timestamp_ns(value):
+    """
+    Bar timestamp (epoch ns, Timestamp, datetime or date string) as UTC nanoseconds,
+    so differently formatted stamps of the same bar compare equal.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp.value
+
+class SymbolIndicators:
+    """
+    Rolling risk state for one symbol, updated one bar at a time: log-return volatility,
+    drawdown from the rolling peak, historical VaR and a fast/slow moving-average crossover.
+    A bar stamped like the last one replaces it, so a still-forming bar can be updated
+    tick by tick; what the last bar changed is kept so it can be undone.
+    """
+    def __init__(self, window, fast_window, slow_window, var_confidence):
+        self.window = window
+        self.var_confidence = var_confidence
+        self.returns = RollingWindow(window)
+        self.sorted_returns = []
+        self.fast = RollingWindow(fast_window)
+        self.slow = RollingWindow(slow_window)
+        self.peaks = deque()      # (sequence, close), monotonic decreasing closes within the window
+        self.sequence = 0
+        self.previous_close = None
+        self.last_close = None
+        self.last_timestamp = None
+        self.max_drawdown = 0.0
+        self.trend = None
+        self.last_crossover = None
+        self.undo = None
+
+    def update(self, close, timestamp=None):
+        """
+        Applies one bar. Bars stamped before the last applied one are ignored so replayed
+        snapshots do not double count; one stamped the same replaces it. Returns True if
+        the bar was applied.
+        """
+        if close is None or not close > 0:
+            return False
+        if timestamp is not None:
+            timestamp = timestamp_ns(timestamp)
+            if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+                if timestamp < self.last_timestamp or self.undo is None:
+                    return False
+                self.revert()
+            self.last_timestamp = timestamp
+
+        undo = {"max_drawdown": self.max_drawdown, "trend": self.trend, "last_crossover": self.last_crossover,
+                "expired_peaks": [], "popped_peaks": [], "evicted_return": None, "fast": None, "slow": None}
+        if self.last_close is not None:
+            log_return = math.log(close / self.last_close)
+            evicted = self.returns.push(log_return)
+            if evicted is not None:
+                del self.sorted_returns[bisect.bisect_left(self.sorted_returns, evicted)]
+            bisect.insort(self.sorted_returns, log_return)
+            undo["log_return"] = log_return
+            undo["evicted_return"] = evicted
+        self.previous_close = self.last_close
+        self.last_close = close
+
+        # Rolling peak with a monotonic deque: amortized O(1) max over the window
+        self.sequence += 1
+        while self.peaks and self.peaks[-1][1] <= close:
+            undo["popped_peaks"].append(self.peaks.pop())
+        self.peaks.append((self.sequence, close))
+        while self.peaks[0][0] <= self.sequence - self.window:
+            undo["expired_peaks"].append(self.peaks.popleft())
+        self.max_drawdown = min(self.max_drawdown, self.drawdown())
+
+        undo["fast"] = self.fast.push(close)
+        undo["slow"] = self.slow.push(close)
+        if self.slow.full():
+            trend = "bullish" if self.fast.mean() > self.slow.mean() else "bearish"
+            if self.trend is not None and trend != self.trend:
+                at = None if timestamp is None else pd.Timestamp(timestamp).isoformat()
+                self.last_crossover = {"type": "golden" if trend == "bullish" else "death", "at": at}
+            self.trend = trend
+        self.undo = undo
+        return True
+
+    def revert(self):
+        """
+        Takes the last bar back out, restoring the state from before it.
+        """
+        undo = self.undo
+        if "log_return" in undo:
+            self.returns.replace_last(undo["evicted_return"] or 0.0)
+            del self.sorted_returns[bisect.bisect_left(self.sorted_returns, undo["log_return"])]
+            if undo["evicted_return"] is None:
+                # The window was still filling: the slot goes back to being empty
+                self.returns.index = (self.returns.index - 1) % self.returns.size
+                self.returns.count -= 1
+            else:
+                self.returns.index = (self.returns.index - 1) % self.returns.size
+                bisect.insort(self.sorted_returns, undo["evicted_return"])
+        self.last_close = self.previous_close
+
+        self.peaks.pop()
+        self.peaks.extend(reversed(undo["popped_peaks"]))
+        self.peaks.extendleft(reversed(undo["expired_peaks"]))
+        self.sequence -= 1
+
+        for window, evicted in ((self.fast, undo["fast"]), (self.slow, undo["slow"])):
+            window.replace_last(evicted or 0.0)
+            window.index = (window.index - 1) % window.size
+            if evicted is None:
+                window.count -= 1
+        self.max_drawdown = undo["max_drawdown"]
+        self.trend = undo["trend"]
+        self.last_crossover = undo["last_crossover"]
+        self.undo = None
+
+    def drawdown(self):
+        if not self.peaks:
+            return 0.0
+        return self.last_close / self.peaks[0][1] - 1
+
+    def value_at_risk(self):
+        """
+        Historical VaR of one-day log returns at `var_confidence`, as a positive loss.
+        """
+        if len(self.sorted_returns) < 2:
+            return None
+        index = int((1 - self.var_confidence) * (len(self.sorted_returns) - 1))
+        return max(0.0, -self.sorted_returns[index])
+
+    def snapshot(self):
+        volatility = self.returns.std()
+        var = self.value_at_risk()
+        return {
+            "bars": self.sequence,
+            "last_close": self.last_close,
+            "volatility": None if volatility is None else round(volatility, 6),
+            "annualized_volatility": None if volatility is None else round(volatility * math.sqrt(252), 6),
+            "drawdown": round(self.drawdown(), 6),
+            "max_drawdown": round(self.max_drawdown, 6),
+            "value_at_risk": None if var is None else round(var, 6),
+            "fast_ma": None if self.fast.mean() is None else round(self.fast.mean(), 4),
+            "slow_ma": None if self.slow.mean() is None else round(self.slow.mean(), 4),
+            "trend": self.trend,
+            "last_crossover": self.last_crossover,
+        }
+
+class IndicatorStore:
+    """
+    Per-symbol indicator state, created on first use. The latest close of every symbol
+    is also kept in one array (`rows` maps symbol -> position), so a whole book can be
+    priced with a single fancy-indexing lookup.
+    """
+    def __init__(self, window=252, fast_window=20, slow_window=50, var_confidence=0.95):
+        self.window = window
+        self.fast_window = fast_window
+        self.slow_window = slow_window
+        self.var_confidence = var_confidence
+        self.symbols = {}
+        self.rows = {}
+        self.closes = np.full(64, np.nan)
+
+    def push(self, ticker, close, timestamp=None):
+        state = self.symbols.get(ticker)
+        if state is None:
+            state = self.symbols[ticker] = SymbolIndicators(self.window, self.fast_window, self.slow_window, self.var_confidence)
+            self.rows[ticker] = len(self.rows)
+            if len(self.rows) > len(self.closes):
+                self.closes = np.concatenate([self.closes, np.full(len(self.closes), np.nan)])
+        applied = state.update(close, timestamp)
+        if applied:
+            self.closes[self.rows[ticker]] = state.last_close
+        return applied
+
+    def row_ids(self, tickers):
+        """
+        Close-array positions of `tickers`, -1 for tickers never seen. Positions never
+        change, so callers may keep them and only re-resolve the -1s once more
+        symbols are tracked (`len(store.rows)` grows).
+        """
+        get = self.rows.get
+        return np.array([get(ticker, -1) for ticker in tickers], dtype=np.int64)
+
+    def closes_at(self, rows):
+        """
+        Latest closes at `row_ids` positions, NaN at -1.
+        """
+        closes = self.closes[rows]
+        closes[rows < 0] = np.nan
+        return closes
+
+    def push_records(self, bars):
+        """
+        Applies {ticker: [{"Date"/"Datetime", "Close", ...}, ...]} in order and returns the
+        number of bars applied per ticker.
+        """
+        applied = {}
+        for ticker, records in bars.items():
+            if not isinstance(records, list):
+                continue
+            count = 0
+            for record in records:
+                if not isinstance(record, dict):
+                    continue
+                try:
+                    count += self.push(ticker, record.get("Close"), record.get("Date", record.get("Datetime")))
+                except (ValueError, TypeError) as e:
+                    logging.error(f"[Indicators] Skipped a {ticker} bar with an unreadable timestamp: {e}")
+            applied[ticker] = count
+        return applied
+
+    def get(self, ticker):
+        state = self.symbols.get(ticker)
+        return state.snapshot() if state else None
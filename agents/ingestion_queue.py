@@ -0,0 +1,198 @@
+import collections
+import itertools
+import logging
+import threading
+import time
+import uuid
+
+import numpy as np
+
+class IngestionJob:
+    def __init__(self, job_id, chunks, sources, tickers):
+        self.id = job_id
+        self.chunks = chunks
+        self.sources = sources
+        self.tickers = tickers
+        self.total = len(chunks)
+        self.indexed = 0
+        self.duplicates = 0
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total_chunks": self.total,
+            "indexed_chunks": self.indexed,
+            "duplicate_chunks": self.duplicates,
+            "progress": round((self.indexed + self.duplicates) / self.total, 4) if self.total else 1.0,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class IngestionQueue:
+    """
+    Background embedding for /index. Jobs are queued as chunk lists; one worker thread
+    drains them in FIFO order, packing chunks from consecutive jobs into micro-batches.
+    Chunks whose content is already stored (or repeated within the batch) are counted
+    and skipped before encoding, and only linked to the job's sources and tickers. The rest of each micro-batch is encoded outside any
+    lock and committed with a single `store.add`, so a batch is either fully
+    searchable or (after a crash) replayed or absent, never half there.
+
+    The batch size adapts so one batch takes about `target_seconds` to encode: large
+    enough to amortise per-call overhead, short enough that queries sharing the CPU
+    and the store are never held up for long.
+    """
+    def __init__(self, store, encode, target_seconds=0.25, min_batch=8, max_batch=512, history=1000):
+        self.store = store
+        self.encode = encode
+        self.target_seconds = target_seconds
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.batch_size = min_batch
+        self.history = history
+        self.jobs = collections.OrderedDict()
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.worker = None
+        self.stopping = False
+
+    def start(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, name="retriever-ingestion", daemon=True)
+            self.worker.start()
+
+    def stop(self, timeout=None):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.worker is not None:
+            self.worker.join(timeout)
+
+    def submit(self, chunks, sources, tickers=None):
+        """
+        Queues chunks with their sources; `tickers` maps sources to the tickers they cover.
+        """
+        job = IngestionJob(uuid.uuid4().hex, list(chunks), list(sources), tickers or {})
+        with self.condition:
+            self.jobs[job.id] = job
+            if job.total:
+                self.pending.append(job)
+            else:
+                job.started_at = job.created_at
+                self.finish(job, "done")
+            self.forget_finished()
+            self.condition.notify()
+        return job
+
+    def get(self, job_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def backlog(self):
+        with self.condition:
+            return sum(job.total - job.indexed - job.duplicates for job in self.pending)
+
+    def forget_finished(self):
+        # Keep the newest `history` jobs; queued and running ones are never dropped
+        excess = len(self.jobs) - self.history
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at][:max(0, excess)]:
+            del self.jobs[job_id]
+
+    def next_batch(self):
+        """
+        Takes up to `batch_size` chunks from the front of the queue, spanning jobs.
+        Returns [(job, start, end)] slices.
+        """
+        slices = []
+        room = self.batch_size
+        for job in self.pending:
+            if room <= 0:
+                break
+            start = job.indexed + job.duplicates
+            end = min(job.total, start + room)
+            if end > start:
+                slices.append((job, start, end))
+                room -= end - start
+        return slices
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                slices = self.next_batch()
+                for job, _, _ in slices:
+                    if job.status == "queued":
+                        job.status = "running"
+                        job.started_at = time.time()
+            self.process(slices)
+
+    def process(self, slices):
+        texts = list(itertools.chain.from_iterable(job.chunks[start:end] for job, start, end in slices))
+        sources = list(itertools.chain.from_iterable(job.sources[start:end] for job, start, end in slices))
+        tickers = {}
+        for job, _, _ in slices:
+            tickers.update(job.tickers)
+        try:
+            keep = self.store.unseen(texts)
+            started = time.perf_counter()
+            if keep:
+                kept_sources = [sources[i] for i in keep]
+                embeddings = np.asarray(self.encode([texts[i] for i in keep]), dtype=np.float32)
+                self.store.add(embeddings, [texts[i] for i in keep], kept_sources,
+                               {source: tickers[source] for source in set(kept_sources) if source in tickers})
+            elapsed = time.perf_counter() - started
+            if len(keep) < len(texts):
+                # Duplicates still join this job's sources and tickers
+                kept = set(keep)
+                duplicates = [i for i in range(len(texts)) if i not in kept]
+                duplicate_sources = [sources[i] for i in duplicates]
+                self.store.link([texts[i] for i in duplicates], duplicate_sources,
+                                {source: tickers[source] for source in set(duplicate_sources) if source in tickers})
+        except Exception as e:
+            logging.error(f"[Retriever Ingestion] Batch of {len(texts)} chunks failed: {e}")
+            with self.condition:
+                for job, _, _ in slices:
+                    self.finish(job, "failed", str(e))
+            return
+        if keep:
+            self.adapt(len(keep), elapsed)
+        kept = set(keep)
+        with self.condition:
+            offset = 0
+            for job, start, end in slices:
+                new = sum(1 for i in range(offset, offset + end - start) if i in kept)
+                job.indexed += new
+                job.duplicates += end - start - new
+                offset += end - start
+                if job.indexed + job.duplicates >= job.total:
+                    self.finish(job, "done")
+
+    def adapt(self, size, elapsed):
+        # Aim the next batch at target_seconds, moving at most 2x per step
+        if elapsed <= 0:
+            return
+        ideal = size * self.target_seconds / elapsed
+        ideal = min(max(ideal, self.batch_size / 2), self.batch_size * 2)
+        self.batch_size = int(min(max(ideal, self.min_batch), self.max_batch))
+
+    def finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.chunks = job.sources = job.tickers = None
+        if job in self.pending:
+            self.pending.remove(job)
+        if status == "done":
+            logging.info(f"[Retriever Ingestion] Job {job.id} indexed {job.indexed} chunks, skipped {job.duplicates} duplicates "
+                         f"in {job.finished_at - job.started_at:.1f}s")
@@ -1,7 +1,9 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
 from google import generativeai as genai
 from dotenv import load_dotenv
 import os
+import json
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
@@ -18,13 +20,11 @@ For other queries, provide a concise, analytical response based on the provided
 async def health():
     return {"status": "Language Agent is running"}
 
-@app.post("/generate")
-async def generate_response(request: Request):
-    data = await request.json()
+def build_prompt(data):
     user_prompt = data.get("prompt", "")
     analysis_data = data.get("analysis_data", {})
-    
-    formatted_prompt = f"""
+
+    return f"""
     {system_prompt}
     
     User Query: {user_prompt}
@@ -34,10 +34,33 @@ async def generate_response(request: Request):
     Earnings: {analysis_data.get('earnings', {})}
     Sentiment: {analysis_data.get('sentiment', 'unknown')}
     """
+
+@app.post("/generate")
+async def generate_response(request: Request):
+    data = await request.json()
+    formatted_prompt = build_prompt(data)
     
     try:
         model = genai.GenerativeModel("gemini-1.5-flash")
         response = model.generate_content(formatted_prompt)
         return {"response": response.text}
     except Exception as e:
-        return {"response": f"Gemini generation failed: {str(e)}"}
\ No newline at end of file
+        return {"response": f"Gemini generation failed: {str(e)}"}
+
+@app.post("/generate/stream")
+async def generate_stream(request: Request):
+    data = await request.json()
+    formatted_prompt = build_prompt(data)
+
+    # Sync generator: Starlette iterates it in a worker thread, so the
+    # blocking Gemini stream does not hold the event loop.
+    def events():
+        try:
+            model = genai.GenerativeModel("gemini-1.5-flash")
+            for chunk in model.generate_content(formatted_prompt, stream=True):
+                if chunk.text:
+                    yield json.dumps({"delta": chunk.text}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": f"Gemini generation failed: {str(e)}"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
\ No newline at end of file
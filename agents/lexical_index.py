@@ -0,0 +1,201 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# Lower-cased words and numbers, keeping dotted or hyphenated forms whole: 005930.ks,
+# 23.5, non-gaap. Dotted tokens also index their parts, so "005930" finds "005930.KS".
+TOKEN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+# Exchange-suffixed symbols such as 005930.ks, 9988.hk, 2330.tw
+EXCHANGE_TICKER = re.compile(r"^[a-z0-9]{1,6}\.[a-z]{1,2}$")
+TOKEN_PARTS = re.compile(r"[.\-]")
+MAX_TF = 255
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "." in token or "-" in token:
+            tokens.extend(part for part in TOKEN_PARTS.split(token) if part not in STOPWORDS)
+    return tokens
+
+def is_ticker_token(token, tickers=()):
+    return bool(EXCHANGE_TICKER.match(token)) or token in tickers
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk texts, chunk ids shared with the FAISS index.
+
+    The part covered by the last snapshot is stored as CSR arrays, memory-mapped:
+    `lexical_offsets.npy` (int64, per term id), `lexical_docs.npy` (int32 chunk ids,
+    ascending within a term), `lexical_tfs.npy` (uint8 term frequency, capped at 255,
+    where BM25 has long saturated) and `lexical_lengths.npy` (uint16 chunk lengths),
+    plus the vocabulary in `lexical_terms.json`. Chunks added since live in per-term
+    `array` postings until the next snapshot folds them in.
+    """
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.terms = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.docs = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.uint8)
+        self.lengths = np.zeros(0, dtype=np.uint16)
+        self.tail_postings = {}
+        self.tail_lengths = array("H")
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths) + len(self.tail_lengths)
+
+    def add(self, first_id, texts):
+        """
+        Indexes `texts` as chunk ids first_id, first_id + 1, ...; ids must arrive in order.
+        """
+        if first_id != len(self):
+            raise ValueError(f"Lexical index holds {len(self)} chunks, cannot add at {first_id}")
+        for doc_id, text in enumerate(texts, first_id):
+            tokens = tokenize(text)
+            for token, count in Counter(tokens).items():
+                postings = self.tail_postings.get(token)
+                if postings is None:
+                    postings = self.tail_postings[token] = (array("i"), array("B"))
+                postings[0].append(doc_id)
+                postings[1].append(count if count < MAX_TF else MAX_TF)
+            length = min(len(tokens), 65535)
+            self.tail_lengths.append(length)
+            self.total_length += length
+
+    def postings(self, term):
+        """
+        (chunk ids, term frequencies) for one term, snapshot part then tail.
+        """
+        term_id = self.terms.get(term)
+        docs = tfs = None
+        if term_id is not None:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tfs = self.docs[start:end], self.tfs[start:end]
+        tail = self.tail_postings.get(term)
+        if tail is not None:
+            # Copies: a live view would stop the arrays from growing
+            tail_docs = np.frombuffer(tail[0], dtype=np.int32).copy()
+            tail_tfs = np.frombuffer(tail[1], dtype=np.uint8).copy()
+            if docs is None:
+                return tail_docs, tail_tfs
+            return np.concatenate([docs, tail_docs]), np.concatenate([tfs, tail_tfs])
+        if docs is None:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint8)
+        return docs, tfs
+
+    def document_frequency(self, term):
+        term_id = self.terms.get(term)
+        count = int(self.offsets[term_id + 1] - self.offsets[term_id]) if term_id is not None else 0
+        tail = self.tail_postings.get(term)
+        return count + (len(tail[0]) if tail is not None else 0)
+
+    def doc_lengths(self, ids):
+        base = len(self.lengths)
+        lengths = np.empty(len(ids), dtype=np.float32)
+        in_snapshot = ids < base
+        lengths[in_snapshot] = self.lengths[ids[in_snapshot]]
+        if not in_snapshot.all():
+            tail = np.frombuffer(self.tail_lengths, dtype=np.uint16).copy()
+            lengths[~in_snapshot] = tail[ids[~in_snapshot] - base]
+        return lengths
+
+    def search(self, query, k, allowed=None, required=None):
+        """
+        Top-k (chunk ids, BM25 scores) for the query text, best first. `allowed` is a
+        sorted array of admissible chunk ids; `required` a term every hit must contain.
+        """
+        count = len(self)
+        if not count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        average_length = self.total_length / count or 1.0
+        all_ids, all_scores = [], []
+        for term in dict.fromkeys(tokenize(query)):
+            docs, tfs = self.postings(term)
+            if not len(docs):
+                continue
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            tfs = tfs.astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths(docs) / average_length)
+            all_ids.append(docs)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not all_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        mask = None
+        if allowed is not None:
+            mask = np.isin(ids, allowed, assume_unique=True)
+        if required is not None:
+            required_mask = np.isin(ids, self.postings(required)[0], assume_unique=True)
+            mask = required_mask if mask is None else mask & required_mask
+        if mask is not None:
+            ids, scores = ids[mask], scores[mask]
+        if len(ids) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return ids[order].astype(np.int64), scores[order]
+
+    def save(self, directory):
+        """
+        Writes snapshot and tail postings merged into one set of CSR arrays.
+        """
+        vocabulary = sorted(set(self.terms) | set(self.tail_postings))
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        docs, tfs = [], []
+        for term_id, term in enumerate(vocabulary):
+            term_docs, term_tfs = self.postings(term)
+            docs.append(term_docs)
+            tfs.append(term_tfs)
+            offsets[term_id + 1] = offsets[term_id] + len(term_docs)
+        np.save(os.path.join(directory, "lexical_offsets.npy"), offsets)
+        np.save(os.path.join(directory, "lexical_docs.npy"),
+                np.concatenate(docs) if docs else np.zeros(0, dtype=np.int32))
+        np.save(os.path.join(directory, "lexical_tfs.npy"),
+                np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.uint8))
+        np.save(os.path.join(directory, "lexical_lengths.npy"),
+                np.concatenate([self.lengths, np.frombuffer(self.tail_lengths, dtype=np.uint16).copy()]))
+        with open(os.path.join(directory, "lexical_terms.json"), "w", encoding="utf-8") as f:
+            json.dump(vocabulary, f)
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, "lexical_terms.json"))
+
+    def load(self, directory):
+        with open(os.path.join(directory, "lexical_terms.json"), encoding="utf-8") as f:
+            self.terms = {term: term_id for term_id, term in enumerate(json.load(f))}
+        self.offsets = np.load(os.path.join(directory, "lexical_offsets.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(directory, "lexical_docs.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(directory, "lexical_tfs.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(directory, "lexical_lengths.npy"), mmap_mode="r")
+        self.tail_postings = {}
+        self.tail_lengths = array("H")
+        self.total_length = int(self.lengths.sum(dtype=np.int64))
+
+    def memory(self):
+        tail_entries = sum(len(docs) for docs, _ in self.tail_postings.values())
+        return {
+            "mapped": {
+                "lexical_postings": int(self.docs.nbytes + self.tfs.nbytes + self.offsets.nbytes),
+                "lexical_lengths": int(self.lengths.nbytes),
+            },
+            "heap": {
+                # Dict entries plus the term strings
+                "lexical_vocabulary": 100 * (len(self.terms) + len(self.tail_postings)),
+                "lexical_tail": 5 * tail_entries + 200 * len(self.tail_postings) + 2 * len(self.tail_lengths),
+            },
+        }
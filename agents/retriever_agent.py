@@ -1,30 +1,129 @@
 from fastapi import FastAPI, Request
 from sentence_transformers import SentenceTransformer
 import faiss
-import numpy as np
 import logging
+import os
+from agents.embedding_cache import EmbeddingCache
+from agents.ingestion_queue import IngestionQueue
+from agents.lexical_index import is_ticker_token, tokenize
+from agents.retriever_store import RetrieverStore
+from data_ingestion.chunking import chunk_text
 
 app = FastAPI()
 logging.basicConfig(level=logging.DEBUG)
 
+# Index snapshots and the write-ahead log live here, so restarts keep the corpus
+RETRIEVER_DATA_DIR = os.getenv("RETRIEVER_DATA_DIR", "retriever_data")
+RETRIEVER_WAL_MAX_BYTES = int(os.getenv("RETRIEVER_WAL_MAX_BYTES", str(64 * 1024 * 1024)))
+# The index stays flat until it holds RETRIEVER_ANN_THRESHOLD chunks, then is rebuilt
+# in the background as hnsw | ivf (or kept flat with "flat")
+RETRIEVER_INDEX_TYPE = os.getenv("RETRIEVER_INDEX_TYPE", "hnsw")
+# Vector storage: float32 | fp16 | int8 | pq. fp16 halves memory at no measurable recall
+# cost; ivf with int8 or pq fits the most chunks under the container's memory limit
+RETRIEVER_CODEC = os.getenv("RETRIEVER_CODEC", "fp16")
+RETRIEVER_ANN_THRESHOLD = int(os.getenv("RETRIEVER_ANN_THRESHOLD", "50000"))
+RETRIEVER_HNSW_M = int(os.getenv("RETRIEVER_HNSW_M", "32"))
+RETRIEVER_HNSW_EF_CONSTRUCTION = int(os.getenv("RETRIEVER_HNSW_EF_CONSTRUCTION", "80"))
+# Default search breadth, overridable per request with "ef_search" / "nprobe"
+RETRIEVER_EF_SEARCH = int(os.getenv("RETRIEVER_EF_SEARCH", "64"))
+RETRIEVER_NPROBE = int(os.getenv("RETRIEVER_NPROBE", "16"))
+# /index only queues chunks; a worker embeds them in batches sized to take about this long
+RETRIEVER_INGEST_TARGET_SECONDS = float(os.getenv("RETRIEVER_INGEST_TARGET_SECONDS", "0.25"))
+RETRIEVER_INGEST_MIN_BATCH = int(os.getenv("RETRIEVER_INGEST_MIN_BATCH", "8"))
+RETRIEVER_INGEST_MAX_BATCH = int(os.getenv("RETRIEVER_INGEST_MAX_BATCH", "512"))
+RETRIEVER_QUERY_CACHE_SIZE = int(os.getenv("RETRIEVER_QUERY_CACHE_SIZE", "1024"))
+RETRIEVER_MAX_K = int(os.getenv("RETRIEVER_MAX_K", "50"))
+RETRIEVER_MAX_BATCH_QUERIES = int(os.getenv("RETRIEVER_MAX_BATCH_QUERIES", "256"))
+# hybrid (BM25 + vectors, fused) | dense | lexical; overridable per request with "mode"
+RETRIEVER_RETRIEVAL_MODE = os.getenv("RETRIEVER_RETRIEVAL_MODE", "hybrid")
+RETRIEVER_RRF_K = int(os.getenv("RETRIEVER_RRF_K", "60"))
+# Each side of a hybrid search contributes this many times k candidates to the fusion
+RETRIEVER_FUSION_CANDIDATES = int(os.getenv("RETRIEVER_FUSION_CANDIDATES", "4"))
+# A ticker named in the query and found in more than max(k, MIN_DF - 1) and at most
+# MAX_DF chunks pins the answer down on its own: those chunks are ranked lexically and
+# the dense search is skipped
+RETRIEVER_DECISIVE_MIN_DF = int(os.getenv("RETRIEVER_DECISIVE_MIN_DF", "3"))
+RETRIEVER_DECISIVE_MAX_DF = int(os.getenv("RETRIEVER_DECISIVE_MAX_DF", "25"))
+
 try:
     model = SentenceTransformer('all-MiniLM-L6-v2')
     dimension = model.get_sentence_embedding_dimension()
-    index = faiss.IndexFlatL2(dimension)
-    chunks = []
-    chunk_to_doc = {}
+    store = RetrieverStore(
+        RETRIEVER_DATA_DIR, dimension, wal_max_bytes=RETRIEVER_WAL_MAX_BYTES,
+        ann_type=RETRIEVER_INDEX_TYPE, codec=RETRIEVER_CODEC, promote_at=RETRIEVER_ANN_THRESHOLD,
+        nprobe=RETRIEVER_NPROBE, ef_search=RETRIEVER_EF_SEARCH,
+        hnsw_m=RETRIEVER_HNSW_M, ef_construction=RETRIEVER_HNSW_EF_CONSTRUCTION,
+    )
+    ingestion = IngestionQueue(
+        store, lambda texts: model.encode(texts, batch_size=32),
+        target_seconds=RETRIEVER_INGEST_TARGET_SECONDS,
+        min_batch=RETRIEVER_INGEST_MIN_BATCH, max_batch=RETRIEVER_INGEST_MAX_BATCH,
+    )
+    query_embeddings = EmbeddingCache(lambda texts: model.encode(texts, batch_size=32), RETRIEVER_QUERY_CACHE_SIZE)
 except Exception as e:
     logging.error(f"[Retriever Init Error] {e}")
     raise
 
+@app.on_event("startup")
+async def startup_event():
+    ingestion.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Queued chunks not yet embedded are dropped; committed batches are in the WAL
+    ingestion.stop(timeout=30)
+    store.close()
+
 @app.get("/health")
 async def health():
     try:
-        return {"status": "Retriever Agent is running"}
+        return {"status": "Retriever Agent is running", "chunks": len(store), "ingest_backlog": ingestion.backlog()}
     except Exception as e:
         logging.error(f"[Retriever Health Error] {e}")
         return {"status": "unhealthy"}
 
+def process_memory():
+    """
+    Resident set size and the cgroup memory limit (None outside a container), in bytes.
+    """
+    rss = limit = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            limit = int(value) if value.isdigit() and int(value) < 1 << 60 else None
+            break
+        except OSError:
+            continue
+    return rss, limit
+
+@app.get("/stats")
+async def stats():
+    try:
+        rss, limit = process_memory()
+        return {
+            "chunks": len(store),
+            "sources": len(store.chunks.sources),
+            "index_type": store.index_type,
+            "codec": store.index_codec,
+            "target": {"index_type": store.ann_type, "codec": store.codec, "at_chunks": store.promote_at},
+            "memory": store.memory_stats(),
+            "rss_bytes": rss,
+            "memory_limit_bytes": limit,
+            "ingest_backlog": ingestion.backlog(),
+            "query_cache": query_embeddings.stats(),
+        }
+    except Exception as e:
+        logging.error(f"[Retriever Stats Error] {e}")
+        return {"error": str(e)}
+
 @app.post("/index")
 async def index_documents(req: Request):
     try:
@@ -33,46 +132,200 @@ async def index_documents(req: Request):
         if not documents:
             return {"status": "No documents provided"}
 
-        global chunks, chunk_to_doc
         new_chunks = []
+        new_sources = []
+        source_tickers = {}
         for doc in documents:
             content = doc.get("content", "")
             source = doc.get("source", "unknown")
-            for i in range(0, len(content), 100):
-                chunk = content[i:i+100]
-                new_chunks.append(chunk)
-                chunk_to_doc[len(chunks) + len(new_chunks) - 1] = source
-
-        if new_chunks:
-            embeddings = model.encode(new_chunks, batch_size=4, show_progress_bar=True)
-            embeddings = np.array(embeddings).astype('float32')
-            index.add(embeddings)
-            chunks.extend(new_chunks)
-            logging.info(f"[Retriever] Indexed {len(new_chunks)} chunks")
-        return {"status": "Indexed successfully"}
+            chunks = chunk_text(content)
+            new_chunks.extend(chunks)
+            new_sources.extend([source] * len(chunks))
+            tickers = doc.get("tickers") or ([doc["ticker"]] if doc.get("ticker") else [])
+            if tickers:
+                source_tickers.setdefault(source, []).extend(tickers)
+
+        job = ingestion.submit(new_chunks, new_sources, source_tickers)
+        logging.info(f"[Retriever] Queued {len(new_chunks)} chunks as job {job.id}")
+        return {"status": "queued", "job_id": job.id, "chunks": len(new_chunks)}
     except Exception as e:
         logging.error(f"[Retriever Index Error] {e}")
         return {"status": "error"}
 
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = ingestion.get(job_id)
+    if job is None:
+        return {"error": f"Unknown job {job_id}"}
+    return job
+
+def similarity(distance):
+    # Embeddings are unit-normalised, so squared L2 distance maps onto cosine similarity
+    return 1.0 - float(distance) / 2.0
+
+def dense_hits(embeddings, k, min_score=None, allowed=None, nprobe=None, ef_search=None, soft=False):
+    """
+    Top-k [(chunk id, cosine similarity)] per query embedding.
+
+    `allowed` (sorted chunk ids) restricts the search through a FAISS ID selector. With
+    `soft`, queries with fewer than k allowed hits are topped up from the whole index,
+    so the filter prefers rather than excludes.
+    """
+    hits = [[] for _ in range(len(embeddings))]
+    if allowed is not None and len(allowed):
+        D, I = store.search(embeddings, min(k, len(allowed)), nprobe=nprobe, ef_search=ef_search,
+                            selector=faiss.IDSelectorBatch(allowed))
+        hits = [[(int(i), d) for i, d in zip(row_ids, row_distances) if i != -1] for row_ids, row_distances in zip(I, D)]
+    if allowed is None or (soft and any(len(row) < k for row in hits)):
+        D, I = store.search(embeddings, k, nprobe=nprobe, ef_search=ef_search)
+        for row, row_ids, row_distances in zip(hits, I, D):
+            seen = {i for i, _ in row}
+            row.extend((int(i), d) for i, d in zip(row_ids, row_distances) if i != -1 and i not in seen)
+            del row[k:]
+    hits = [[(i, similarity(d)) for i, d in row] for row in hits]
+    if min_score is not None:
+        hits = [[(i, score) for i, score in row if score >= min_score] for row in hits]
+    return hits
+
+def decisive_ticker_hits(query, k, tickers=(), allowed=None):
+    """
+    Lexical hits when the query text itself names a ticker (exchange-suffixed, like
+    005930.KS, or one of `tickers`) that occurs in more than k, and at least
+    RETRIEVER_DECISIVE_MIN_DF, but at most RETRIEVER_DECISIVE_MAX_DF chunks: the rarest
+    such ticker's chunks, ranked by BM25 against the query. None otherwise. `tickers`
+    only helps recognise tickers in the query; one it does not mention never decides.
+    """
+    tickers = {ticker.lower() for ticker in tickers or ()}
+    candidates = [token for token in dict.fromkeys(tokenize(query)) if is_ticker_token(token, tickers)]
+    lowest = max(k + 1, RETRIEVER_DECISIVE_MIN_DF)
+    frequencies = [(store.document_frequency(token), token) for token in candidates]
+    frequencies = [(df, token) for df, token in frequencies if lowest <= df <= RETRIEVER_DECISIVE_MAX_DF]
+    if not frequencies:
+        return None
+    _, token = min(frequencies)
+    ids, scores = store.lexical_search(f"{query} {token}", k, allowed=allowed, required=token)
+    if len(ids) < k:
+        return None
+    return list(zip(ids.tolist(), scores.tolist()))
+
+def fuse(rankings, k):
+    """
+    Reciprocal-rank fusion: each ranking adds 1 / (RETRIEVER_RRF_K + rank) per chunk.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _) in enumerate(ranking, 1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RETRIEVER_RRF_K + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+def retrieve(queries, k, min_score=None, sources=None, tickers=None, nprobe=None, ef_search=None, soft=False, mode=None):
+    """
+    Top-k chunks per query as [{"chunks", "sources", "scores", "retrieval"}].
+
+    `retrieval` says how each result was found, which also fixes what `scores` mean:
+    "dense" (cosine similarity), "lexical" or "ticker" (BM25, dense search skipped for
+    a decisive ticker match) or "hybrid" (reciprocal-rank fusion of BM25 and dense
+    rankings). `min_score` applies to dense similarities: in hybrid mode a chunk must
+    reach it to be fused at all, so lexical-only hits are dropped, and it turns the
+    ticker short-circuit off. `sources` / `tickers` filter strictly, or with `soft` only
+    rank matching chunks first.
+    """
+    k = max(1, min(int(k), RETRIEVER_MAX_K))
+    mode = mode or RETRIEVER_RETRIEVAL_MODE
+    if mode not in ("hybrid", "dense", "lexical"):
+        raise ValueError(f"Unknown retrieval mode '{mode}'")
+    allowed = store.filter_ids(sources, tickers)
+    if soft and allowed is not None and not len(allowed):
+        allowed = None
+    lexical_allowed = None if soft else allowed
+    # Soft tickers still steer the lexical side, as extra query terms
+    boost = " ".join(tickers or ()) if soft else ""
+    candidates = k * RETRIEVER_FUSION_CANDIDATES if mode == "hybrid" else k
+
+    results = [None] * len(queries)
+    if mode == "hybrid" and min_score is None:
+        for n, query in enumerate(queries):
+            hits = decisive_ticker_hits(query, k, tickers, lexical_allowed)
+            if hits is not None:
+                results[n] = ("ticker", hits)
+    pending = [n for n, result in enumerate(results) if result is None]
+
+    dense = {}
+    if mode != "lexical" and pending:
+        embeddings = query_embeddings.get_many([queries[n] for n in pending])
+        dense = dict(zip(pending, dense_hits(embeddings, candidates, min_score, allowed, nprobe, ef_search, soft)))
+    for n in pending:
+        if mode == "dense":
+            results[n] = ("dense", dense[n][:k])
+            continue
+        ids, scores = store.lexical_search(f"{queries[n]} {boost}", candidates, allowed=lexical_allowed)
+        lexical = list(zip(ids.tolist(), scores.tolist()))
+        if mode == "lexical":
+            results[n] = ("lexical", lexical[:k])
+            continue
+        if min_score is not None:
+            # dense[n] holds only chunks at or above the threshold
+            passing = {chunk_id for chunk_id, _ in dense[n]}
+            lexical = [(chunk_id, score) for chunk_id, score in lexical if chunk_id in passing]
+        results[n] = ("hybrid", fuse([lexical, dense[n]], k))
+
+    formatted = []
+    for retrieval, hits in results:
+        retrieved = store.lookup([i for i, _ in hits])
+        formatted.append({
+            "chunks": [text for text, _ in retrieved],
+            "sources": [source for _, source in retrieved],
+            "scores": [round(score, 4) for _, score in hits],
+            "retrieval": retrieval,
+        })
+    return formatted
+
 @app.post("/query")
 async def query(req: Request):
+    """
+    One query. `tickers` and `user_urls` (as the orchestrator sends them) are preferred
+    but not required: matching chunks rank first, then the rest of the index.
+    """
     try:
         data = await req.json()
         query = data.get("query", "")
-        if not query or not chunks:
-            return {"chunks": [], "sources": []}
-
-        query_embedding = model.encode([query], batch_size=1)[0].astype('float32')
-        D, I = index.search(np.array([query_embedding]), k=1)
-        retrieved_chunks = []
-        sources = []
-        for idx in I[0]:
-            if idx != -1:
-                retrieved_chunks.append(chunks[idx])
-                sources.append(chunk_to_doc.get(idx, "unknown"))
-
-        logging.info(f"[Retriever] Retrieved {len(retrieved_chunks)} chunks")
-        return {"chunks": retrieved_chunks, "sources": sources}
+        if not query or not len(store):
+            return {"chunks": [], "sources": [], "scores": []}
+
+        result = retrieve(
+            [query], data.get("k", 1), data.get("min_score"),
+            sources=data.get("user_urls"), tickers=data.get("tickers"),
+            nprobe=data.get("nprobe"), ef_search=data.get("ef_search"), soft=True, mode=data.get("mode"),
+        )[0]
+        logging.info(f"[Retriever] Retrieved {len(result['chunks'])} chunks ({result['retrieval']})")
+        return result
     except Exception as e:
         logging.error(f"[Retriever Query Error] {e}")
-        return {"chunks": [], "sources": []}
\ No newline at end of file
+        return {"chunks": [], "sources": [], "scores": []}
+
+@app.post("/query/batch")
+async def query_batch(req: Request):
+    """
+    Many queries in one model call and one search. `sources` and `tickers` are strict
+    filters here; `min_score` drops dense hits below that cosine similarity.
+    """
+    try:
+        data = await req.json()
+        queries = [query for query in data.get("queries", []) if query]
+        if not queries:
+            return {"error": "No queries provided"}
+        if len(queries) > RETRIEVER_MAX_BATCH_QUERIES:
+            return {"error": f"At most {RETRIEVER_MAX_BATCH_QUERIES} queries per batch"}
+        if not len(store):
+            return {"results": [{"query": query, "chunks": [], "sources": [], "scores": []} for query in queries]}
+
+        results = retrieve(
+            queries, data.get("k", 5), data.get("min_score"),
+            sources=data.get("sources"), tickers=data.get("tickers"),
+            nprobe=data.get("nprobe"), ef_search=data.get("ef_search"), mode=data.get("mode"),
+        )
+        logging.info(f"[Retriever] Answered {len(queries)} batched queries")
+        return {"results": [{"query": query, **result} for query, result in zip(queries, results)]}
+    except Exception as e:
+        logging.error(f"[Retriever Batch Query Error] {e}")
+        return {"error": str(e)}
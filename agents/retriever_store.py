@@ -0,0 +1,670 @@
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import zlib
+
+import faiss
+import numpy as np
+
+from agents.lexical_index import LexicalIndex
+from data_ingestion.chunking import chunk_hash
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+# How vectors are stored: float32 as embedded, fp16 (2x smaller), int8 scalar
+# quantization (4x) or 4-bit product quantization (32x, lossy)
+CODECS = {"float32": "Flat", "fp16": "SQfp16", "int8": "SQ8", "pq": None}
+# Index types accepted before codecs were separate
+INDEX_TYPE_ALIASES = {"ivf_flat": ("ivf", "float32"), "ivf_pq": ("ivf", "pq")}
+
+WAL_MAGIC = b"RWAL"
+WAL_HEADER = struct.Struct("<4sQIII")  # magic, first chunk id, chunk count, payload bytes, crc32
+
+def ivf_list_count(count):
+    # ~4 * sqrt(n) lists, with enough training points per list for k-means
+    return int(max(16, min(4 * np.sqrt(count), count // 39)))
+
+def resolve_index_type(index_type, codec):
+    """
+    Validates an (index type, codec) pair, expanding the older ivf_flat/ivf_pq names.
+    """
+    if index_type in INDEX_TYPE_ALIASES:
+        index_type, implied = INDEX_TYPE_ALIASES[index_type]
+        codec = implied if implied == "pq" else codec
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec '{codec}', expected one of {tuple(CODECS)}")
+    if index_type == "hnsw" and codec == "pq":
+        raise ValueError("The pq codec needs a flat or ivf index; FAISS has no fast-scan HNSW")
+    return index_type, codec
+
+def codec_key(codec, dimension, pq_bytes=None):
+    if codec != "pq":
+        return CODECS[codec]
+    # 4-bit fast-scan codes, 8 dimensions per byte unless told otherwise. 8-bit PQ
+    # trains over 50x slower for the same code size and searches slower too.
+    subquantizers = 2 * (pq_bytes or max(1, dimension // 8))
+    while dimension % subquantizers:
+        subquantizers -= 2
+    return f"PQ{subquantizers}x4fs"
+
+def index_factory_key(index_type, codec, dimension, count, hnsw_m=32, pq_bytes=None):
+    encoding = codec_key(codec, dimension, pq_bytes)
+    if index_type == "flat":
+        return encoding
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}" if codec == "float32" else f"HNSW{hnsw_m}_{encoding}"
+    return f"IVF{ivf_list_count(count)},{encoding}"
+
+def needs_training(index_type, codec):
+    return index_type == "ivf" or codec in ("int8", "pq")
+
+def empty_index(dimension, codec):
+    """
+    The index a new store starts from: flat in `codec` when that needs no training,
+    exact float32 otherwise until there is enough data to train on.
+    """
+    if needs_training("flat", codec):
+        return faiss.IndexFlatL2(dimension), "float32"
+    return faiss.index_factory(dimension, codec_key(codec, dimension)), codec
+
+def build_index(index_type, codec, vectors, hnsw_m=32, ef_construction=80, pq_bytes=None, max_train=100_000):
+    """
+    Builds and fills an `index_type` index storing vectors as `codec`. Quantizers are
+    trained on a random sample of at most `max_train` vectors.
+    """
+    count, dimension = vectors.shape
+    index = faiss.index_factory(dimension, index_factory_key(index_type, codec, dimension, count, hnsw_m, pq_bytes))
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = ef_construction
+    if not index.is_trained:
+        sample = vectors
+        if count > max_train:
+            sample = vectors[np.random.default_rng(0).choice(count, max_train, replace=False)]
+        index.train(sample)
+    for start in range(0, count, 65536):
+        index.add(vectors[start:start + 65536])
+    return index
+
+def index_memory(index):
+    """
+    Estimated resident bytes of a FAISS index by part: encoded vectors, HNSW graph,
+    IVF ids and coarse centroids.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        hnsw = index.hnsw
+        graph = hnsw.neighbors.size() * 4 + hnsw.levels.size() * 4 + hnsw.offsets.size() * 8
+        return {"vectors": index_memory(index.storage)["vectors"], "graph": graph}
+    if isinstance(index, faiss.IndexIVF):
+        return {
+            "vectors": index.code_size * index.ntotal,
+            "ids": 8 * index.ntotal,
+            "centroids": index.quantizer.ntotal * index.d * 4,
+        }
+    return {"vectors": index.sa_code_size() * index.ntotal}
+
+def index_kind(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+def search_parameters(index_type, nprobe=None, ef_search=None, selector=None):
+    """
+    Per-search knobs: `nprobe` for IVF indexes, `ef_search` for HNSW, plus an optional
+    FAISS ID selector restricting which ids can be returned.
+    """
+    kwargs = {} if selector is None else {"sel": selector}
+    if index_type.startswith("ivf"):
+        if nprobe:
+            kwargs["nprobe"] = nprobe
+        return faiss.SearchParametersIVF(**kwargs)
+    if index_type == "hnsw":
+        if ef_search:
+            kwargs["efSearch"] = ef_search
+        return faiss.SearchParametersHNSW(**kwargs)
+    return faiss.SearchParameters(**kwargs) if kwargs else None
+
+class ChunkStore:
+    """
+    Chunk texts and source ids. The part covered by the last snapshot is memory-mapped
+    from `chunks.bin` (UTF-8 bytes), `offsets.npy` (int64 end offsets) and
+    `source_ids.npy` (int32); chunks added since live in Python lists until the next
+    snapshot. Source names are interned in one shared table.
+
+    Content hashes of every chunk are kept for deduplication: a sorted uint64 array
+    (`hashes.npy`) with the chunk id of each hash (`hash_ids.npy`) for the snapshot part
+    and a dict for the tail.
+
+    Tickers are tagged per source rather than per chunk (`source_tickers.json`), so a
+    ticker filter resolves to source ids and then to chunk ids through `source_ids`.
+    A chunk indexed again under another source is not stored twice; it is linked to
+    that source instead (`source_links.json`, source id -> chunk ids).
+    """
+    def __init__(self):
+        self.data = np.zeros(0, dtype=np.uint8)
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.source_ids = np.zeros(0, dtype=np.int32)
+        self.tail_texts = []
+        self.tail_source_ids = []
+        self.sources = []
+        self.source_lookup = {}
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.hash_ids = np.zeros(0, dtype=np.int64)
+        self.tail_hashes = {}
+        self.source_tickers = {}
+        self.source_links = {}
+
+    def __len__(self):
+        return len(self.offsets) + len(self.tail_texts)
+
+    def intern(self, source):
+        source_id = self.source_lookup.get(source)
+        if source_id is None:
+            source_id = self.source_lookup[source] = len(self.sources)
+            self.sources.append(source)
+        return source_id
+
+    def append(self, texts, sources):
+        first_id = len(self)
+        self.tail_texts.extend(texts)
+        self.tail_source_ids.extend(self.intern(source) for source in sources)
+        for chunk_id, text in enumerate(texts, first_id):
+            self.tail_hashes.setdefault(chunk_hash(text), chunk_id)
+
+    def tag(self, source_tickers):
+        for source, tickers in source_tickers.items():
+            self.source_tickers.setdefault(self.intern(source), set()).update(ticker.upper() for ticker in tickers)
+
+    def new_links(self, chunk_ids, sources):
+        """
+        The (chunk id, source) pairs not yet known: the chunk is neither stored under
+        that source nor linked to it.
+        """
+        pairs = []
+        for chunk_id, source in zip(chunk_ids, sources):
+            source_id = self.source_lookup.get(source)
+            if source_id is not None and (self.source_id(chunk_id) == source_id
+                                          or chunk_id in self.source_links.get(source_id, ())):
+                continue
+            if (chunk_id, source) not in pairs:
+                pairs.append((chunk_id, source))
+        return pairs
+
+    def link(self, pairs):
+        for chunk_id, source in pairs:
+            self.source_links.setdefault(self.intern(source), set()).add(int(chunk_id))
+
+    def matching_sources(self, sources=None, tickers=None):
+        """
+        Source ids named in `sources` or tagged with any of `tickers`.
+        """
+        matched = {self.source_lookup[source] for source in sources or () if source in self.source_lookup}
+        wanted = {ticker.upper() for ticker in tickers or ()}
+        if wanted:
+            matched.update(source_id for source_id, tagged in self.source_tickers.items() if tagged & wanted)
+        return matched
+
+    def chunk_ids(self, source_ids):
+        if not source_ids:
+            return np.zeros(0, dtype=np.int64)
+        wanted = np.fromiter(source_ids, dtype=np.int32, count=len(source_ids))
+        all_source_ids = np.concatenate([self.source_ids, np.array(self.tail_source_ids, dtype=np.int32)])
+        ids = np.flatnonzero(np.isin(all_source_ids, wanted)).astype(np.int64)
+        linked = set().union(*(self.source_links.get(source_id, ()) for source_id in source_ids))
+        if linked:
+            ids = np.union1d(ids, np.fromiter(linked, dtype=np.int64, count=len(linked)))
+        return ids
+
+    def memory(self):
+        tail_text = sum(len(text) for text in self.tail_texts)
+        return {
+            "mapped": {
+                "text": int(self.data.nbytes),
+                "offsets": int(self.offsets.nbytes),
+                "source_ids": int(self.source_ids.nbytes),
+                "hashes": int(self.hashes.nbytes + self.hash_ids.nbytes),
+            },
+            "heap": {
+                # Python object overhead on top of the raw characters
+                "tail_text": tail_text + 57 * len(self.tail_texts),
+                "tail_source_ids": 8 * len(self.tail_source_ids),
+                "tail_hashes": 100 * len(self.tail_hashes),
+                "sources": sum(len(source) + 57 for source in self.sources),
+                "source_tickers": sum(216 + 64 * len(tickers) for tickers in self.source_tickers.values()),
+                "source_links": sum(216 + 64 * len(ids) for ids in self.source_links.values()),
+            },
+        }
+
+    def find(self, digest):
+        """
+        Id of the stored chunk with this content hash, or None.
+        """
+        chunk_id = self.tail_hashes.get(digest)
+        if chunk_id is not None:
+            return chunk_id
+        position = np.searchsorted(self.hashes, np.uint64(digest))
+        if position < len(self.hashes) and self.hashes[position] == digest:
+            return int(self.hash_ids[position])
+        return None
+
+    def unseen(self, texts):
+        """
+        Positions in `texts` worth embedding: not stored yet and not repeated earlier in `texts`.
+        """
+        keep, seen = [], set()
+        for i, text in enumerate(texts):
+            digest = chunk_hash(text)
+            if digest not in seen and self.find(digest) is None:
+                keep.append(i)
+            seen.add(digest)
+        return keep
+
+    def text(self, i):
+        base = len(self.offsets)
+        if i >= base:
+            return self.tail_texts[i - base]
+        start = self.offsets[i - 1] if i else 0
+        return bytes(self.data[start:self.offsets[i]]).decode("utf-8")
+
+    def source_id(self, i):
+        base = len(self.offsets)
+        return self.tail_source_ids[i - base] if i >= base else int(self.source_ids[i])
+
+    def source(self, i):
+        return self.sources[self.source_id(i)]
+
+    def save(self, directory):
+        """
+        Writes every chunk, snapshot part and tail, as one set of arrays.
+        """
+        base = len(self.offsets)
+        tail = [text.encode("utf-8") for text in self.tail_texts]
+        end = int(self.offsets[-1]) if base else 0
+        with open(os.path.join(directory, "chunks.bin"), "wb") as f:
+            f.write(memoryview(self.data[:end]))
+            for encoded in tail:
+                f.write(encoded)
+        tail_offsets = end + np.cumsum([len(encoded) for encoded in tail], dtype=np.int64)
+        np.save(os.path.join(directory, "offsets.npy"), np.concatenate([self.offsets, tail_offsets]))
+        np.save(os.path.join(directory, "source_ids.npy"),
+                np.concatenate([self.source_ids, np.array(self.tail_source_ids, dtype=np.int32)]))
+        with open(os.path.join(directory, "sources.json"), "w", encoding="utf-8") as f:
+            json.dump(self.sources, f)
+        hashes = np.concatenate([self.hashes, np.fromiter(self.tail_hashes, dtype=np.uint64, count=len(self.tail_hashes))])
+        hash_ids = np.concatenate([self.hash_ids, np.fromiter(self.tail_hashes.values(), dtype=np.int64, count=len(self.tail_hashes))])
+        hashes, first = np.unique(hashes, return_index=True)
+        np.save(os.path.join(directory, "hashes.npy"), hashes)
+        np.save(os.path.join(directory, "hash_ids.npy"), hash_ids[first])
+        with open(os.path.join(directory, "source_tickers.json"), "w", encoding="utf-8") as f:
+            json.dump({source_id: sorted(tickers) for source_id, tickers in self.source_tickers.items()}, f)
+        with open(os.path.join(directory, "source_links.json"), "w", encoding="utf-8") as f:
+            json.dump({source_id: sorted(ids) for source_id, ids in self.source_links.items()}, f)
+
+    def load(self, directory):
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self.source_ids = np.load(os.path.join(directory, "source_ids.npy"), mmap_mode="r")
+        path = os.path.join(directory, "chunks.bin")
+        self.data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, dtype=np.uint8)
+        with open(os.path.join(directory, "sources.json"), encoding="utf-8") as f:
+            self.sources = json.load(f)
+        self.source_lookup = {source: i for i, source in enumerate(self.sources)}
+        self.tail_texts = []
+        self.tail_source_ids = []
+        self.tail_hashes = {}
+        tickers_path = os.path.join(directory, "source_tickers.json")
+        self.source_tickers = {}
+        if os.path.exists(tickers_path):
+            with open(tickers_path, encoding="utf-8") as f:
+                self.source_tickers = {int(source_id): set(tickers) for source_id, tickers in json.load(f).items()}
+        links_path = os.path.join(directory, "source_links.json")
+        self.source_links = {}
+        if os.path.exists(links_path):
+            with open(links_path, encoding="utf-8") as f:
+                self.source_links = {int(source_id): set(ids) for source_id, ids in json.load(f).items()}
+        hash_ids_path = os.path.join(directory, "hash_ids.npy")
+        if os.path.exists(hash_ids_path):
+            self.hashes = np.load(os.path.join(directory, "hashes.npy"), mmap_mode="r")
+            self.hash_ids = np.load(hash_ids_path, mmap_mode="r")
+        else:
+            # Snapshots written before chunk ids were kept per hash
+            hashes = np.fromiter((chunk_hash(self.text(i)) for i in range(len(self.offsets))),
+                                 dtype=np.uint64, count=len(self.offsets))
+            self.hashes, first = np.unique(hashes, return_index=True)
+            self.hash_ids = first.astype(np.int64)
+
+class RetrieverStore:
+    """
+    Durable retriever state: a FAISS index plus the chunk store, snapshotted under
+    `root/snapshot-<generation>/` with `root/CURRENT` naming the live snapshot, and an
+    append-only write-ahead log (`root/wal.log`) of every batch added since.
+
+    On startup the snapshot is memory-mapped and the WAL replayed on top, so a restart
+    recovers the full corpus without re-embedding anything.
+
+    The index starts flat, in `codec` if that needs no training and float32 otherwise.
+    Once it holds `promote_at` chunks it is rebuilt as an `ann_type` index storing
+    `codec` vectors in a background thread and swapped in, with chunks added meanwhile
+    carried over.
+
+    A BM25 `LexicalIndex` over the same chunk ids is kept alongside, snapshotted in
+    the same directory and rebuilt from the WAL like the rest.
+
+    Writers (adds, snapshots, the promotion swap) serialize on `lock`, which covers the
+    WAL fsync and snapshot I/O. Readers only take `index_lock`, which writers hold just
+    long enough to mutate the index and chunk arrays, so searches keep running while a
+    batch is being logged or a snapshot written.
+    """
+    def __init__(self, root, dimension, wal_max_bytes=64 * 1024 * 1024, ann_type="hnsw", codec="float32",
+                 promote_at=50_000, nprobe=16, ef_search=64, hnsw_m=32, ef_construction=80, pq_bytes=None):
+        self.root = root
+        self.dimension = dimension
+        self.wal_max_bytes = wal_max_bytes
+        self.ann_type, self.codec = resolve_index_type(ann_type, codec)
+        self.promote_at = promote_at
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.pq_bytes = pq_bytes
+        self.index, self.index_codec = empty_index(dimension, self.codec)
+        self.index_type = "flat"
+        self.promotion = None
+        self.chunks = ChunkStore()
+        self.lexical = LexicalIndex()
+        self.lock = threading.Lock()
+        self.index_lock = threading.Lock()
+        self.wal = None
+        os.makedirs(root, exist_ok=True)
+        self.load()
+        self.maybe_promote()
+
+    @property
+    def wal_path(self):
+        return os.path.join(self.root, "wal.log")
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def load(self):
+        current = os.path.join(self.root, "CURRENT")
+        if os.path.exists(current):
+            with open(current, encoding="utf-8") as f:
+                directory = os.path.join(self.root, f.read().strip())
+            with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["dimension"] != self.dimension:
+                raise ValueError(f"Snapshot dimension {manifest['dimension']} does not match model dimension {self.dimension}")
+            self.index_type, self.index_codec = resolve_index_type(
+                manifest.get("index_type", "flat"), manifest.get("codec", "float32"))
+            # Memory-mapped IVF lists are read-only, so those are read into memory instead
+            flags = 0 if self.index_type == "ivf" else faiss.IO_FLAG_MMAP
+            self.index = faiss.read_index(os.path.join(directory, "index.faiss"), flags)
+            self.chunks.load(directory)
+            if LexicalIndex.exists(directory):
+                self.lexical.load(directory)
+            else:
+                # Snapshots written before the lexical index existed
+                self.lexical.add(0, [self.chunks.text(i) for i in range(len(self.chunks))])
+            logging.info(f"[Retriever Store] Loaded snapshot {directory} with {len(self.chunks)} chunks")
+        replayed = self.replay_wal()
+        if replayed:
+            logging.info(f"[Retriever Store] Replayed {replayed} chunks from the write-ahead log")
+        self.wal = open(self.wal_path, "ab")
+
+    def replay_wal(self):
+        if not os.path.exists(self.wal_path):
+            return 0
+        replayed = 0
+        valid_bytes = 0
+        with open(self.wal_path, "rb") as f:
+            while True:
+                header = f.read(WAL_HEADER.size)
+                if len(header) < WAL_HEADER.size:
+                    break
+                magic, first_id, count, payload_size, crc = WAL_HEADER.unpack(header)
+                payload = f.read(payload_size)
+                if magic != WAL_MAGIC or len(payload) < payload_size or zlib.crc32(payload) != crc:
+                    logging.warning("[Retriever Store] Ignoring torn record at the end of the write-ahead log")
+                    break
+                valid_bytes = f.tell()
+                if count == 0:
+                    # Links and tags only; applying them twice changes nothing
+                    _, _, _, tickers, links = self.decode_record(payload, count)
+                    self.chunks.link(links)
+                    self.chunks.tag(tickers)
+                    continue
+                if first_id + count <= len(self.chunks):
+                    continue  # Already in the snapshot
+                embeddings, texts, sources, tickers, _ = self.decode_record(payload, count)
+                skip = len(self.chunks) - first_id
+                self.index.add(embeddings[skip:])
+                self.lexical.add(len(self.chunks), texts[skip:])
+                self.chunks.append(texts[skip:], sources[skip:])
+                self.chunks.tag(tickers)
+                replayed += count - skip
+        if valid_bytes < os.path.getsize(self.wal_path):
+            with open(self.wal_path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return replayed
+
+    def encode_record(self, first_id, embeddings, texts, sources, tickers=None, links=None):
+        meta = json.dumps({"texts": texts, "sources": sources, "tickers": tickers or {},
+                           "links": links or []}).encode("utf-8")
+        payload = struct.pack("<I", len(meta)) + meta + embeddings.tobytes()
+        return WAL_HEADER.pack(WAL_MAGIC, first_id, len(texts), len(payload), zlib.crc32(payload)) + payload
+
+    def decode_record(self, payload, count):
+        (meta_size,) = struct.unpack_from("<I", payload)
+        meta = json.loads(payload[4:4 + meta_size].decode("utf-8"))
+        embeddings = np.frombuffer(payload[4 + meta_size:], dtype=np.float32).reshape(count, self.dimension)
+        return embeddings, meta["texts"], meta["sources"], meta.get("tickers", {}), meta.get("links", [])
+
+    def add(self, embeddings, texts, sources, tickers=None):
+        """
+        Appends one batch: logged and fsynced to the WAL first, then added to the index
+        and chunk store. `tickers` maps sources to the tickers they are about. Returns
+        the id of the first new chunk.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self.lock:
+            first_id = len(self.chunks)
+            self.wal.write(self.encode_record(first_id, embeddings, list(texts), list(sources), tickers))
+            self.wal.flush()
+            os.fsync(self.wal.fileno())
+            with self.index_lock:
+                self.index.add(embeddings)
+                self.lexical.add(first_id, texts)
+                self.chunks.append(texts, sources)
+                self.chunks.tag(tickers or {})
+            if self.wal.tell() > self.wal_max_bytes:
+                self._snapshot()
+        self.maybe_promote()
+        return first_id
+
+    def link(self, texts, sources, tickers=None):
+        """
+        Records that already stored `texts` also belong to `sources` (and tags those
+        sources with `tickers`), so source and ticker filters find them without the
+        chunks being embedded or stored again. Logged like `add`. Returns the number of
+        new links.
+        """
+        with self.lock:
+            with self.index_lock:
+                ids = [self.chunks.find(chunk_hash(text)) for text in texts]
+                pairs = self.chunks.new_links([i for i in ids if i is not None],
+                                              [source for i, source in zip(ids, sources) if i is not None])
+                new_tickers = {}
+                for source, source_tickers in (tickers or {}).items():
+                    known = self.chunks.source_tickers.get(self.chunks.source_lookup.get(source), set())
+                    new = {ticker.upper() for ticker in source_tickers} - known
+                    if new:
+                        new_tickers[source] = sorted(new)
+            if not pairs and not new_tickers:
+                return 0
+            tickers = new_tickers
+            empty = np.zeros((0, self.dimension), dtype=np.float32)
+            self.wal.write(self.encode_record(len(self.chunks), empty, [], [], tickers, pairs))
+            self.wal.flush()
+            os.fsync(self.wal.fileno())
+            with self.index_lock:
+                self.chunks.link(pairs)
+                self.chunks.tag(tickers)
+            if self.wal.tell() > self.wal_max_bytes:
+                self._snapshot()
+        return len(pairs)
+
+    def search(self, queries, k, nprobe=None, ef_search=None, selector=None):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        nprobe = nprobe or self.nprobe
+        ef_search = max(ef_search or self.ef_search, k)
+        if selector is not None:
+            # Filtered-out ids still use up probed lists and graph visits; look wider
+            nprobe *= 4
+            ef_search *= 4
+        with self.index_lock:
+            params = search_parameters(index_kind(self.index), nprobe, ef_search, selector)
+            return self.index.search(queries, k, params=params)
+
+    def filter_ids(self, sources=None, tickers=None):
+        """
+        Sorted ids of chunks from `sources` or tagged with `tickers`; None without filters.
+        """
+        if not sources and not tickers:
+            return None
+        with self.index_lock:
+            return self.chunks.chunk_ids(self.chunks.matching_sources(sources, tickers))
+
+    def lexical_search(self, query, k, allowed=None, required=None):
+        with self.index_lock:
+            return self.lexical.search(query, k, allowed, required)
+
+    def document_frequency(self, term):
+        with self.index_lock:
+            return self.lexical.document_frequency(term)
+
+    def unseen(self, texts):
+        with self.index_lock:
+            return self.chunks.unseen(texts)
+
+    def lookup(self, ids):
+        """
+        [(text, source)] for chunk ids returned by `search`, skipping FAISS's -1 padding.
+        """
+        with self.index_lock:
+            return [(self.chunks.text(int(i)), self.chunks.source(int(i))) for i in ids if i != -1]
+
+    def maybe_promote(self):
+        target = (self.ann_type, self.codec)
+        if (self.index_type == "flat" and (self.index_type, self.index_codec) != target
+                and len(self.chunks) >= self.promote_at and self.promotion is None):
+            self.promotion = threading.Thread(target=self.promote, name="retriever-promotion", daemon=True)
+            self.promotion.start()
+
+    def promote(self):
+        """
+        Rebuilds the flat index as `ann_type` / `codec` off the request path. Vectors present when
+        the build starts go into the new index outside the lock; the few added during
+        the build are copied over under the lock just before the swap.
+        """
+        try:
+            with self.lock:
+                count = self.index.ntotal
+                vectors = self.index.reconstruct_n(0, count)
+            logging.info(f"[Retriever Store] Promoting {count} chunks from flat/{self.index_codec} "
+                         f"to {self.ann_type}/{self.codec}")
+            index = build_index(self.ann_type, self.codec, vectors, self.hnsw_m, self.ef_construction, self.pq_bytes)
+            with self.lock:
+                if self.index.ntotal > count:
+                    index.add(self.index.reconstruct_n(count, self.index.ntotal - count))
+                with self.index_lock:
+                    self.index = index
+                    self.index_type = self.ann_type
+                    self.index_codec = self.codec
+                self._snapshot()
+            logging.info(f"[Retriever Store] Promoted to {self.ann_type}/{self.codec} with {index.ntotal} chunks")
+        except Exception as e:
+            logging.error(f"[Retriever Store] Promotion to {self.ann_type} failed: {e}")
+        finally:
+            self.promotion = None
+
+    def memory_stats(self):
+        """
+        Estimated bytes held by the index and chunk store, by part. `mapped` parts are
+        memory-mapped snapshot files the kernel can page out; `heap` parts are resident.
+        """
+        with self.index_lock:
+            index = index_memory(self.index)
+            chunks = self.chunks.memory()
+            lexical = self.lexical.memory()
+        mapped = {**chunks["mapped"], **lexical["mapped"]}
+        # A mapped index is copied to the heap by its first add, so it is counted as resident
+        heap = {**{f"index_{part}": size for part, size in index.items()}, **chunks["heap"], **lexical["heap"]}
+        return {
+            "heap": heap,
+            "mapped": mapped,
+            "heap_bytes": sum(heap.values()),
+            "mapped_bytes": sum(mapped.values()),
+            "bytes_per_chunk": round((sum(heap.values()) + sum(mapped.values())) / len(self.chunks), 1) if len(self.chunks) else 0,
+        }
+
+    def snapshot(self):
+        with self.lock:
+            self._snapshot()
+
+    def next_generation(self):
+        # Above every snapshot on disk, so a new snapshot never reuses the live one's name
+        generations = [int(entry[len("snapshot-"):]) for entry in os.listdir(self.root)
+                       if entry.startswith("snapshot-") and entry[len("snapshot-"):].isdigit()]
+        return max(generations, default=0) + 1
+
+    def _snapshot(self):
+        """
+        Writes a complete snapshot directory under a new generation, switches CURRENT to
+        it atomically, then truncates the WAL and removes older snapshots.
+        """
+        count = len(self.chunks)
+        name = f"snapshot-{self.next_generation()}"
+        directory = os.path.join(self.root, name)
+        tmp_directory = f"{directory}.tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        faiss.write_index(self.index, os.path.join(tmp_directory, "index.faiss"))
+        self.chunks.save(tmp_directory)
+        self.lexical.save(tmp_directory)
+        with open(os.path.join(tmp_directory, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"count": count, "dimension": self.dimension, "index_type": self.index_type,
+                       "codec": self.index_codec}, f)
+        os.replace(tmp_directory, directory)
+
+        current_tmp = os.path.join(self.root, "CURRENT.tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, os.path.join(self.root, "CURRENT"))
+
+        # WAL records at or below `count` are now redundant; replay skips them if this is interrupted
+        self.wal.truncate(0)
+        self.wal.seek(0)
+        with self.index_lock:
+            self.chunks.load(directory)
+            self.lexical.load(directory)
+        # Only now that CURRENT points at the new snapshot
+        for entry in os.listdir(self.root):
+            if entry.startswith("snapshot-") and entry != name:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+        logging.info(f"[Retriever Store] Wrote snapshot {name}")
+
+    def close(self):
+        with self.lock:
+            if self.wal is not None and not self.wal.closed:
+                if self.wal.tell() > 0:
+                    self._snapshot()
+                self.wal.close()
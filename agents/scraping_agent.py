@@ -1,16 +1,126 @@
 from fastapi import FastAPI, Request
-from bs4 import BeautifulSoup
-import requests
+from urllib.parse import urlsplit
+import aiohttp
+import asyncio
 import logging
+import os
 import re
+import time
+from data_ingestion.html_extract import extract
+from data_ingestion.news_store import get_news_store
 
 app = FastAPI()
 logging.basicConfig(level=logging.INFO)
 
+# The orchestrator gives scraping 5 s, so stop a little earlier and return what has arrived
+SCRAPE_DEADLINE_SECONDS = float(os.getenv("SCRAPE_DEADLINE_SECONDS", "4.5"))
+SCRAPE_MAX_CONCURRENCY = int(os.getenv("SCRAPE_MAX_CONCURRENCY", "16"))
+SCRAPE_CONNECTIONS_PER_HOST = int(os.getenv("SCRAPE_CONNECTIONS_PER_HOST", "6"))
+# Minimum spacing between request starts to the same host
+SCRAPE_HOST_INTERVAL = float(os.getenv("SCRAPE_HOST_INTERVAL", "0.05"))
+# The news crawler keeps the store warm, so /run only reads it; set this to scrape misses live
+SCRAPE_LIVE_FALLBACK = os.getenv("SCRAPE_LIVE_FALLBACK", "false").lower() == "true"
+ARTICLES_PER_TICKER = 3
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+http_session = None
+fetch_slots = None
+host_next_start = {}
+host_locks = {}
+
 def is_valid_ticker(ticker):
     invalid_patterns = [r"^\^", r"\.SA$", r"\.F$", r"\.SG$", r"\.DU$"]
     return ticker and not any(re.match(pattern, ticker) for pattern in invalid_patterns)
 
+def get_session():
+    """
+    Returns the app-lifetime aiohttp session. The connector caps connections per host;
+    `fetch_slots` caps requests in flight across all hosts.
+    """
+    global http_session, fetch_slots
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=SCRAPE_MAX_CONCURRENCY,
+            limit_per_host=SCRAPE_CONNECTIONS_PER_HOST,
+            use_dns_cache=True,
+        )
+        http_session = aiohttp.ClientSession(connector=connector, headers=HEADERS)
+        fetch_slots = asyncio.Semaphore(SCRAPE_MAX_CONCURRENCY)
+        logging.info("[Scraping Agent] Created shared HTTP client pool")
+    return http_session
+
+async def wait_for_host(host):
+    """
+    Spaces out request starts to one host by SCRAPE_HOST_INTERVAL.
+    """
+    lock = host_locks.setdefault(host, asyncio.Lock())
+    async with lock:
+        now = time.monotonic()
+        start = max(now, host_next_start.get(host, now))
+        host_next_start[host] = start + SCRAPE_HOST_INTERVAL
+    if start > now:
+        await asyncio.sleep(start - now)
+
+async def fetch_page(session, store, url, extractor, extract, timeout):
+    """
+    Conditional GET revalidated against the news store; `extract` only runs on a page
+    whose content changed since it was last stored.
+    """
+    await wait_for_host(urlsplit(url).netloc)
+    headers = store.conditional_headers(url, extractor)
+    async with fetch_slots:
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status != 304:
+                response.raise_for_status()
+            body = await response.text() if response.status != 304 else ""
+            status, response_headers = response.status, response.headers
+    return await asyncio.to_thread(store.record_response, url, extractor, status, response_headers, body, extract)
+
+def parse_article_links(html):
+    urls = []
+    for href in extract("headline_links", html)[:ARTICLES_PER_TICKER]:
+        full_url = f"https://finance.yahoo.com{href}" if href.startswith('/') else href
+        if full_url.startswith("https://finance.yahoo.com"):
+            urls.append(full_url)
+    return urls
+
+def parse_article_snippet(html):
+    content = extract("article_body", html)
+    return content[:200] + "..." if content else None
+
+async def scrape_article(session, store, url, slots, index, deadline):
+    # Slots stay None on failure and become False for an article with no usable text
+    try:
+        timeout = min(3, max(0.1, deadline - time.monotonic()))
+        snippet = await fetch_page(session, store, url, "agent_snippet", parse_article_snippet, timeout)
+        slots[index] = {"url": url, "snippet": snippet} if snippet else False
+    except Exception as e:
+        logging.error(f"[Scrape Error for {url}] {e}")
+
+async def scrape_ticker(session, store, ticker, articles, deadline):
+    """
+    Fetches the ticker's news list, then its articles concurrently. Finished articles
+    are visible in `articles[ticker]` as they land, so a deadline keeps partial results;
+    only complete runs without failed articles are saved to the news store.
+    """
+    try:
+        logging.info(f"📥 Scraping news for: {ticker}")
+        url = f"https://finance.yahoo.com/quote/{ticker}/news/"
+        urls = await fetch_page(session, store, url, "agent_links", parse_article_links, max(0.1, deadline - time.monotonic()))
+        slots = articles[ticker] = [None] * len(urls)
+        await asyncio.gather(*(scrape_article(session, store, u, slots, i, deadline) for i, u in enumerate(urls)))
+        finished = [a for a in slots if a]
+        if finished and None not in slots:
+            await asyncio.to_thread(store.put_ticker_news, ticker, finished)
+    except Exception as e:
+        logging.error(f"[Yahoo News Error for {ticker}] {e}")
+        articles[ticker] = [{"url": None, "snippet": f"Error: {e}"}]
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+
 @app.get("/health")
 async def health():
     return {"status": "Scraping Agent is running"}
@@ -19,39 +129,48 @@ async def health():
 async def scrape_news(request: Request):
     body = await request.json()
     tickers = body.get("tickers", [])
+    store = get_news_store()
     articles = {}
 
+    valid_tickers = []
     for ticker in tickers:
         if not is_valid_ticker(ticker):
             logging.warning(f"[Scraping Agent] Skipping invalid ticker: {ticker}")
             continue
-        try:
-            logging.info(f"📥 Scraping news for: {ticker}")
-            url = f"https://finance.yahoo.com/quote/{ticker}/news/"
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            response = requests.get(url, headers=headers, timeout=5)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            news_items = soup.find_all('h3', class_='Mb(5px)')
-            ticker_articles = []
-            for item in news_items[:3]:
-                link = item.find('a')
-                if link and link['href']:
-                    full_url = f"https://finance.yahoo.com{link['href']}" if link['href'].startswith('/') else link['href']
-                    if not full_url.startswith("https://finance.yahoo.com"):
-                        continue
-                    try:
-                        article_response = requests.get(full_url, headers=headers, timeout=3)
-                        article_response.raise_for_status()
-                        article_soup = BeautifulSoup(article_response.text, 'html.parser')
-                        content = article_soup.find('div', class_='caas-body')
-                        snippet = content.get_text(strip=True)[:200] + "..." if content else "No content available."
-                        ticker_articles.append({"url": full_url, "snippet": snippet})
-                    except Exception as e:
-                        logging.error(f"[Scrape Error for {full_url}] {e}")
-            articles[ticker] = ticker_articles
-        except Exception as e:
-            logging.error(f"[Yahoo News Error for {ticker}] {e}")
-            articles[ticker] = [{"url": None, "snippet": f"Error: {e}"}]
-
-    return {"articles": articles}
\ No newline at end of file
+        valid_tickers.append(ticker)
+    if not valid_tickers:
+        return {"articles": articles}
+
+    # Feeds the crawler's watchlist and priorities
+    await asyncio.to_thread(store.record_queries, valid_tickers)
+
+    missing = []
+    for ticker in valid_tickers:
+        cached, age = store.get_ticker_news(ticker, fresh_only=SCRAPE_LIVE_FALLBACK)
+        if cached is not None:
+            articles[ticker] = cached
+        else:
+            articles[ticker] = []
+            missing.append(ticker)
+
+    if missing and not SCRAPE_LIVE_FALLBACK:
+        logging.info(f"[Scraping Agent] No stored news yet for {missing}; queued for the crawler")
+    elif missing:
+        await scrape_live(missing, articles, store)
+
+    return {"articles": {ticker: [a for a in items if a] for ticker, items in articles.items()}}
+
+async def scrape_live(tickers, articles, store):
+    """
+    Scrapes `tickers` from the network into `articles`, stopping at SCRAPE_DEADLINE_SECONDS
+    with whatever has arrived.
+    """
+    session = get_session()
+    deadline = time.monotonic() + SCRAPE_DEADLINE_SECONDS
+    tasks = [asyncio.create_task(scrape_ticker(session, store, ticker, articles, deadline)) for ticker in tickers]
+    _, pending = await asyncio.wait(tasks, timeout=max(0, deadline - time.monotonic()))
+    if pending:
+        logging.warning(f"[Scraping Agent] Deadline reached with {len(pending)} tickers unfinished, returning partial results")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,120 @@
+"""
+Micro-benchmark: HTML extraction backends vs. the full BeautifulSoup parse they replaced.
+
+    python benchmarks/bench_html_extract.py [fixture_dir]
+
+Saved pages in `fixture_dir` (default benchmarks/fixtures) are used as they are: files
+named *list*.html count as news list pages, every other *.html as an article. Without
+saved pages, Yahoo-like pages of realistic size are generated.
+"""
+import glob
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bs4 import BeautifulSoup
+from data_ingestion import html_extract
+
+random.seed(7)
+WORDS = "market shares revenue guidance quarter chip demand investors growth margin outlook analysts".split()
+
+def sentence(words=18):
+    return " ".join(random.choices(WORDS, k=words)).capitalize() + "."
+
+def boilerplate(blocks=400):
+    # Navigation, scripts and ad slots make up most of a real page
+    parts = []
+    for i in range(blocks):
+        parts.append(f'<div class="nav-{i % 7} D(f)"><span>{sentence(4)}</span><a href="/quote/X{i}">x</a></div>')
+        if i % 20 == 0:
+            parts.append(f"<script>window.__data_{i} = {{'k': '{sentence(30)}'}};</script>")
+    return "".join(parts)
+
+def synthetic_list_page(ticker="TSM", items=40):
+    headlines = "".join(
+        f'<li><div><h3 class="Mb(5px)"><a href="/news/{ticker.lower()}-story-{i}.html">{sentence(8)}</a></h3>'
+        f'<p class="Fz(14px)">{sentence()}</p></div></li>'
+        for i in range(items)
+    )
+    return f"<html><head><title>{ticker}</title></head><body>{boilerplate()}<ul>{headlines}</ul>{boilerplate()}</body></html>"
+
+def synthetic_article_page(paragraphs=30):
+    body = "".join(f"<p>{sentence()} <b>{sentence(5)}</b> {sentence()}</p>" for _ in range(paragraphs))
+    return f'<html><body>{boilerplate()}<article><div class="caas-body">{body}</div></article>{boilerplate()}</body></html>'
+
+def load_fixtures(directory):
+    lists, articles = [], []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            (lists if "list" in os.path.basename(path) else articles).append(f.read())
+    if not lists:
+        lists = [synthetic_list_page(t) for t in ("TSM", "005930.KS", "9988.HK")]
+    if not articles:
+        articles = [synthetic_article_page() for _ in range(6)]
+    return lists, articles
+
+# What the scrapers did before: full html.parser tree, find_all, get_text twice per <p>
+def baseline_headline_links(html):
+    soup = BeautifulSoup(html, "html.parser")
+    links = (item.find("a") for item in soup.find_all("h3", class_="Mb(5px)"))
+    return [link["href"] for link in links if link and link.get("href")]
+
+def baseline_article_body(html):
+    content = BeautifulSoup(html, "html.parser").find("div", class_="caas-body")
+    return content.get_text(strip=True) if content else None
+
+def baseline_paragraphs(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return [p.get_text(strip=True) for p in soup.find_all("p") if p.get_text(strip=True)]
+
+def best_of(func, pages, number=3):
+    return min(timeit.repeat(lambda: [func(page) for page in pages], number=number, repeat=3)) / number / len(pages) * 1e3
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+    lists, articles = load_fixtures(directory)
+    size = sum(map(len, lists + articles)) / len(lists + articles) / 1024
+    print(f"{len(lists)} list pages, {len(articles)} articles, {size:.0f} KiB average\n")
+
+    cases = [
+        ("headline_links", lists, baseline_headline_links),
+        ("article_body", articles, baseline_article_body),
+        ("paragraphs", articles, baseline_paragraphs),
+    ]
+    backends = []
+    for name in html_extract.BACKENDS:
+        try:
+            backends.append(html_extract.get_backend(name))
+        except ValueError:
+            print(f"({name} not installed, skipped)")
+
+    header = f"{'ms / page':>15} | {'baseline':>9} | " + " | ".join(f"{b.name:>10}" for b in backends)
+    print(header)
+    for operation, pages, baseline in cases:
+        expected = [baseline(page) for page in pages]
+        cells = []
+        for backend in backends:
+            func = getattr(backend, operation)
+            if [func(page) for page in pages] != expected:
+                cells.append(f"{'mismatch':>10}")
+                continue
+            cells.append(f"{best_of(func, pages):>10.2f}")
+        print(f"{operation:>15} | {best_of(baseline, pages):>9.2f} | " + " | ".join(cells))
+
+    batch = articles * max(1, 64 // len(articles))
+    started = time.perf_counter()
+    serial = [html_extract.extract("paragraphs", page) for page in batch]
+    serial_seconds = time.perf_counter() - started
+    html_extract.extract_pages("paragraphs", batch[:html_extract.HTML_EXTRACT_WORKERS * 2])  # warm the pool
+    started = time.perf_counter()
+    parallel = html_extract.extract_pages("paragraphs", batch)
+    parallel_seconds = time.perf_counter() - started
+    assert parallel == serial
+    print(f"\n{len(batch)} articles, paragraphs: serial {serial_seconds * 1e3:.0f} ms, "
+          f"{html_extract.HTML_EXTRACT_WORKERS} processes {parallel_seconds * 1e3:.0f} ms")
+
+if __name__ == "__main__":
+    main()
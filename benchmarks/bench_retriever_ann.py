@@ -0,0 +1,89 @@
+"""
+Benchmark: exact (flat) search vs. the ANN indexes and vector codecs the retriever
+promotes to.
+
+    python benchmarks/bench_retriever_ann.py [--sizes 10000,100000,1000000] [--k 10]
+        [--configs flat/float32,flat/int8,hnsw/fp16,ivf/int8,ivf/pq]
+
+Vectors are clustered 384-d float32 (MiniLM's dimension), so IVF partitions behave
+roughly as they do on real embeddings. Ground truth comes from the flat index; each
+configuration reports build time, index bytes per vector, recall@k and single-query
+p50/p99 latency. The 1M
+run needs about 1.5 GiB for the vectors plus the same again per index.
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.retriever_store import build_index, index_kind, index_memory, resolve_index_type, search_parameters
+
+DIMENSION = 384
+
+def clustered_vectors(count, rng, clusters=256, latent=64):
+    # Sentence embeddings have far lower intrinsic dimension than 384; isotropic noise
+    # would make every neighbour equally far and no ANN index could find them
+    seeded = np.random.default_rng(1)
+    centers = seeded.standard_normal((clusters, DIMENSION), dtype=np.float32)
+    basis = seeded.standard_normal((latent, DIMENSION), dtype=np.float32) / np.sqrt(latent)
+    vectors = centers[rng.integers(0, clusters, count)]
+    for start in range(0, count, 65536):
+        block = vectors[start:start + 65536]
+        block += 0.5 * rng.standard_normal((len(block), latent), dtype=np.float32) @ basis
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def recall(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+def latencies(index, queries, k, params):
+    # One query at a time, as /query issues them
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query[None, :], k, params=params)
+        timings.append(time.perf_counter() - started)
+    return np.percentile(timings, 50) * 1e3, np.percentile(timings, 99) * 1e3
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--configs", default="flat/float32,flat/fp16,flat/int8,hnsw/float32,hnsw/fp16,hnsw/int8,"
+                                             "ivf/float32,ivf/int8,ivf/pq")
+    args = parser.parse_args()
+    configs = [resolve_index_type(*config.split("/")) for config in args.configs.split(",")]
+    sweeps = {
+        "flat": [("", {})],
+        "hnsw": [(f"efSearch={ef}", {"ef_search": ef}) for ef in (16, 64, 128)],
+        "ivf": [(f"nprobe={n}", {"nprobe": n}) for n in (4, 16, 64)],
+    }
+    rng = np.random.default_rng(0)
+    print(f"{'size':>9} | {'index':>14} | {'setting':>12} | {'build s':>7} | {'B/vec':>6} | "
+          f"{'recall@' + str(args.k):>9} | {'p50 ms':>7} | {'p99 ms':>7}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = clustered_vectors(size, rng)
+        queries = clustered_vectors(args.queries, rng)
+        flat = faiss.IndexFlatL2(DIMENSION)
+        flat.add(vectors)
+        _, truth = flat.search(queries, args.k)
+        for index_type, codec in configs:
+            started = time.perf_counter()
+            index = flat if (index_type, codec) == ("flat", "float32") else build_index(index_type, codec, vectors)
+            build_seconds = time.perf_counter() - started
+            bytes_per_vector = sum(index_memory(index).values()) / size
+            for label, knobs in sweeps[index_type]:
+                params = search_parameters(index_kind(index), **knobs)
+                _, found = index.search(queries, args.k, params=params)
+                p50, p99 = latencies(index, queries, args.k, params)
+                print(f"{size:>9} | {index_type + '/' + codec:>14} | {label:>12} | {build_seconds:>7.1f} | "
+                      f"{bytes_per_vector:>6.0f} | {recall(found, truth):>9.3f} | {p50:>7.3f} | {p99:>7.3f}")
+            del index
+        del vectors, flat
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Micro-benchmark: Aho-Corasick matcher vs. the per-pattern loops it replaced.
+
+    python benchmarks/bench_text_matcher.py
+"""
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from orchestrator.text_matcher import MultiPatternMatcher
+
+random.seed(7)
+
+def random_word(low=4, high=10):
+    return "".join(random.choices(string.ascii_lowercase, k=random.randint(low, high)))
+
+def build_case(pattern_count, text_words=40):
+    patterns = {}
+    while len(patterns) < pattern_count:
+        phrase = " ".join(random_word() for _ in range(random.randint(1, 2)))
+        patterns[phrase] = random_word()
+    keys = list(patterns)
+    words = [random_word() for _ in range(text_words)]
+    for i in range(0, text_words, 8):
+        words[i] = random.choice(keys)
+    return patterns, " ".join(words)
+
+def loop_replace(patterns, text):
+    for wrong, right in patterns.items():
+        text = text.replace(wrong, right)
+    return text
+
+def loop_scan(patterns, text):
+    return [key for key in patterns if key in text]
+
+def best_of(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+def main():
+    print(f"{'patterns':>8} | {'loop replace':>13} | {'AC replace':>11} | {'loop scan':>10} | {'AC scan':>9} | {'AC build':>9}")
+    for count in (10, 1_000, 10_000):
+        patterns, text = build_case(count)
+        matcher = MultiPatternMatcher(patterns)
+        alias_matcher = MultiPatternMatcher(patterns, whole_words=True)
+        number = 2000 if count <= 10 else 200
+        row = (
+            best_of(lambda: loop_replace(patterns, text), number),
+            best_of(lambda: matcher.replace(text), number),
+            best_of(lambda: loop_scan(patterns, text), number),
+            best_of(lambda: alias_matcher.find_all(text), number),
+            min(timeit.repeat(lambda: MultiPatternMatcher(patterns), number=1, repeat=3)) * 1e3,
+        )
+        print(f"{count:>8} | {row[0]:>10.1f} us | {row[1]:>8.1f} us | {row[2]:>7.1f} us | {row[3]:>6.1f} us | {row[4]:>6.1f} ms")
+
+if __name__ == "__main__":
+    main()
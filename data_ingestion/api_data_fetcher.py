@@ -1,101 +1,389 @@
+import json
 import os
+import re
+import time
+import asyncio
+import threading
+import aiohttp
 import yfinance as yf
 import pandas as pd
-import requests
+import numpy as np
+from collections import defaultdict
 from dotenv import load_dotenv
 import logging
 
 load_dotenv()
 ALPHA_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+OHLCV_STORE_DIR = os.getenv("OHLCV_STORE_DIR", "ohlcv_store")
+# Match these to the API key's plan: the free tier allows 5 requests per minute
+ALPHA_REQUESTS_PER_MINUTE = float(os.getenv("ALPHA_VANTAGE_REQUESTS_PER_MINUTE", "5"))
+ALPHA_BURST = int(os.getenv("ALPHA_VANTAGE_BURST", "5"))
+ALPHA_MAX_CONCURRENCY = int(os.getenv("ALPHA_VANTAGE_MAX_CONCURRENCY", "8"))
+# Wall-clock budget for one fallback run; the orchestrator waits about 8 s for the API Agent
+ALPHA_FALLBACK_BUDGET_SECONDS = float(os.getenv("ALPHA_VANTAGE_FALLBACK_BUDGET_SECONDS", "5"))
 logging.basicConfig(level=logging.INFO)
 
-def get_stock_data_yfinance(tickers, period="5d"):
-    """
-    Get stock data using yfinance for multiple tickers.
-    Returns dictionary with cleaned data.
-    """
-    try:
-        if not tickers:
-            return {"error": "No tickers provided"}
-        joined_tickers = " ".join(tickers)
-        data = yf.download(joined_tickers, period=period, group_by="ticker", auto_adjust=True)
-
-        result = {}
-        if isinstance(data.columns, pd.MultiIndex):
-            for ticker in tickers:
-                if ticker in data.columns.levels[0]:
-                    df = data[ticker].copy().fillna(0).replace([float("inf"), float("-inf")], 0)
-                    result[ticker] = df.reset_index().to_dict(orient="records")
-                else:
-                    result[ticker] = {"error": f"No data found for {ticker}"}
+# Exchange timezone by Yahoo symbol suffix, until YFinance reports the real one; plain
+# symbols are US listings. Session dates are read in this timezone, not in UTC
+EXCHANGE_TIMEZONES = {
+    "KS": "Asia/Seoul", "KQ": "Asia/Seoul", "HK": "Asia/Hong_Kong", "T": "Asia/Tokyo",
+    "TW": "Asia/Taipei", "TWO": "Asia/Taipei", "SS": "Asia/Shanghai", "SZ": "Asia/Shanghai",
+    "NS": "Asia/Kolkata", "BO": "Asia/Kolkata", "SI": "Asia/Singapore", "AX": "Australia/Sydney",
+    "L": "Europe/London", "DE": "Europe/Berlin", "PA": "Europe/Paris", "TO": "America/Toronto",
+}
+DEFAULT_TIMEZONE = "America/New_York"
+
+# Bars are stored as one structured array per (symbol, interval); ts is UTC nanoseconds.
+# Daily bars are stamped at local midnight of their session in the exchange timezone
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+class OHLCVStore:
+    """
+    Columnar on-disk bar store: one .npy file of BAR_DTYPE rows per symbol and interval,
+    sorted by timestamp and opened memory-mapped, so range queries are zero-copy slices.
+    Each symbol's exchange timezone is kept in `timezones.json`.
+    """
+    def __init__(self, root=OHLCV_STORE_DIR):
+        self.root = root
+        self.maps = {}
+        os.makedirs(root, exist_ok=True)
+        self.timezones_path = os.path.join(root, "timezones.json")
+        self.timezones = {}
+        if os.path.exists(self.timezones_path):
+            with open(self.timezones_path, encoding="utf-8") as f:
+                self.timezones = json.load(f)
+
+    def timezone(self, symbol):
+        """
+        The exchange timezone the symbol's sessions are dated in.
+        """
+        return self.timezones.get(symbol) or exchange_timezone(symbol)
+
+    def set_timezone(self, symbol, tz):
+        if not tz or self.timezones.get(symbol) == tz:
+            return
+        self.timezones[symbol] = tz
+        tmp_path = f"{self.timezones_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.timezones, f)
+        os.replace(tmp_path, self.timezones_path)
+
+    def path(self, symbol, interval="1d"):
+        safe_symbol = re.sub(r"[^A-Za-z0-9.\-]", "_", symbol)
+        return os.path.join(self.root, f"{safe_symbol}_{interval}.npy")
+
+    def bars(self, symbol, interval="1d"):
+        key = (symbol, interval)
+        if key not in self.maps:
+            path = self.path(symbol, interval)
+            if not os.path.exists(path):
+                return np.empty(0, dtype=BAR_DTYPE)
+            self.maps[key] = np.load(path, mmap_mode="r")
+        return self.maps[key]
+
+    def last_timestamp(self, symbol, interval="1d"):
+        bars = self.bars(symbol, interval)
+        return int(bars["ts"][-1]) if len(bars) else None
+
+    def append(self, symbol, bars, interval="1d"):
+        """
+        Merges new bars in; a new bar replaces a stored one with the same timestamp
+        (the still-forming latest bar). The file is rewritten atomically.
+        """
+        if not len(bars):
+            return
+        bars = np.sort(bars, order="ts")
+        existing = self.bars(symbol, interval)
+        keep = existing[existing["ts"] < bars["ts"][0]]
+        merged = np.concatenate([keep, bars]).astype(BAR_DTYPE)
+
+        path = self.path(symbol, interval)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, merged)
+        self.maps.pop((symbol, interval), None)
+        os.replace(tmp_path, path)
+
+    def range(self, symbol, start=None, end=None, interval="1d"):
+        """
+        Returns a memory-mapped view of bars with start <= ts < end (ns or anything
+        pd.Timestamp accepts), without copying.
+        """
+        bars = self.bars(symbol, interval)
+        ts = bars["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, to_ns(start), side="left"))
+        hi = len(bars) if end is None else int(np.searchsorted(ts, to_ns(end), side="left"))
+        return bars[lo:hi]
+
+    def tail(self, symbol, count, interval="1d"):
+        bars = self.bars(symbol, interval)
+        return bars[max(0, len(bars) - count):]
+
+def exchange_timezone(symbol):
+    _, _, suffix = symbol.rpartition(".")
+    return EXCHANGE_TIMEZONES.get(suffix.upper(), DEFAULT_TIMEZONE) if "." in symbol else DEFAULT_TIMEZONE
+
+def session_timestamp(ts, tz):
+    """
+    The stored UTC nanosecond timestamp as a Timestamp in the exchange timezone, so
+    `.date()` is the local session date.
+    """
+    return pd.Timestamp(int(ts), tz="UTC").tz_convert(tz)
+
+def to_ns(value):
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp.value
+
+def frame_to_bars(df):
+    """
+    Converts a yfinance OHLCV frame into BAR_DTYPE rows, dropping rows without a close.
+    """
+    df = df.dropna(subset=["Close"])
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    # DatetimeIndex.values is UTC for tz-aware indexes; normalize the unit to ns
+    bars["ts"] = df.index.values.astype("datetime64[ns]").view("i8")
+    for field, column in (("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close"), ("volume", "Volume")):
+        bars[field] = df[column].to_numpy(dtype="f8", na_value=0.0)
+    return bars
+
+def bars_to_records(bars, tz="UTC"):
+    """
+    Converts stored bars to the record format the agents exchange, dated in `tz`.
+    """
+    return [
+        {
+            "Date": session_timestamp(bar["ts"], tz),
+            "Open": float(bar["open"]),
+            "High": float(bar["high"]),
+            "Low": float(bar["low"]),
+            "Close": float(bar["close"]),
+            "Volume": float(bar["volume"]),
+        }
+        for bar in bars
+    ]
+
+ohlcv_store = OHLCVStore()
+
+def update_stock_store(tickers, period="5d", interval="1d", store=None):
+    """
+    Brings the local bar store up to date, downloading only bars from each ticker's
+    last stored bar onward (a full `period` for tickers not stored yet).
+    Returns the tickers that still have no stored bars.
+    """
+    store = store or ohlcv_store
+    groups = defaultdict(list)
+    for ticker in tickers:
+        last_ts = store.last_timestamp(ticker, interval)
+        # Re-fetch from the last stored bar so a still-forming bar gets its final values
+        start = None if last_ts is None else str(session_timestamp(last_ts, store.timezone(ticker)).date())
+        groups[start].append(ticker)
+
+    for start, group in groups.items():
+        try:
+            if start is None:
+                data = yf.download(" ".join(group), period=period, interval=interval, group_by="ticker", auto_adjust=True, progress=False)
+            else:
+                data = yf.download(" ".join(group), start=start, interval=interval, group_by="ticker", auto_adjust=True, progress=False)
+        except Exception as e:
+            logging.error(f"[OHLCV Store] Download failed for {group}: {e}")
+            continue
+        if data is None or data.empty:
+            continue
+        for ticker in group:
+            if isinstance(data.columns, pd.MultiIndex):
+                if ticker not in data.columns.levels[0]:
+                    continue
+                df = data[ticker]
+            else:
+                df = data
+            if isinstance(df.index, pd.DatetimeIndex) and df.index.tz is not None:
+                store.set_timezone(ticker, str(df.index.tz))
+            store.append(ticker, frame_to_bars(df), interval)
+        logging.info(f"[OHLCV Store] Refreshed {group} from {start or period}")
+
+    return [t for t in tickers if store.last_timestamp(t, interval) is None]
+
+def get_stored_stock_data(tickers, period="5d", interval="1d", store=None):
+    """
+    Serves `period` worth of bars per ticker from the local store as records.
+    "Nd" periods on daily bars mean the last N bars, as with yfinance.
+    """
+    store = store or ohlcv_store
+    result = {}
+    for ticker in tickers:
+        match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period or "")
+        last_ts = store.last_timestamp(ticker, interval)
+        if match and match.group(2) == "d" and interval == "1d":
+            bars = store.tail(ticker, int(match.group(1)), interval)
+        elif match and last_ts is not None:
+            units = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}[match.group(2)]
+            start = pd.Timestamp(last_ts) - pd.DateOffset(**{units: int(match.group(1))})
+            bars = store.range(ticker, start=start, interval=interval)
         else:
-            df = data.copy().fillna(0).replace([float("inf"), float("-inf")], 0)
-            result[tickers[0]] = df.reset_index().to_dict(orient="records")
-
-        logging.info(f"[YFinance] Successfully fetched data for {tickers}")
-        return result
-    except Exception as e:
-        logging.error(f"[YFinance Error] {e}")
-        return {ticker: {"error": f"YFinance failed: {e}"} for ticker in tickers}
-
-def get_stock_data_alphavantage(ticker, outputsize="compact"):
-    """
-    Get stock data using Alpha Vantage for a single ticker.
-    Returns JSON-safe dictionary of daily data.
-    """
-    try:
-        url = (
-            f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY_ADJUSTED"
-            f"&symbol={ticker}&outputsize={outputsize}&apikey={ALPHA_API_KEY}"
-        )
-        response = requests.get(url, timeout=10)
+            bars = store.bars(ticker, interval)
+        result[ticker] = bars_to_records(bars, store.timezone(ticker)) if len(bars) else {"error": f"No data found for {ticker}"}
+    return result
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: `rate` tokens per second after an initial `capacity`
+    burst. A caller only reserves a token it can have within its own deadline, so
+    callers that give up never leave debt behind for the next ones.
+    Thread-safe and not tied to one event loop.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, max_wait=0.0):
+        """
+        Takes a token and returns the seconds until it is usable, or None (taking
+        nothing) if that would be longer than `max_wait`.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            if wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+    async def acquire(self, max_wait=0.0):
+        """
+        Returns True once a token is ours, False if none comes within `max_wait`.
+        """
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+alpha_bucket = TokenBucket(ALPHA_REQUESTS_PER_MINUTE / 60, ALPHA_BURST)
+
+async def fetch_alphavantage_bars(session, ticker, rows=5, timeout=10, tz="UTC"):
+    """
+    Streams Alpha Vantage's CSV (newest day first) and parses only the first `rows`
+    lines, then drops the rest of the payload. Its dates are local session dates, so
+    they are stamped at midnight in `tz`, as YFinance stamps its daily bars.
+    """
+    url = (
+        f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY_ADJUSTED"
+        f"&symbol={ticker}&outputsize=compact&datatype=csv&apikey={ALPHA_API_KEY}"
+    )
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
         response.raise_for_status()
-        data = response.json()
-
-        if "Time Series (Daily)" not in data:
-            return {"error": "AlphaVantage returned no data"}
-
-        daily_data = data["Time Series (Daily)"]
-        formatted_data = [
-            {
-                "Date": date,
-                "Open": float(info["1. open"]),
-                "High": float(info["2. high"]),
-                "Low": float(info["3. low"]),
-                "Close": float(info["4. close"]),
-                "Volume": float(info["6. volume"]),
-            }
-            for date, info in daily_data.items()
-        ]
-
-        logging.info(f"[AlphaVantage] Successfully fetched data for {ticker}")
-        return list(reversed(formatted_data))[:1]  # Return only the latest day
-    except Exception as e:
-        logging.error(f"[AlphaVantage Error for {ticker}] {e}")
-        return {"error": f"AlphaVantage failed: {e}"}
+        header = None
+        bars = []
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").strip()
+            if not line:
+                continue
+            if header is None:
+                header = line.split(",")
+                if "timestamp" not in header:
+                    # Errors and quota notes come back as JSON instead of CSV
+                    raise ValueError(f"AlphaVantage returned no data: {line[:200]}")
+                col = {name: i for i, name in enumerate(header)}
+                continue
+            fields = line.split(",")
+            bars.append((
+                pd.Timestamp(fields[col["timestamp"]]).tz_localize(tz).value,
+                float(fields[col["open"]]),
+                float(fields[col["high"]]),
+                float(fields[col["low"]]),
+                float(fields[col["close"]]),
+                float(fields[col["volume"]]),
+            ))
+            if len(bars) >= rows:
+                break
+    return np.array(bars[::-1], dtype=BAR_DTYPE)
+
+async def fetch_alphavantage_fallback(tickers, rows=5, store=None, budget=None):
+    """
+    Fetches the failed tickers from Alpha Vantage concurrently and writes the bars
+    into the local store, all within `budget` seconds. Tickers that get no token from
+    the shared bucket in time are not requested at all.
+    Returns the tickers it could not serve; they are still missing from the store, so
+    the next refresh tries them again.
+    """
+    store = store or ohlcv_store
+    budget = ALPHA_FALLBACK_BUDGET_SECONDS if budget is None else budget
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    semaphore = asyncio.Semaphore(ALPHA_MAX_CONCURRENCY)
+    served = set()
+
+    async def fetch_one(session, ticker):
+        async with semaphore:
+            # Leave time for the request itself after waiting for a token
+            remaining = deadline - loop.time()
+            if not await alpha_bucket.acquire(max_wait=remaining / 2):
+                return
+            try:
+                bars = await fetch_alphavantage_bars(session, ticker, rows, timeout=min(10, deadline - loop.time()),
+                                                     tz=store.timezone(ticker))
+                store.append(ticker, bars)
+                served.add(ticker)
+                logging.info(f"[AlphaVantage] Successfully fetched data for {ticker}")
+            except Exception as e:
+                logging.error(f"[AlphaVantage Error for {ticker}] {e}")
+
+    if budget > 0 and tickers:
+        async with aiohttp.ClientSession() as session:
+            tasks = [asyncio.ensure_future(fetch_one(session, ticker)) for ticker in tickers]
+            _, late = await asyncio.wait(tasks, timeout=budget)
+            for task in late:
+                task.cancel()
+            if late:
+                await asyncio.wait(late)
+    unserved = [ticker for ticker in tickers if ticker not in served]
+    if unserved:
+        logging.warning(f"[AlphaVantage] Deferred {unserved} to the next refresh")
+    return unserved
+
+def run_alphavantage_fallback(tickers, rows=5, store=None, budget=None):
+    """
+    Synchronous entry point for fetch_alphavantage_fallback, for callers without a
+    running event loop; async callers await the coroutine instead.
+    """
+    return asyncio.run(fetch_alphavantage_fallback(tickers, rows, store, budget))
 
 def get_multiple_stocks_data(tickers, period="5d", fallback_to_alpha=True):
     """
-    Attempts to fetch from YFinance first, falls back to AlphaVantage if enabled.
+    Serves bars from the local store after a delta-only YFinance refresh,
+    falls back to AlphaVantage if enabled.
     """
     if not tickers:
         return {"error": "No tickers provided"}
 
-    yf_data = get_stock_data_yfinance(tickers, period)
-    failed_tickers = [t for t in tickers if "error" in yf_data.get(t, {})]
+    failed_tickers = update_stock_store(tickers, period)
+    yf_data = get_stored_stock_data(tickers, period)
 
     if not failed_tickers:
         return yf_data
 
     if fallback_to_alpha:
-        alpha_data = {}
-        for ticker in failed_tickers:
-            data = get_stock_data_alphavantage(ticker)
-            alpha_data[ticker] = data
-        # Merge yfinance and Alpha Vantage data
-        for ticker in tickers:
-            if ticker in alpha_data and "error" not in alpha_data[ticker]:
-                yf_data[ticker] = alpha_data[ticker]
+        unserved = set(run_alphavantage_fallback(failed_tickers))
+        # Merge Alpha Vantage bars, now in the store, with the YFinance data
+        recovered = [t for t in failed_tickers if t not in unserved]
+        yf_data.update(get_stored_stock_data(recovered, period))
         return yf_data
     else:
         return {"error": "YFinance failed and fallback disabled."}
\ No newline at end of file
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import re
+from typing import Callable, List, Optional
+
+# Budgets are in word-piece-like tokens; all-MiniLM-L6-v2 truncates at 256, so windows
+# stay under it with room for the approximation error
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+# A sentence ends at . ! or ? followed by a capital or quote ("Oct. 30" stays whole),
+# or at a blank line
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z\"'“])|\n\s*\n")
+# Words, and each punctuation mark on its own, roughly as a word-piece tokenizer splits them
+TOKEN = re.compile(r"\w+|[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
+
+def count_tokens(text: str) -> int:
+    return len(TOKEN.findall(text))
+
+def normalize(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip()
+
+def chunk_hash(text: str) -> int:
+    """
+    64-bit content hash of a chunk, insensitive to whitespace differences.
+    """
+    return int.from_bytes(hashlib.blake2b(normalize(text).encode("utf-8"), digest_size=8).digest(), "little")
+
+def split_sentences(text: str) -> List[str]:
+    sentences = (normalize(sentence) for sentence in SENTENCE_SPLIT.split(text))
+    return [sentence for sentence in sentences if sentence]
+
+def split_long_sentence(sentence: str, max_tokens: int, overlap_tokens: int, token_counter) -> List[str]:
+    # Whole words only, so numbers and names are never cut in half
+    words = sentence.split()
+    pieces = []
+    start = 0
+    while start < len(words):
+        end, tokens = start, 0
+        while end < len(words) and (end == start or tokens + token_counter(words[end]) <= max_tokens):
+            tokens += token_counter(words[end])
+            end += 1
+        pieces.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        back, carried = end, 0
+        while back > start + 1 and carried + token_counter(words[back - 1]) <= overlap_tokens:
+            back -= 1
+            carried += token_counter(words[back])
+        start = back
+    return pieces
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+               token_counter: Optional[Callable[[str], int]] = None) -> List[str]:
+    """
+    Splits text into sliding windows of whole sentences, each at most `max_tokens`
+    tokens. Consecutive windows share up to `overlap_tokens` of trailing sentences, so
+    a fact straddling a boundary appears intact in one of them. Sentences longer than
+    the budget are split on word boundaries.
+    """
+    token_counter = token_counter or count_tokens
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    units = []
+    for sentence in split_sentences(text):
+        tokens = token_counter(sentence)
+        if tokens <= max_tokens:
+            units.append((sentence, tokens))
+        else:
+            units.extend((piece, token_counter(piece))
+                         for piece in split_long_sentence(sentence, max_tokens, overlap_tokens, token_counter))
+
+    chunks = []
+    window, window_tokens = [], 0
+    for sentence, tokens in units:
+        if window and window_tokens + tokens > max_tokens:
+            chunks.append(" ".join(s for s, _ in window))
+            # Carry the tail of the window over as overlap
+            carried, carried_tokens = [], 0
+            for previous, previous_tokens in reversed(window):
+                if carried_tokens + previous_tokens > overlap_tokens or carried_tokens + previous_tokens + tokens > max_tokens:
+                    break
+                carried.insert(0, (previous, previous_tokens))
+                carried_tokens += previous_tokens
+            window, window_tokens = carried, carried_tokens
+        window.append((sentence, tokens))
+        window_tokens += tokens
+    if window:
+        chunks.append(" ".join(s for s, _ in window))
+    return chunks
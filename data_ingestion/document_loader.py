@@ -1,10 +1,12 @@
 import requests
-from bs4 import BeautifulSoup
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import logging
+from data_ingestion.chunking import chunk_text
+from data_ingestion.html_extract import extract, extract_pages
 
 logging.basicConfig(level=logging.INFO)
 model = SentenceTransformer("all-MiniLM-L6-v2")
@@ -12,45 +14,68 @@ dimension = 384
 index = faiss.IndexFlatL2(dimension)
 metadata = []
 
-def scrape_article_text(url: str, min_length: int = 300) -> str:
-    """
-    Scrapes article text from a URL using BeautifulSoup.
-    """
+FETCH_WORKERS = 8
+
+def fetch_html(url: str) -> Optional[str]:
     try:
         response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        paragraphs = soup.find_all("p")
-        text = " ".join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
+        return response.text
+    except Exception as e:
+        logging.error(f"❌ Error scraping {url}: {e}")
+        return None
+
+def clean_article_text(url: str, paragraphs: List[str], min_length: int = 300) -> str:
+    text = " ".join(paragraphs)
 
-        if any(term in text.lower() for term in ["enable js", "internal server error", "please enable"]):
-            logging.warning(f"⚠️ JS-blocked or invalid content: {url}")
-            return ""
+    if any(term in text.lower() for term in ["enable js", "internal server error", "please enable"]):
+        logging.warning(f"⚠️ JS-blocked or invalid content: {url}")
+        return ""
 
-        if len(text) < min_length:
-            logging.warning(f"⚠️ Insufficient content: {url}")
-            return ""
+    if len(text) < min_length:
+        logging.warning(f"⚠️ Insufficient content: {url}")
+        return ""
 
-        logging.info(f"✅ Scraped: {url}")
-        return text
+    logging.info(f"✅ Scraped: {url}")
+    return text
+
+def scrape_article_text(url: str, min_length: int = 300) -> str:
+    """
+    Scrapes article text (its <p> paragraphs) from a URL.
+    """
+    html = fetch_html(url)
+    if html is None:
+        return ""
+    try:
+        return clean_article_text(url, extract("paragraphs", html), min_length)
     except Exception as e:
         logging.error(f"❌ Error scraping {url}: {e}")
         return ""
 
-def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
+def scrape_articles(urls: List[str], min_length: int = 300) -> List[str]:
     """
-    Splits the text into chunks of given size (by word count).
+    Scrapes many URLs: pages are downloaded concurrently, then parsed in one batch
+    across processes. Returns one text per URL, "" where scraping failed.
     """
-    words = text.split()
-    return [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        pages = list(pool.map(fetch_html, urls))
+    fetched = [i for i, html in enumerate(pages) if html is not None]
+    texts = [""] * len(urls)
+    try:
+        paragraphs = extract_pages("paragraphs", [pages[i] for i in fetched])
+    except Exception as e:
+        logging.error(f"❌ Error parsing scraped pages: {e}")
+        return texts
+    for i, page_paragraphs in zip(fetched, paragraphs):
+        texts[i] = clean_article_text(urls[i], page_paragraphs, min_length)
+    return texts
 
 def index_documents_from_urls(urls: List[str]):
     """
     Scrapes and indexes documents from a list of URLs.
     """
     global metadata
-    for url in urls:
-        article = scrape_article_text(url)
+    for article in scrape_articles(urls):
         if not article:
             continue
         chunks = chunk_text(article)
@@ -71,8 +96,7 @@ def load_article_text_from_urls(urls: List[str]) -> List[str]:
     Scrapes and returns all text chunks from the given URLs.
     """
     all_chunks = []
-    for url in urls:
-        article = scrape_article_text(url)
+    for article in scrape_articles(urls):
         if not article:
             continue
         chunks = chunk_text(article)
@@ -0,0 +1,192 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# selectolax | lxml | bs4, or auto for the fastest one installed
+HTML_EXTRACT_BACKEND = os.getenv("HTML_EXTRACT_BACKEND", "auto")
+HTML_EXTRACT_WORKERS = int(os.getenv("HTML_EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+# Batches smaller than this are parsed inline; process start-up and pickling cost more
+PARALLEL_MIN_PAGES = int(os.getenv("HTML_EXTRACT_PARALLEL_MIN_PAGES", "4"))
+
+HEADLINE_CLASS = "Mb(5px)"
+ARTICLE_BODY_CLASS = "caas-body"
+
+def class_token(css_class):
+    # Strainers see the raw class attribute, so match it as a space-separated token list
+    return lambda value: bool(value) and css_class in value.split()
+
+class Bs4Backend:
+    """
+    BeautifulSoup restricted by SoupStrainers, so only the targeted tags are built.
+    Text follows `get_text(strip=True)`: each text node stripped and joined with no separator.
+    """
+    name = "bs4"
+
+    def __init__(self):
+        try:
+            import lxml  # noqa: F401
+            self.parser = "lxml"
+        except ImportError:
+            self.parser = "html.parser"
+
+    def headline_links(self, html):
+        soup = BeautifulSoup(html, self.parser, parse_only=SoupStrainer("h3", class_=class_token(HEADLINE_CLASS)))
+        links = (item.find("a") for item in soup.find_all("h3"))
+        return [link.get("href") for link in links if link is not None and link.get("href")]
+
+    def news_links(self, html):
+        soup = BeautifulSoup(html, self.parser, parse_only=SoupStrainer("a", href=lambda href: href and "/news/" in href))
+        return [a["href"] for a in soup.find_all("a")]
+
+    def article_body(self, html):
+        soup = BeautifulSoup(html, self.parser, parse_only=SoupStrainer("div", class_=class_token(ARTICLE_BODY_CLASS)))
+        content = soup.find("div")
+        return content.get_text(strip=True) if content else None
+
+    def paragraphs(self, html):
+        soup = BeautifulSoup(html, self.parser, parse_only=SoupStrainer("p"))
+        texts = (p.get_text(strip=True) for p in soup.find_all("p"))
+        return [text for text in texts if text]
+
+class LxmlBackend:
+    """
+    libxml2 tree with XPath lookups; several times faster than BeautifulSoup.
+    """
+    name = "lxml"
+    HEADLINES = f"//h3[contains(concat(' ', normalize-space(@class), ' '), ' {HEADLINE_CLASS} ')]"
+    ARTICLE_BODY = f"//div[contains(concat(' ', normalize-space(@class), ' '), ' {ARTICLE_BODY_CLASS} ')]"
+    TEXT = ".//text()[not(ancestor::script) and not(ancestor::style)]"
+
+    def __init__(self):
+        import lxml.etree
+        import lxml.html
+        self.lxml_html = lxml.html
+        self.parser_error = lxml.etree.ParserError
+        self.utf8_parser = lxml.html.HTMLParser(encoding="utf-8")
+
+    def parse(self, html):
+        try:
+            try:
+                return self.lxml_html.fromstring(html)
+            except ValueError:
+                # lxml refuses str input carrying an XML encoding declaration; the text
+                # is already decoded, so hand it over as UTF-8 bytes
+                return self.lxml_html.fromstring(html.encode("utf-8"), parser=self.utf8_parser)
+        except self.parser_error:
+            # Empty, whitespace- or comment-only documents
+            return None
+
+    def text(self, element):
+        return "".join(part.strip() for part in element.xpath(self.TEXT))
+
+    def headline_links(self, html):
+        root = self.parse(html)
+        if root is None:
+            return []
+        links = (item.xpath(".//a[1]") for item in root.xpath(self.HEADLINES))
+        return [link[0].get("href") for link in links if link and link[0].get("href")]
+
+    def news_links(self, html):
+        root = self.parse(html)
+        return [] if root is None else root.xpath("//a[contains(@href, '/news/')]/@href")
+
+    def article_body(self, html):
+        root = self.parse(html)
+        content = None if root is None else root.xpath(self.ARTICLE_BODY)
+        return self.text(content[0]) if content else None
+
+    def paragraphs(self, html):
+        root = self.parse(html)
+        texts = () if root is None else (self.text(p) for p in root.xpath("//p"))
+        return [text for text in texts if text]
+
+class SelectolaxBackend:
+    """
+    Lexbor parser through selectolax, the fastest option when installed.
+    """
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self.parser = LexborHTMLParser
+
+    @staticmethod
+    def has_class(node, css_class):
+        return css_class in (node.attributes.get("class") or "").split()
+
+    @staticmethod
+    def text(node):
+        for hidden in node.css("script, style"):
+            hidden.decompose()
+        return node.text(deep=True, separator="", strip=True)
+
+    def headline_links(self, html):
+        links = []
+        for item in self.parser(html).css("h3"):
+            if self.has_class(item, HEADLINE_CLASS):
+                link = item.css_first("a")
+                if link is not None and link.attributes.get("href"):
+                    links.append(link.attributes["href"])
+        return links
+
+    def news_links(self, html):
+        return [a.attributes["href"] for a in self.parser(html).css("a[href*='/news/']")]
+
+    def article_body(self, html):
+        for node in self.parser(html).css("div"):
+            if self.has_class(node, ARTICLE_BODY_CLASS):
+                return self.text(node)
+        return None
+
+    def paragraphs(self, html):
+        texts = (self.text(p) for p in self.parser(html).css("p"))
+        return [text for text in texts if text]
+
+BACKENDS = {"selectolax": SelectolaxBackend, "lxml": LxmlBackend, "bs4": Bs4Backend}
+OPERATIONS = ("headline_links", "news_links", "article_body", "paragraphs")
+
+backends = {}
+process_pool = None
+
+def get_backend(name=None):
+    """
+    Returns the named backend, or the configured one. `auto` picks the first of
+    selectolax, lxml and bs4 that imports.
+    """
+    name = name or HTML_EXTRACT_BACKEND
+    if name in backends:
+        return backends[name]
+    candidates = list(BACKENDS) if name == "auto" else [name]
+    for candidate in candidates:
+        try:
+            backend = BACKENDS[candidate]()
+        except ImportError:
+            continue
+        backends[name] = backend
+        logging.info(f"[HTML Extract] Using {backend.name} backend")
+        return backend
+    raise ValueError(f"HTML extraction backend '{name}' is not available")
+
+def extract(operation, html, backend=None):
+    """
+    Runs one of OPERATIONS on a page: headline_links, news_links, article_body or paragraphs.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown extraction '{operation}'")
+    return getattr(get_backend(backend), operation)(html)
+
+def extract_pages(operation, pages, backend=None):
+    """
+    Runs `operation` over many pages, in parallel across HTML_EXTRACT_WORKERS processes
+    for large batches. Results come back in page order.
+    """
+    global process_pool
+    pages = list(pages)
+    if len(pages) < PARALLEL_MIN_PAGES or HTML_EXTRACT_WORKERS < 2:
+        return [extract(operation, html, backend) for html in pages]
+    if process_pool is None:
+        process_pool = ProcessPoolExecutor(max_workers=HTML_EXTRACT_WORKERS)
+    chunksize = max(1, len(pages) // (HTML_EXTRACT_WORKERS * 4))
+    return list(process_pool.map(extract, [operation] * len(pages), pages, [backend] * len(pages), chunksize=chunksize))
@@ -0,0 +1,122 @@
+"""
+Background news crawler: keeps the news store warm so the Scraping Agent can answer
+from it without touching the network.
+
+    python -m data_ingestion.news_crawler            # run forever
+    python -m data_ingestion.news_crawler --once     # one cycle, e.g. against a fixture server
+
+Set NEWS_BASE_URL to crawl somewhere other than finance.yahoo.com.
+"""
+import argparse
+import heapq
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from data_ingestion import scraper
+from data_ingestion.news_store import get_news_store
+
+logging.basicConfig(level=logging.INFO)
+
+# Always watched; the same Asia tech basket the orchestrator uses
+SEED_TICKERS = [t.strip() for t in os.getenv("CRAWLER_SEED_TICKERS", "005930.KS,TSM,9988.HK,0992.HK,1810.HK").split(",") if t.strip()]
+CRAWLER_INTERVAL_SECONDS = float(os.getenv("CRAWLER_INTERVAL_SECONDS", "30"))
+CRAWLER_BATCH_SIZE = int(os.getenv("CRAWLER_BATCH_SIZE", "10"))
+CRAWLER_WORKERS = int(os.getenv("CRAWLER_WORKERS", "4"))
+# Tickers queried within this window join the watchlist
+CRAWLER_QUERY_WINDOW_SECONDS = float(os.getenv("CRAWLER_QUERY_WINDOW_SECONDS", str(7 * 24 * 3600)))
+# Refresh a ticker once this fraction of its TTL has passed, so readers never see it expire
+CRAWLER_REFRESH_FRACTION = float(os.getenv("CRAWLER_REFRESH_FRACTION", "0.8"))
+# A ticker whose refresh fails waits this long, doubling per consecutive failure up to the cap
+CRAWLER_BACKOFF_SECONDS = float(os.getenv("CRAWLER_BACKOFF_SECONDS", "60"))
+CRAWLER_MAX_BACKOFF_SECONDS = float(os.getenv("CRAWLER_MAX_BACKOFF_SECONDS", "3600"))
+
+def watchlist(store):
+    """
+    {ticker: decayed query count}: seeds plus every recently queried ticker.
+    """
+    tickers = {ticker: 0.0 for ticker in SEED_TICKERS}
+    tickers.update(store.query_scores(CRAWLER_QUERY_WINDOW_SECONDS))
+    return tickers
+
+def due_tickers(store, limit=CRAWLER_BATCH_SIZE):
+    """
+    Tickers due for a refresh, most urgent first. Urgency is staleness (age over TTL)
+    weighted by how often the ticker is asked for; never-crawled tickers come first.
+    Tickers backing off after a failed refresh are skipped until their retry time.
+    """
+    ages = store.ticker_ages()
+    backed_off = store.backed_off_tickers()
+    priorities = []
+    for ticker, score in watchlist(store).items():
+        if ticker in backed_off:
+            continue
+        ttl = store.ticker_ttl(ticker)
+        age = ages.get(ticker)
+        staleness = math.inf if age is None else age / ttl
+        if staleness >= CRAWLER_REFRESH_FRACTION:
+            priorities.append((staleness * (1 + math.log1p(score)), score, ticker))
+    return [ticker for _, _, ticker in heapq.nlargest(limit, priorities)]
+
+def crawl_ticker(ticker, store):
+    """
+    Refreshes one ticker and returns its article count. The scraper stores a ticker only
+    when every article downloaded, so anything else counts as a failure and backs off.
+    """
+    started = time.time()
+    try:
+        news = scraper.scrape_stocks_news([ticker], store=store, force=True)
+        count = len(news.get(ticker, []))
+    except Exception as e:
+        logging.error(f"[News Crawler] Failed to crawl {ticker}: {e}")
+        count = 0
+    _, age = store.get_ticker_news(ticker, fresh_only=False)
+    if age is not None and age <= time.time() - started:
+        store.clear_crawl_failures(ticker)
+        return count
+    failures = store.record_crawl_failure(ticker, CRAWLER_BACKOFF_SECONDS, CRAWLER_MAX_BACKOFF_SECONDS)
+    logging.warning(f"[News Crawler] {ticker} not refreshed ({failures} consecutive failures), backing off")
+    return count
+
+def crawl_once(store=None, executor=None):
+    """
+    Refreshes one batch of due tickers and returns them.
+    """
+    store = store or get_news_store()
+    due = due_tickers(store)
+    if not due:
+        return []
+    started = time.monotonic()
+    if executor is None:
+        counts = [crawl_ticker(ticker, store) for ticker in due]
+    else:
+        counts = list(executor.map(lambda ticker: crawl_ticker(ticker, store), due))
+    logging.info(f"[News Crawler] Refreshed {len(due)} tickers ({sum(counts)} articles) in {time.monotonic() - started:.1f}s: {due}")
+    return due
+
+def run_forever(interval=CRAWLER_INTERVAL_SECONDS):
+    store = get_news_store()
+    logging.info(f"[News Crawler] Crawling {scraper.NEWS_BASE_URL} every {interval}s, seeds {SEED_TICKERS}")
+    with ThreadPoolExecutor(max_workers=CRAWLER_WORKERS, thread_name_prefix="news-crawler") as executor:
+        while True:
+            try:
+                crawl_once(store, executor)
+                store.prune(max_age=7 * 24 * 3600)
+            except Exception as e:
+                logging.error(f"[News Crawler] Cycle failed: {e}")
+            time.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the news store fresh for the watchlist")
+    parser.add_argument("--once", action="store_true", help="run a single crawl cycle and exit")
+    parser.add_argument("--interval", type=float, default=CRAWLER_INTERVAL_SECONDS)
+    args = parser.parse_args()
+    if args.once:
+        crawl_once()
+    else:
+        run_forever(args.interval)
+
+if __name__ == "__main__":
+    main()
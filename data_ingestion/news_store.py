@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+NEWS_STORE_PATH = os.getenv("NEWS_STORE_PATH", "news_store.sqlite3")
+NEWS_TTL_SECONDS = float(os.getenv("NEWS_TTL_SECONDS", "900"))
+# Query counts decay with this half-life, so the watchlist follows recent interest
+NEWS_QUERY_HALF_LIFE = float(os.getenv("NEWS_QUERY_HALF_LIFE", "86400"))
+# Per-ticker overrides, e.g. "TSM=300,AAPL=600"
+NEWS_TICKER_TTLS = {
+    ticker.strip().upper(): float(ttl)
+    for ticker, _, ttl in (item.partition("=") for item in os.getenv("NEWS_TICKER_TTLS", "").split(","))
+    if ticker.strip() and ttl
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT NOT NULL,
+    extracted TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (url, extractor)
+);
+CREATE TABLE IF NOT EXISTS ticker_news (
+    ticker TEXT PRIMARY KEY,
+    articles TEXT NOT NULL,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ticker_queries (
+    ticker TEXT PRIMARY KEY,
+    score REAL NOT NULL,
+    last_queried REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS crawl_failures (
+    ticker TEXT PRIMARY KEY,
+    failures INTEGER NOT NULL,
+    retry_at REAL NOT NULL
+);
+"""
+
+def decayed(score, elapsed, half_life=NEWS_QUERY_HALF_LIFE):
+    return score * 0.5 ** (elapsed / half_life)
+
+def content_hash(body):
+    return hashlib.sha1(body.encode("utf-8", "replace") if isinstance(body, str) else body).hexdigest()
+
+class NewsStore:
+    """
+    Shared on-disk news cache in SQLite (WAL mode, so readers never block the writer and
+    several processes can share one file).
+
+    `pages` holds what was extracted from each URL together with its ETag, Last-Modified
+    and body hash, for conditional revalidation. `ticker_news` holds each ticker's
+    finished article list, served without the network while younger than its TTL.
+    """
+    def __init__(self, path=NEWS_STORE_PATH, ttl=NEWS_TTL_SECONDS, ticker_ttls=None):
+        self.path = path
+        self.ttl = ttl
+        self.ticker_ttls = NEWS_TICKER_TTLS if ticker_ttls is None else ticker_ttls
+        self.local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        # sqlite3 connections are per thread; WAL lets them all read concurrently
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # SQLite's own math functions are optional at build time
+            conn.create_function("decayed", 2, decayed, deterministic=True)
+            self.local.conn = conn
+        return conn
+
+    def ticker_ttl(self, ticker):
+        return self.ticker_ttls.get(ticker.upper(), self.ttl)
+
+    def get_ticker_news(self, ticker, fresh_only=True):
+        """
+        Returns (articles, age_seconds), or (None, None) if the ticker is unknown or,
+        with `fresh_only`, older than its TTL.
+        """
+        row = self.connection().execute(
+            "SELECT articles, refreshed_at FROM ticker_news WHERE ticker = ?", (ticker,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        age = time.time() - row[1]
+        if fresh_only and age > self.ticker_ttl(ticker):
+            return None, None
+        return json.loads(row[0]), age
+
+    def put_ticker_news(self, ticker, articles):
+        self.connection().execute(
+            "INSERT OR REPLACE INTO ticker_news (ticker, articles, refreshed_at) VALUES (?, ?, ?)",
+            (ticker, json.dumps(articles), time.time()),
+        )
+
+    def ticker_ages(self):
+        now = time.time()
+        return {ticker: now - refreshed_at for ticker, refreshed_at in
+                self.connection().execute("SELECT ticker, refreshed_at FROM ticker_news")}
+
+    def record_crawl_failure(self, ticker, base_delay, max_delay):
+        """
+        Counts a failed refresh and holds the ticker back for base_delay * 2^(failures - 1)
+        seconds, capped at max_delay. Returns the number of consecutive failures.
+        """
+        conn = self.connection()
+        row = conn.execute("SELECT failures FROM crawl_failures WHERE ticker = ?", (ticker,)).fetchone()
+        failures = (row[0] if row else 0) + 1
+        delay = min(max_delay, base_delay * 2 ** (failures - 1))
+        conn.execute(
+            "INSERT OR REPLACE INTO crawl_failures (ticker, failures, retry_at) VALUES (?, ?, ?)",
+            (ticker, failures, time.time() + delay),
+        )
+        return failures
+
+    def clear_crawl_failures(self, ticker):
+        self.connection().execute("DELETE FROM crawl_failures WHERE ticker = ?", (ticker,))
+
+    def backed_off_tickers(self):
+        """
+        Tickers whose last refresh failed and whose retry time has not come yet.
+        """
+        return {ticker for (ticker,) in self.connection().execute(
+            "SELECT ticker FROM crawl_failures WHERE retry_at > ?", (time.time(),))}
+
+    def record_queries(self, tickers):
+        """
+        Counts a request for each ticker, decaying earlier counts by NEWS_QUERY_HALF_LIFE.
+        """
+        now = time.time()
+        self.connection().executemany(
+            "INSERT INTO ticker_queries (ticker, score, last_queried) VALUES (?, 1, ?) "
+            "ON CONFLICT(ticker) DO UPDATE SET "
+            "score = decayed(score, excluded.last_queried - last_queried) + 1, "
+            "last_queried = excluded.last_queried",
+            [(ticker, now) for ticker in dict.fromkeys(tickers)],
+        )
+
+    def query_scores(self, since):
+        """
+        Decayed query counts for tickers requested within the last `since` seconds.
+        """
+        now = time.time()
+        rows = self.connection().execute(
+            "SELECT ticker, score, last_queried FROM ticker_queries WHERE last_queried >= ?", (now - since,)
+        )
+        return {ticker: decayed(score, now - last) for ticker, score, last in rows}
+
+    def conditional_headers(self, url, extractor):
+        row = self.connection().execute(
+            "SELECT etag, last_modified FROM pages WHERE url = ? AND extractor = ?", (url, extractor)
+        ).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def record_response(self, url, extractor, status, headers, body, extract):
+        """
+        Folds one HTTP response into the store and returns the extracted value. A 304, or
+        a 200 whose body hashes the same as last time, reuses the stored extraction
+        without calling `extract(body)` again.
+        """
+        conn = self.connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT content_hash, extracted FROM pages WHERE url = ? AND extractor = ?", (url, extractor)
+        ).fetchone()
+        if status == 304:
+            if row is None:
+                raise ValueError(f"304 for {url} with nothing stored")
+            conn.execute("UPDATE pages SET checked_at = ? WHERE url = ? AND extractor = ?", (now, url, extractor))
+            return json.loads(row[1])
+
+        digest = content_hash(body)
+        if row is not None and row[0] == digest:
+            conn.execute("UPDATE pages SET checked_at = ? WHERE url = ? AND extractor = ?", (now, url, extractor))
+            return json.loads(row[1])
+
+        extracted = extract(body)
+        conn.execute(
+            "INSERT OR REPLACE INTO pages (url, extractor, etag, last_modified, content_hash, extracted, fetched_at, checked_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, extractor, headers.get("ETag"), headers.get("Last-Modified"), digest, json.dumps(extracted), now, now),
+        )
+        return extracted
+
+    def prune(self, max_age):
+        """
+        Drops pages not revalidated within `max_age` seconds.
+        """
+        cursor = self.connection().execute("DELETE FROM pages WHERE checked_at < ?", (time.time() - max_age,))
+        if cursor.rowcount:
+            logging.info(f"[News Store] Pruned {cursor.rowcount} stale pages")
+        return cursor.rowcount
+
+news_store = None
+
+def get_news_store():
+    """
+    Returns the process-wide store at NEWS_STORE_PATH, opening it on first use.
+    """
+    global news_store
+    if news_store is None:
+        news_store = NewsStore()
+        logging.info(f"[News Store] Opened {NEWS_STORE_PATH}")
+    return news_store
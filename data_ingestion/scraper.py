@@ -1,97 +1,117 @@
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from retrying import retry
 import logging
-import pickle
 import os
+from data_ingestion.html_extract import extract
+from data_ingestion.news_store import get_news_store
 
 logging.basicConfig(level=logging.INFO)
 
+# Overridable so the crawler can be pointed at a local fixture server
+NEWS_BASE_URL = os.getenv("NEWS_BASE_URL", "https://finance.yahoo.com").rstrip("/")
+
+def fetch_with_store(url, extractor, extract, store, timeout=10):
+    """
+    Conditional GET through the news store: sends the stored ETag/Last-Modified and
+    only runs `extract` when the page actually changed.
+    """
+    headers = {'User-Agent': 'Mozilla/5.0', **store.conditional_headers(url, extractor)}
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code != 304:
+        response.raise_for_status()
+    return store.record_response(url, extractor, response.status_code, response.headers, response.text, extract)
+
 @retry(stop_max_attempt_number=3, wait_fixed=2000)
-def get_yahoo_finance_news_articles(ticker, max_articles=3):
+def get_yahoo_finance_news_articles(ticker, max_articles=3, store=None):
     """
     Scrapes Yahoo Finance news URLs related to a given ticker.
     """
-    base_url = f"https://finance.yahoo.com/quote/{ticker}/news"
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    articles = []
+    base_url = f"{NEWS_BASE_URL}/quote/{ticker}/news"
+    store = store or get_news_store()
 
     try:
-        response = requests.get(base_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        return fetch_with_store(base_url, "scraper_links", lambda html: extract_news_links(html, ticker, max_articles), store)
+    except Exception as e:
+        logging.error(f"[Yahoo News Error for {ticker}] {e}")
+        return []
 
-        for a_tag in soup.select("a[href*='/news/']"):
-            href = a_tag.get("href")
-            if not href:
-                continue
+def extract_news_links(html, ticker, max_articles):
+    articles = []
 
-            full_url = urljoin("https://finance.yahoo.com", href)
-            if (ticker.lower() in full_url.lower() and
-                "/news/" in full_url and
-                not any(ex in full_url.lower() for ex in ["signup", "email", "privacy", "terms"]) and
-                full_url not in articles):
-                articles.append(full_url)
+    for href in extract("news_links", html):
+        full_url = urljoin(NEWS_BASE_URL, href)
+        if (ticker.lower() in full_url.lower() and
+            "/news/" in full_url and
+            not any(ex in full_url.lower() for ex in ["signup", "email", "privacy", "terms"]) and
+            full_url not in articles):
+            articles.append(full_url)
 
-            if len(articles) >= max_articles:
-                break
+        if len(articles) >= max_articles:
+            break
 
-        return articles
-    except Exception as e:
-        logging.error(f"[Yahoo News Error for {ticker}] {e}")
-        return []
+    return articles
 
-def scrape_article_text(url):
+def scrape_article_text(url, store=None):
     """
-    Scrapes and returns cleaned text content from a news article.
+    Scrapes and returns cleaned text content from a news article, or None when the
+    article has too little text to use. Fetch errors are raised.
     """
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        res = requests.get(url, headers=headers, timeout=10)
-        res.raise_for_status()
-        soup = BeautifulSoup(res.text, 'html.parser')
+    return fetch_with_store(url, "scraper_text", extract_article_text, store or get_news_store())
 
-        paragraphs = soup.find_all('p')
-        text = ' '.join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
+def extract_article_text(html):
+    text = ' '.join(extract("paragraphs", html))
 
-        if not text or len(text) < 100:
-            return "⚠️ Content too short or unavailable"
+    if not text or len(text) < 100:
+        return None
 
-        return text[:500] + "..." if len(text) > 500 else text
-    except Exception as e:
-        logging.error(f"[Scrape Error] {e}")
-        return f"Error scraping {url}: {e}"
+    return text[:500] + "..." if len(text) > 500 else text
 
-def scrape_stocks_news(tickers):
+def scrape_stocks_news(tickers, store=None, force=False):
     """
-    Retrieves news article URLs and summaries for multiple tickers.
+    Retrieves news article URLs and summaries for multiple tickers. Tickers refreshed
+    within their TTL are served from the news store without touching the network.
+    Only real snippets are stored: articles too short to use are left out, and a ticker
+    with an article that failed to download is not stored at all, so the next refresh
+    tries it again instead of serving the gap for a whole TTL.
     """
     if not tickers:
         return {"error": "No tickers provided"}
 
-    cache_file = "news_cache.pkl"
+    store = store or get_news_store()
     all_news = {}
 
-    if os.path.exists(cache_file):
-        with open(cache_file, "rb") as f:
-            all_news = pickle.load(f)
-
     for ticker in tickers:
+        if not force:
+            cached, age = store.get_ticker_news(ticker)
+            if cached is not None:
+                logging.info(f"[Scraper] Serving {ticker} from news store ({age:.0f}s old)")
+                all_news[ticker] = cached
+                continue
+
         logging.info(f"📥 Scraping news for: {ticker}")
-        urls = get_yahoo_finance_news_articles(ticker)
-        if not urls:
-            all_news[ticker] = [{"url": None, "snippet": "⚠️ No articles found."}]
-            continue
+        urls = get_yahoo_finance_news_articles(ticker, store=store)
 
         snippets = []
+        failed = False
         for url in urls:
-            snippet = scrape_article_text(url)
-            snippets.append({"url": url, "snippet": snippet})
+            try:
+                snippet = scrape_article_text(url, store=store)
+            except Exception as e:
+                logging.error(f"[Scrape Error] {url}: {e}")
+                failed = True
+                continue
+            if snippet:
+                snippets.append({"url": url, "snippet": snippet})
 
-        all_news[ticker] = snippets
+        if not snippets:
+            all_news[ticker] = [{"url": None, "snippet": "⚠️ No articles found."}]
+            continue
 
-    with open(cache_file, "wb") as f:
-        pickle.dump(all_news, f)
+        all_news[ticker] = snippets
+        if failed:
+            logging.warning(f"[Scraper] Not storing partial news for {ticker}; it will be retried")
+        else:
+            store.put_ticker_news(ticker, snippets)
 
-    return all_news
\ No newline at end of file
+    return all_news
@@ -4,10 +4,17 @@ import re
 import logging
 import string
 import asyncio
-from retrying import retry
+import os
+import json
 from fastapi import FastAPI
 from starlette.background import BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from orchestrator.resilience import resilient_post, resilience_stats
+from orchestrator.pipeline import Pipeline, PipelineExit, Stage
+from orchestrator.response_cache import ResponseCache
+from orchestrator.symbol_index import SymbolIndex, TickerSearchCache
+from orchestrator.text_matcher import correct_transcript
+from collections import deque
 
 app = FastAPI()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,36 +22,112 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Known Asia tech tickers
 ASIA_TECH_TICKERS = ["005930.KS", "TSM", "9988.HK", "0992.HK", "1810.HK"]
 
+# Aliases the symbol index is seeded with, on top of SYMBOL_UNIVERSE_PATH
+COMPANY_MAP = {
+    "tesla": "TSLA",
+    "apple": "AAPL",
+    "samsung": "005930.KS",
+    "tsmc": "TSM",
+    "tata": "TATASTEEL.NS",
+    "tatasteel": "TATASTEEL.NS",
+    "tata stocks": "TATASTEEL.NS",
+    "zerodha": "LIQUIDCASE.NS",
+    "mirra stock": "MIRA",
+    "natal soft": "NTES"
+}
+
 # Stopwords to filter generic terms
 STOPWORDS = {"asia", "tech", "stocks", "today", "earnings", "surprises", "risk", "exposure", "and", "in", "shared", "text", "talks", "details", "of", "to", "up", "our", "any", "latest", "you", "may", "what", "about", "the", "need", "a", "strong", "put", "land", "stokes", "for", "surerning", "highlights", "warning", "give", "me"}
 
-# Common STT corrections
-STT_CORRECTIONS = {
-    "shared tech": "asia tech",
-    "shared text": "asia tech",
-    "text talks": "tech stocks",
-    "stalk": "stock",
-    "tesla.": "tesla",
-    "appy": "apple",
-    "stokes": "stocks",
-    "talk": "stock",
-    "surerning": "surprising",
-    "aca text talk": "asia tech stock",
-    "warning": "earning",
-    "asian": "asia",
-    "tatar": "tata",
-    "samsun": "samsung",
-    "appley": "apple"
-}
+NO_TICKERS_NARRATIVE = "I'm sorry, I couldn't identify any specific stocks in your query. Could you clarify the company names or tickers?"
+ERROR_NARRATIVE = "An error occurred while processing your query. Please try again."
+
+# Shared client pool: one keep-alive connector reused by every agent and Yahoo call
+AGENT_CONNECTION_LIMIT = int(os.getenv("AGENT_CONNECTION_LIMIT", "100"))
+AGENT_CONNECTIONS_PER_HOST = int(os.getenv("AGENT_CONNECTIONS_PER_HOST", "20"))
+AGENT_KEEPALIVE_TIMEOUT = float(os.getenv("AGENT_KEEPALIVE_TIMEOUT", "60"))
+AGENT_DNS_CACHE_TTL = int(os.getenv("AGENT_DNS_CACHE_TTL", "300"))
+
+http_session = None
+
+def get_session():
+    """
+    Returns the app-lifetime aiohttp session, creating it on first use.
+    Limits apply per (host, port), so each agent gets its own connection cap.
+    """
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=AGENT_CONNECTION_LIMIT,
+            limit_per_host=AGENT_CONNECTIONS_PER_HOST,
+            keepalive_timeout=AGENT_KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=AGENT_DNS_CACHE_TTL,
+        )
+        http_session = aiohttp.ClientSession(connector=connector)
+        logging.info("[Orchestrator] Created shared HTTP client pool")
+    return http_session
+
+def private_pool_counts(connector, attribute):
+    """
+    Best-effort {host: count} from one of aiohttp's private connector maps. These are
+    not a public API, so any change in their shape yields {} instead of an error.
+    """
+    try:
+        return {f"{key.host}:{key.port}": len(entries) for key, entries in dict(getattr(connector, attribute, {})).items()}
+    except Exception as e:
+        logging.debug(f"[Orchestrator] Connector field {attribute} unavailable: {e}")
+        return {}
+
+def pool_stats():
+    """
+    Reports the shared pool's configured limits and, where aiohttp exposes them, its
+    open, idle, in-use and waiting connections per host.
+    """
+    stats = {"limit": AGENT_CONNECTION_LIMIT, "limit_per_host": AGENT_CONNECTIONS_PER_HOST,
+             "open": 0, "idle": 0, "in_use": 0, "waiting": 0, "hosts": {}}
+    if http_session is None or http_session.closed:
+        return stats
+
+    connector = http_session.connector
+    stats["limit"] = connector.limit
+    stats["limit_per_host"] = connector.limit_per_host
+
+    for field, attribute in (("idle", "_conns"), ("in_use", "_acquired_per_host"), ("waiting", "_waiters")):
+        for host, count in private_pool_counts(connector, attribute).items():
+            stats["hosts"].setdefault(host, {"idle": 0, "in_use": 0, "waiting": 0})[field] += count
+            stats[field] += count
+    stats["open"] = stats["idle"] + stats["in_use"]
+    return stats
+
+# Local symbol universe: most ticker lookups resolve here without any network call
+SYMBOL_UNIVERSE_PATH = os.getenv("SYMBOL_UNIVERSE_PATH", os.path.join(os.path.dirname(__file__), "symbols.csv"))
+TICKER_CACHE_PATH = os.getenv("TICKER_CACHE_PATH", "ticker_search_cache.json")
+
+def build_symbol_index():
+    index = SymbolIndex()
+    for ticker in ASIA_TECH_TICKERS:
+        index.add(ticker)
+    for alias, ticker in COMPANY_MAP.items():
+        index.add(ticker, aliases=[alias])
+    if os.path.exists(SYMBOL_UNIVERSE_PATH):
+        index.load_csv(SYMBOL_UNIVERSE_PATH)
+    else:
+        logging.warning(f"[Symbol Index] Universe file not found: {SYMBOL_UNIVERSE_PATH}")
+    return index
+
+symbol_index = build_symbol_index()
+ticker_search_cache = TickerSearchCache(
+    TICKER_CACHE_PATH,
+    max_entries=int(os.getenv("TICKER_CACHE_MAX_ENTRIES", "5000")),
+    ttl=float(os.getenv("TICKER_CACHE_TTL", str(7 * 24 * 3600))),
+)
 
 def is_valid_word(word):
     return word and all(c in string.ascii_letters + string.digits for c in word.replace(".", ""))
 
 def correct_query(query):
-    query_lower = query.lower()
-    for wrong, right in STT_CORRECTIONS.items():
-        query_lower = query_lower.replace(wrong, right)
-    return query_lower
+    return correct_transcript(query)
 
 async def fetch_yahoo_ticker(session, phrase):
     try:
@@ -60,8 +143,34 @@ async def fetch_yahoo_ticker(session, phrase):
                     return ticker
             return None
     except Exception as e:
+        # Re-raised so transport failures are not cached as "no ticker"
         logging.debug(f"[Ticker Search Error for {phrase}] {e}")
-        return None
+        raise
+
+async def search_tickers_remote(phrases):
+    """
+    Resolves phrases through Yahoo search, consulting the persistent search cache first
+    so only phrases never seen (or expired) go to the network.
+    """
+    resolved = {}
+    misses = []
+    for phrase in phrases:
+        found, ticker = ticker_search_cache.get(phrase)
+        if found:
+            resolved[phrase] = ticker
+        else:
+            misses.append(phrase)
+
+    if misses:
+        session = get_session()
+        results = await asyncio.gather(*[fetch_yahoo_ticker(session, phrase) for phrase in misses], return_exceptions=True)
+        for phrase, ticker in zip(misses, results):
+            if isinstance(ticker, Exception):
+                continue
+            resolved[phrase] = ticker
+            ticker_search_cache.put(phrase, ticker)
+        ticker_search_cache.save()
+    return resolved
 
 async def extract_tickers(query):
     query_lower = correct_query(query)
@@ -76,37 +185,29 @@ async def extract_tickers(query):
         logging.info("[Ticker Extraction] Using predefined Asia tech tickers")
         return ASIA_TECH_TICKERS
 
-    company_map = {
-        "tesla": "TSLA",
-        "apple": "AAPL",
-        "samsung": "005930.KS",
-        "tsmc": "TSM",
-        "tata": "TATASTEEL.NS",
-        "tatasteel": "TATASTEEL.NS",
-        "tata stocks": "TATASTEEL.NS",
-        "zerodha": "LIQUIDCASE.NS",
-        "mirra stock": "MIRA",
-        "natal soft": "NTES"
-    }
+    # Symbols typed or transcribed as-is, e.g. TSLA or 005930.KS
+    for token in re.findall(r"[A-Za-z0-9][A-Za-z0-9.\-]*", query):
+        token = token.rstrip(".")
+        if (token.isupper() or any(c.isdigit() for c in token)) and symbol_index.has_symbol(token):
+            tickers.append(token.upper())
+            logging.info(f"[Ticker Extraction] Matched symbol {token.upper()}")
 
     query_cleaned = " ".join([w for w in query_words if w not in STOPWORDS])
-    found_tickers = []
-    for key in company_map:
-        if key in query_cleaned:
-            found_tickers.append(company_map[key])
-            logging.info(f"[Ticker Extraction] Mapped '{key}' to {company_map[key]}")
-
-    if found_tickers:
-        return list(set(found_tickers))
-
-    async with aiohttp.ClientSession() as session:
-        phrases = [query_cleaned] + query_words
-        tasks = [fetch_yahoo_ticker(session, phrase) for phrase in phrases if is_valid_word(phrase) and phrase not in STOPWORDS]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        for idx, ticker in enumerate(results):
-            if isinstance(ticker, str) and ticker not in tickers:
-                tickers.append(ticker)
-                logging.info(f"[Ticker Extraction] Resolved phrase '{phrases[idx]}' to {ticker}")
+    for phrase, ticker in symbol_index.resolve(query_cleaned):
+        tickers.append(ticker)
+        logging.info(f"[Ticker Extraction] Mapped '{phrase}' to {ticker}")
+
+    if tickers:
+        return list(set(tickers))
+
+    # True misses only: fall back to Yahoo search
+    phrases = [phrase for phrase in [query_cleaned] + query_words if is_valid_word(phrase) and phrase not in STOPWORDS]
+    resolved = await search_tickers_remote(phrases)
+    for phrase in phrases:
+        ticker = resolved.get(phrase)
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+            logging.info(f"[Ticker Extraction] Resolved phrase '{phrase}' to {ticker}")
 
     return list(set(tickers)) if tickers else []
 
@@ -120,14 +221,11 @@ def check_retrieval_confidence(retrieved_chunks):
     logging.debug(f"[Retrieval Confidence] Retrieved chunks count: {len(chunks)}")
     return len(chunks) > 0 and not isinstance(retrieved_chunks, Exception)
 
-@retry(stop_max_attempt_number=3, wait_fixed=2000)
-async def fetch_data(session, url, data, timeout):
+async def fetch_data(session, url, data, timeout, idempotent=None):
     try:
-        async with session.post(url, json=data, timeout=timeout) as response:
-            response.raise_for_status()
-            result = await response.json()
-            logging.debug(f"[Fetch Data] Success for {url}")
-            return result
+        result = await resilient_post(session, url, data, timeout, idempotent)
+        logging.debug(f"[Fetch Data] Success for {url}")
+        return result
     except Exception as e:
         logging.error(f"[Fetch Data Error] Request to {url} failed: {e}")
         return {"error": str(e)}
@@ -142,18 +240,184 @@ async def check_agent_health(session):
 
 @app.on_event("startup")
 async def startup_event():
-    async with aiohttp.ClientSession() as session:
-        logging.info("[Orchestrator] Pre-warming dependencies")
-        health_ok = await check_agent_health(session)
-        logging.info(f"[Orchestrator] Retriever Agent health: {'OK' if health_ok else 'Failed'}")
+    session = get_session()
+    logging.info("[Orchestrator] Pre-warming dependencies")
+    health_ok = await check_agent_health(session)
+    logging.info(f"[Orchestrator] Retriever Agent health: {'OK' if health_ok else 'Failed'}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+        logging.info("[Orchestrator] Closed shared HTTP client pool")
 
 @app.get("/health")
 async def health(background_tasks: BackgroundTasks):
-    async with aiohttp.ClientSession() as session:
-        health_ok = await check_agent_health(session)
-        status = "Orchestrator is running" if health_ok else "Orchestrator is unhealthy"
-        logging.debug(f"[Orchestrator] Health check: {status}")
-        return {"status": status}
+    health_ok = await check_agent_health(get_session())
+    status = "Orchestrator is running" if health_ok else "Orchestrator is unhealthy"
+    logging.debug(f"[Orchestrator] Health check: {status}")
+    return {"status": status}
+
+@app.get("/stats")
+async def stats():
+    return {"pool": pool_stats(), "agents": resilience_stats(), "critical_paths": list(recent_critical_paths), "response_cache": response_cache.stats()}
+
+@app.post("/correct")
+async def correct(req: Request):
+    """
+    Applies the speech-to-text correction table, so the UI can show the transcript the
+    way the orchestrator will read it without importing the orchestrator's code.
+    """
+    text = (await req.json()).get("text", "")
+    return {"text": correct_query(text)}
+
+async def synthesize(session, text):
+    voice_response = await fetch_data(session, "http://localhost:8006/speak", {"text": text}, 5)
+    return voice_response.get("audio_base64", None) if isinstance(voice_response, dict) else None
+
+# Brief pipeline: each stage declares only the inputs it really needs
+async def market_stage(ctx, results):
+    api_data = await fetch_data(ctx["session"], "http://localhost:8001/run", {"tickers": ctx["tickers"]}, 8)
+    api_data = api_data if isinstance(api_data, dict) and "error" not in api_data else {"error": str(api_data)}
+    logging.debug(f"[Orchestrator] API data keys: {list(api_data.keys())}")
+
+    valid_tickers = []
+    missing_tickers = []
+    for ticker in ctx["tickers"]:
+        if ticker in api_data and api_data[ticker] and "error" not in api_data[ticker]:
+            valid_tickers.append(ticker)
+        else:
+            missing_tickers.append(ticker)
+            logging.warning(f"[Orchestrator] No data for ticker {ticker}")
+
+    if not valid_tickers:
+        raise PipelineExit(f"I'm sorry, I couldn't find data for the requested stocks: {', '.join(missing_tickers)}. They may be delisted or unavailable.")
+    return {"api_data": api_data, "valid_tickers": valid_tickers}
+
+async def news_stage(ctx, results):
+    scrape_response = await fetch_data(ctx["session"], "http://localhost:8002/run", {"tickers": ctx["tickers"]}, 5)
+    scrape_data = scrape_response.get("articles", {"error": "Scraping failed"}) if isinstance(scrape_response, dict) else {"error": str(scrape_response)}
+    logging.debug(f"[Orchestrator] Scrape data keys: {list(scrape_data.keys())}")
+    return scrape_data
+
+async def docs_stage(ctx, results):
+    retrieved_chunks = await fetch_data(
+        ctx["session"],
+        "http://localhost:8003/query",
+        {"query": ctx["query"], "tickers": ctx["tickers"], "user_urls": ctx["user_urls"]},
+        10
+    )
+    retrieved_chunks = retrieved_chunks if isinstance(retrieved_chunks, dict) and "error" not in retrieved_chunks else {"chunks": [], "error": str(retrieved_chunks)}
+    logging.debug(f"[Orchestrator] Retrieved chunks count: {len(retrieved_chunks.get('chunks', []))}")
+    return retrieved_chunks
+
+async def analysis_stage(ctx, results):
+    scrape_data = results["news"] if results["news"] is not None else {"error": "Scraping skipped"}
+    analysis_data = await fetch_data(
+        ctx["session"],
+        "http://localhost:8005/analyze",
+        {"api_data": results["market"]["api_data"], "scrape_data": scrape_data, "tickers": results["market"]["valid_tickers"], "query": ctx["query"]},
+        5,
+        idempotent=True  # pure computation over the payload, safe to repeat
+    )
+    analysis_data = analysis_data if isinstance(analysis_data, dict) and "error" not in analysis_data else {"error": str(analysis_data)}
+    logging.debug(f"[Orchestrator] Analysis data keys: {list(analysis_data.keys())}")
+    return analysis_data
+
+async def prompt_stage(ctx, results):
+    scrape_data = results["news"] if results["news"] is not None else {"error": "Scraping skipped"}
+    retrieved_chunks = results["docs"] if results["docs"] is not None else {"chunks": []}
+    input_for_llm = f"""
+    User Query: {ctx["query"]}
+    📊 Market Data: {results["market"]["api_data"]}
+    📰 News Articles: {scrape_data}
+    📈 Analysis: {results["analysis"]}
+    """
+    if check_retrieval_confidence(retrieved_chunks):
+        input_for_llm += f"\n📚 Context from Docs: {retrieved_chunks}"
+    return {"prompt": input_for_llm, "analysis_data": results["analysis"]}
+
+async def narrative_stage(ctx, results):
+    response = await fetch_data(ctx["session"], "http://localhost:8004/generate", results["prompt"], 5)
+    narrative = response.get("response", "LLM generation failed.") if isinstance(response, dict) else "LLM generation failed."
+    logging.info(f"[Orchestrator] Narrative length: {len(narrative)} chars")
+    return narrative
+
+async def speech_stage(ctx, results):
+    return await synthesize(ctx["session"], results["narrative"])
+
+BRIEF_PIPELINE = Pipeline([
+    Stage("market", market_stage),
+    Stage("news", news_stage, optional=True, budget=float(os.getenv("NEWS_STAGE_BUDGET", "5"))),
+    Stage("docs", docs_stage, optional=True, budget=float(os.getenv("DOCS_STAGE_BUDGET", "10"))),
+    Stage("analysis", analysis_stage, requires=("market", "news")),
+    Stage("prompt", prompt_stage, requires=("market", "news", "analysis", "docs")),
+    Stage("narrative", narrative_stage, requires=("prompt",)),
+    Stage("speech", speech_stage, requires=("narrative",)),
+])
+
+recent_critical_paths = deque(maxlen=20)
+
+def is_cacheable(brief):
+    narrative = brief.get("narrative") or ""
+    segments = brief.get("audio_segments")
+    has_audio = all(segments) if segments else bool(brief.get("audio_base64"))
+    return bool(narrative) and has_audio and "generation failed" not in narrative.lower()
+
+# Whole-brief cache: a repeat of the same question about the same tickers on the same
+# market data is answered from memory while the entry is fresh, and refreshed in the
+# background once stale
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+    stale_ttl=float(os.getenv("RESPONSE_CACHE_STALE_TTL", "600")),
+    accept=is_cacheable,
+)
+
+MARKET_VERSION_TIMEOUT = float(os.getenv("MARKET_VERSION_TIMEOUT", "0.5"))
+
+async def market_data_version(session, tickers):
+    """
+    The API Agent's data version for each ticker, so a brief is never served across a
+    market-data refresh. None if the agent does not answer in time.
+    """
+    try:
+        timeout = aiohttp.ClientTimeout(total=MARKET_VERSION_TIMEOUT)
+        async with session.get("http://localhost:8001/versions", params={"tickers": ",".join(sorted(set(tickers)))},
+                               timeout=timeout) as response:
+            response.raise_for_status()
+            versions = (await response.json())["versions"]
+        return tuple(versions.get(ticker) for ticker in sorted(set(tickers)))
+    except Exception as e:
+        logging.warning(f"[Orchestrator] Market data version unavailable, bypassing the response cache: {e}")
+        return None
+
+def brief_cache_key(query, tickers, version):
+    normalized_query = " ".join(correct_query(query).split())
+    return (normalized_query, tuple(sorted(set(tickers))), version)
+
+async def current_brief_key(session, query, tickers):
+    """
+    Cache key for the market data the API Agent holds right now; None bypasses the cache.
+    """
+    version = await market_data_version(session, tickers)
+    return None if version is None else brief_cache_key(query, tickers, version)
+
+async def run_brief_pipeline(session, query, tickers, user_urls, target):
+    """
+    Runs the brief pipeline up to `target` and records its critical path.
+    Raises PipelineExit when the brief has to stop early.
+    """
+    ctx = {"session": session, "query": query, "tickers": tickers, "user_urls": user_urls}
+    run = await BRIEF_PIPELINE.run(ctx, targets=[target])
+    path = " -> ".join(f"{step['stage']}({step['seconds']:.2f}s)" for step in run.critical_path)
+    logging.info(f"[Orchestrator] Critical path: {path}")
+    recent_critical_paths.append({"query": query, "target": target, "critical_path": run.critical_path, "timings": run.timings})
+    return run.results
+
+async def build_brief(session, query, tickers, user_urls):
+    results = await run_brief_pipeline(session, query, tickers, user_urls, "speech")
+    return {"narrative": results["narrative"], "audio_base64": results["speech"]}
 
 @app.post("/process")
 async def process_query(req: Request):
@@ -161,90 +425,180 @@ async def process_query(req: Request):
         query = (await req.json()).get("query", "")
         if not query:
             narrative = "Please provide a query."
-            async with aiohttp.ClientSession() as session:
-                voice_response = await fetch_data(session, "http://localhost:8006/speak", {"text": narrative}, 5)
-                audio_base64 = voice_response.get("audio_base64", None) if isinstance(voice_response, dict) else None
-            return {"narrative": narrative, "audio_base64": audio_base64}
+            return {"narrative": narrative, "audio_base64": await synthesize(get_session(), narrative)}
 
         tickers = await extract_tickers(query)
         logging.info(f"[Orchestrator] Extracted tickers: {tickers}")
         user_urls = extract_urls(query)
 
         if not tickers:
-            narrative = "I'm sorry, I couldn't identify any specific stocks in your query. Could you clarify the company names or tickers?"
-            async with aiohttp.ClientSession() as session:
-                voice_response = await fetch_data(session, "http://localhost:8006/speak", {"text": narrative}, 5)
-                audio_base64 = voice_response.get("audio_base64", None) if isinstance(voice_response, dict) else None
-            return {"narrative": narrative, "audio_base64": audio_base64}
-
-        async with aiohttp.ClientSession() as session:
-            tasks = [
-                fetch_data(session, "http://localhost:8001/run", {"tickers": tickers}, 8),
-                fetch_data(session, "http://localhost:8002/run", {"tickers": tickers}, 5),
-                fetch_data(session, "http://localhost:8003/query", {"query": query, "tickers": tickers, "user_urls": user_urls}, 10),
-            ]
-            api_data, scrape_response, retrieved_chunks = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Validate responses
-            api_data = api_data if isinstance(api_data, dict) and "error" not in api_data else {"error": str(api_data)}
-            scrape_data = scrape_response.get("articles", {"error": "Scraping failed"}) if isinstance(scrape_response, dict) else {"error": str(scrape_response)}
-            retrieved_chunks = retrieved_chunks if isinstance(retrieved_chunks, dict) and "error" not in retrieved_chunks else {"chunks": [], "error": str(retrieved_chunks)}
-
-            logging.debug(f"[Orchestrator] API data keys: {list(api_data.keys()) if isinstance(api_data, dict) else 'error'}")
-            logging.debug(f"[Orchestrator] Scrape data keys: {list(scrape_data.keys()) if isinstance(scrape_data, dict) else 'error'}")
-            logging.debug(f"[Orchestrator] Retrieved chunks count: {len(retrieved_chunks.get('chunks', []))}")
-
-            valid_tickers = []
-            missing_tickers = []
-            for ticker in tickers:
-                if ticker in api_data and api_data[ticker] and "error" not in api_data[ticker]:
-                    valid_tickers.append(ticker)
-                else:
-                    missing_tickers.append(ticker)
-                    logging.warning(f"[Orchestrator] No data for ticker {ticker}")
-
-            if not valid_tickers:
-                narrative = f"I'm sorry, I couldn't find data for the requested stocks: {', '.join(missing_tickers)}. They may be delisted or unavailable."
-                voice_response = await fetch_data(session, "http://localhost:8006/speak", {"text": narrative}, 5)
-                audio_base64 = voice_response.get("audio_base64", None) if isinstance(voice_response, dict) else None
-                return {"narrative": narrative, "audio_base64": audio_base64}
-
-            # Unified analysis
-            analysis_data = await fetch_data(
-                session,
-                "http://localhost:8005/analyze",
-                {"api_data": api_data, "scrape_data": scrape_data, "tickers": valid_tickers, "query": query},
-                5
-            )
-            analysis_data = analysis_data if isinstance(analysis_data, dict) and "error" not in analysis_data else {"error": str(analysis_data)}
-            logging.debug(f"[Orchestrator] Analysis data keys: {list(analysis_data.keys()) if isinstance(analysis_data, dict) else 'error'}")
-
-            # Prepare LLM input
-            input_for_llm = f"""
-            User Query: {query}
-            📊 Market Data: {api_data}
-            📰 News Articles: {scrape_data}
-            📈 Analysis: {analysis_data}
-            """
-            if check_retrieval_confidence(retrieved_chunks):
-                input_for_llm += f"\n📚 Context from Docs: {retrieved_chunks}"
-
-            response = await fetch_data(session, "http://localhost:8004/generate", {"prompt": input_for_llm, "analysis_data": analysis_data}, 5)
-            narrative = response.get("response", "LLM generation failed.") if isinstance(response, dict) else "LLM generation failed."
-            logging.info(f"[Orchestrator] Narrative length: {len(narrative)} chars")
-
-            voice_response = await fetch_data(session, "http://localhost:8006/speak", {"text": narrative}, 5)
-            audio_base64 = voice_response.get("audio_base64", None) if isinstance(voice_response, dict) else None
-
-            return {"narrative": narrative, "audio_base64": audio_base64}
+            narrative = NO_TICKERS_NARRATIVE
+            return {"narrative": narrative, "audio_base64": await synthesize(get_session(), narrative)}
+
+        session = get_session()
+        key = await current_brief_key(session, query, tickers)
+        # Streamed briefs are cached as audio segments, which /process cannot return
+        cached, state = (None, None) if key is None else response_cache.get(
+            key, usable=lambda brief: bool(brief.get("audio_base64")))
+        if cached:
+            logging.info(f"[Orchestrator] Response cache {state} hit for {key}")
+            if state == "stale":
+                response_cache.revalidate(key, lambda: build_brief(session, query, tickers, user_urls))
+            return {"narrative": cached["narrative"], "audio_base64": cached["audio_base64"]}
+
+        try:
+            brief = await build_brief(session, query, tickers, user_urls)
+        except PipelineExit as e:
+            return {"narrative": e.narrative, "audio_base64": await synthesize(session, e.narrative)}
+
+        # Keyed by the data the brief was built on, which the pipeline may just have refreshed
+        key = await current_brief_key(session, query, tickers)
+        if key is not None and is_cacheable(brief):
+            response_cache.put(key, brief)
+        return brief
 
     except Exception as e:
         logging.error(f"[Orchestrator Process Error] {e}")
-        narrative = "An error occurred while processing your query. Please try again."
-        async with aiohttp.ClientSession() as session:
-            voice_response = await fetch_data(session, "http://localhost:8006/speak", {"text": narrative}, 5)
-            audio_base64 = voice_response.get("audio_base64", None) if isinstance(voice_response, dict) else None
+        narrative = ERROR_NARRATIVE
+        audio_base64 = await synthesize(get_session(), narrative)
         return JSONResponse(
             status_code=500,
             content={"narrative": narrative, "audio_base64": audio_base64}
-        )
\ No newline at end of file
+        )
+
+# Streaming: split the narrative on sentence ends so each sentence is voiced as soon as it is complete
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+LLM_STREAM_TIMEOUT = float(os.getenv("LLM_STREAM_TIMEOUT", "30"))
+
+def split_sentences(buffer):
+    """
+    Splits complete sentences off the front of `buffer`; returns (sentences, remainder).
+    """
+    parts = SENTENCE_BOUNDARY.split(buffer)
+    return [p.strip() for p in parts[:-1] if p.strip()], parts[-1]
+
+def stream_event(event_type, **payload):
+    return json.dumps({"type": event_type, **payload}) + "\n"
+
+async def stream_narrative(session, brief, outcome):
+    """
+    Yields narrative deltas from the Language Agent's streaming endpoint, falling back to
+    the one-shot /generate call if the stream fails before producing any text. A stream
+    that fails after some text sets outcome["truncated"].
+    """
+    produced = False
+    try:
+        timeout = aiohttp.ClientTimeout(total=LLM_STREAM_TIMEOUT)
+        async with session.post("http://localhost:8004/generate/stream", json=brief, timeout=timeout) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if "error" in event:
+                    raise RuntimeError(event["error"])
+                if event.get("delta"):
+                    produced = True
+                    yield event["delta"]
+    except Exception as e:
+        logging.error(f"[Orchestrator Stream Error] Narrative stream failed: {e}")
+        if produced:
+            outcome["truncated"] = True
+            return
+        response = await fetch_data(session, "http://localhost:8004/generate", brief, 5)
+        yield response.get("response", "LLM generation failed.") if isinstance(response, dict) else "LLM generation failed."
+
+async def brief_events(query):
+    """
+    Produces the NDJSON events of a streamed brief: tickers, narrative deltas,
+    per-sentence audio segments (in sentence order) and a final done event, whose
+    `complete` is false when the narrative stream broke off part way.
+    """
+    session = get_session()
+    speech = []
+
+    async def reply(narrative):
+        yield stream_event("narrative", delta=narrative)
+        yield stream_event("audio", index=0, audio_base64=await synthesize(session, narrative))
+        yield stream_event("done", narrative=narrative)
+
+    try:
+        if not query:
+            async for event in reply("Please provide a query."):
+                yield event
+            return
+
+        tickers = await extract_tickers(query)
+        logging.info(f"[Orchestrator] Extracted tickers: {tickers}")
+        yield stream_event("tickers", tickers=tickers)
+        if not tickers:
+            async for event in reply(NO_TICKERS_NARRATIVE):
+                yield event
+            return
+
+        key = await current_brief_key(session, query, tickers)
+        cached, state = (None, None) if key is None else response_cache.get(key)
+        if cached:
+            logging.info(f"[Orchestrator] Response cache {state} hit for {key}")
+            if state == "stale":
+                response_cache.revalidate(key, lambda: build_brief(session, query, tickers, extract_urls(query)))
+            yield stream_event("narrative", delta=cached["narrative"])
+            segments = cached.get("audio_segments") or [cached.get("audio_base64")]
+            for index, segment in enumerate(segments):
+                yield stream_event("audio", index=index, audio_base64=segment)
+            yield stream_event("done", narrative=cached["narrative"])
+            return
+
+        try:
+            results = await run_brief_pipeline(session, query, tickers, extract_urls(query), "prompt")
+        except PipelineExit as e:
+            async for event in reply(e.narrative):
+                yield event
+            return
+        brief = results["prompt"]
+
+        narrative = ""
+        pending = ""
+        segments = []
+        next_index = 0
+        outcome = {"truncated": False}
+        async for delta in stream_narrative(session, brief, outcome):
+            narrative += delta
+            yield stream_event("narrative", delta=delta)
+            sentences, pending = split_sentences(pending + delta)
+            speech.extend(asyncio.create_task(synthesize(session, s)) for s in sentences)
+            while speech and speech[0].done():
+                segment = speech.pop(0).result()
+                segments.append(segment)
+                yield stream_event("audio", index=next_index, audio_base64=segment)
+                next_index += 1
+        if pending.strip():
+            speech.append(asyncio.create_task(synthesize(session, pending.strip())))
+        for task in speech:
+            segment = await task
+            segments.append(segment)
+            yield stream_event("audio", index=next_index, audio_base64=segment)
+            next_index += 1
+
+        streamed = {"narrative": narrative, "audio_segments": segments}
+        if outcome["truncated"]:
+            logging.warning(f"[Orchestrator] Narrative cut off after {len(narrative)} chars; not caching it")
+        else:
+            key = await current_brief_key(session, query, tickers)
+            if key is not None and is_cacheable(streamed):
+                response_cache.put(key, streamed)
+
+        logging.info(f"[Orchestrator] Streamed narrative length: {len(narrative)} chars in {next_index} audio segments")
+        yield stream_event("done", narrative=narrative, complete=not outcome["truncated"])
+
+    except Exception as e:
+        logging.error(f"[Orchestrator Stream Error] {e}")
+        yield stream_event("error", narrative=ERROR_NARRATIVE)
+    finally:
+        for task in speech:
+            task.cancel()
+
+@app.post("/process/stream")
+async def process_query_stream(req: Request):
+    query = (await req.json()).get("query", "")
+    return StreamingResponse(brief_events(query), media_type="application/x-ndjson")
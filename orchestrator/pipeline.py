@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+
+class PipelineExit(Exception):
+    """
+    Raised by a stage to end the whole pipeline early with a user-facing narrative.
+    """
+    def __init__(self, narrative):
+        super().__init__(narrative)
+        self.narrative = narrative
+
+class Stage:
+    """
+    One step of the pipeline. `func(context, results)` is awaited once every stage in
+    `requires` has finished; `results` maps stage names to their outputs.
+
+    Optional stages never fail the pipeline: if they raise, time out, or their `budget`
+    (seconds since the pipeline started) has already expired when their inputs are ready,
+    they are skipped and dependents see None.
+    """
+    def __init__(self, name, func, requires=(), optional=False, budget=None):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.optional = optional
+        self.budget = budget
+
+class PipelineRun:
+    def __init__(self, results, timings, critical_path):
+        self.results = results
+        self.timings = timings
+        self.critical_path = critical_path
+
+class Pipeline:
+    """
+    Dependency-graph scheduler: every stage starts as soon as its own inputs are ready
+    instead of waiting for a whole fixed phase to finish.
+    """
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            missing = [dep for dep in stage.requires if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' requires unknown stages: {missing}")
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order = []
+        state = {}
+
+        def visit(name):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Pipeline has a cycle through '{name}'")
+            state[name] = "visiting"
+            for dep in self.stages[name].requires:
+                visit(dep)
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def required_for(self, targets):
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name].requires)
+        return [name for name in self.order if name in needed]
+
+    async def run(self, context, targets=None):
+        names = self.required_for(targets) if targets else list(self.order)
+        started = time.monotonic()
+        results = {}
+        timings = {}
+        tasks = {}
+
+        async def run_stage(stage):
+            if stage.requires:
+                await asyncio.gather(*(tasks[dep] for dep in stage.requires))
+            ready = time.monotonic() - started
+            timing = timings[stage.name] = {"ready": ready, "end": ready, "status": "ok"}
+
+            remaining = None if stage.budget is None else stage.budget - ready
+            if stage.optional and remaining is not None and remaining <= 0:
+                timing["status"] = "skipped"
+                results[stage.name] = None
+                logging.info(f"[Pipeline] Skipped '{stage.name}': budget of {stage.budget}s expired")
+                return
+
+            try:
+                if remaining is not None:
+                    results[stage.name] = await asyncio.wait_for(stage.func(context, results), timeout=remaining)
+                else:
+                    results[stage.name] = await stage.func(context, results)
+            except PipelineExit:
+                timing["status"] = "exit"
+                raise
+            except Exception as e:
+                if not stage.optional:
+                    timing["status"] = "failed"
+                    raise
+                timing["status"] = "timeout" if isinstance(e, asyncio.TimeoutError) else "failed"
+                results[stage.name] = None
+                logging.warning(f"[Pipeline] Optional stage '{stage.name}' {timing['status']}: {e}")
+            finally:
+                timing["end"] = time.monotonic() - started
+
+        # Tasks are created in topological order, so every dependency task already exists
+        for name in names:
+            tasks[name] = asyncio.create_task(run_stage(self.stages[name]))
+
+        try:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark sibling failures as retrieved; only the first one is re-raised
+                    task.exception()
+
+        return PipelineRun(results, timings, self.critical_path(names, timings))
+
+    def critical_path(self, names, timings):
+        """
+        Walks back from the last stage to finish, following at each step the dependency
+        that finished last (the one the stage was actually waiting on).
+        """
+        if not names:
+            return []
+        current = max(names, key=lambda name: timings[name]["end"])
+        path = []
+        while current is not None:
+            timing = timings[current]
+            path.append({"stage": current, "seconds": round(timing["end"] - timing["ready"], 4), "status": timing["status"]})
+            deps = [dep for dep in self.stages[current].requires if dep in timings]
+            current = max(deps, key=lambda dep: timings[dep]["end"]) if deps else None
+        return list(reversed(path))
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# Retry, hedging and circuit-breaker settings for orchestrator -> agent calls
+RETRY_ATTEMPTS = int(os.getenv("AGENT_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("AGENT_RETRY_BASE_DELAY", "0.1"))
+RETRY_MAX_DELAY = float(os.getenv("AGENT_RETRY_MAX_DELAY", "1.0"))
+HEDGE_PERCENTILE = float(os.getenv("AGENT_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("AGENT_HEDGE_MIN_DELAY", "0.05"))
+HEDGE_MIN_SAMPLES = int(os.getenv("AGENT_HEDGE_MIN_SAMPLES", "20"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("AGENT_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("AGENT_BREAKER_RESET_TIMEOUT", "30"))
+
+# Only these endpoints are safe to send twice; others (/generate, /speak, ...) are
+# retried only when the request never reached the agent, and never hedged
+IDEMPOTENT_PATHS = {"/run", "/query"}
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker: closed -> open after `failure_threshold` failures,
+    open -> half_open after `reset_timeout`, where a single probe decides the next state.
+    """
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+            self.probe_in_flight = False
+            logging.info(f"[Circuit Breaker] {self.name} half-open, probing")
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != "closed":
+            logging.info(f"[Circuit Breaker] {self.name} closed")
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def release_probe(self):
+        """
+        Gives up the half-open probe without an outcome (the call was cancelled or never
+        sent), so the next caller may probe instead.
+        """
+        if self.state == "half_open":
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logging.warning(f"[Circuit Breaker] {self.name} opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    @property
+    def is_open(self):
+        return self.state == "open"
+
+class LatencyTracker:
+    """
+    Sliding window of successful call latencies, used to pick the hedge delay.
+    """
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def hedge_delay(self):
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY, self.percentile(HEDGE_PERCENTILE))
+
+breakers = {}
+latencies = {}
+
+def agent_key(url):
+    parts = urlsplit(url)
+    return f"{parts.hostname}:{parts.port}"
+
+def get_breaker(agent):
+    if agent not in breakers:
+        breakers[agent] = CircuitBreaker(agent)
+    return breakers[agent]
+
+def get_tracker(agent):
+    if agent not in latencies:
+        latencies[agent] = LatencyTracker()
+    return latencies[agent]
+
+def is_retryable(error, idempotent=True):
+    if not idempotent:
+        # Connection refused or reset before sending: the agent never saw the request.
+        # A 429 is a refusal to do the work, so it is safe to repeat as well
+        return isinstance(error, aiohttp.ClientConnectorError) or (
+            isinstance(error, aiohttp.ClientResponseError) and error.status == 429)
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ValueError))
+
+def is_agent_failure(error):
+    # Whether the error says the agent is unhealthy, as opposed to the request being bad
+    return is_retryable(error, idempotent=True)
+
+def backoff_delay(attempt):
+    # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+async def post_once(session, url, data, timeout, tracker):
+    start = time.monotonic()
+    async with session.post(url, json=data, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        result = await response.json()
+    tracker.record(time.monotonic() - start)
+    return result
+
+async def hedged_post(session, url, data, timeout, tracker):
+    """
+    Sends the request, and if it has not answered within the agent's p95 latency,
+    sends a second copy. The first successful response wins; the other is cancelled.
+    """
+    hedge_delay = tracker.hedge_delay()
+    first = asyncio.create_task(post_once(session, url, data, timeout, tracker))
+    tasks = {first}
+    try:
+        if hedge_delay is None or hedge_delay >= timeout:
+            return await first
+
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if done:
+            return first.result()
+
+        logging.debug(f"[Hedge] {url} exceeded {hedge_delay:.3f}s, sending hedged request")
+        tasks.add(asyncio.create_task(post_once(session, url, data, timeout - hedge_delay, tracker)))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def resilient_post(session, url, data, timeout, idempotent=None):
+    """
+    POSTs to an agent within an overall `timeout` budget, failing fast while the
+    agent's circuit breaker is open. Idempotent calls (IDEMPOTENT_PATHS unless
+    `idempotent` says otherwise) are hedged and retried on transient failures with
+    jittered exponential backoff; other calls are retried only when the request could
+    not be delivered, so the agent never does the work twice.
+    """
+    agent = agent_key(url)
+    breaker = get_breaker(agent)
+    tracker = get_tracker(agent)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit open for {agent}")
+    # A half-open probe must settle the breaker, or release it, however this call ends
+    probing = breaker.state == "half_open"
+
+    if idempotent is None:
+        idempotent = urlsplit(url).path in IDEMPOTENT_PATHS
+    deadline = time.monotonic() + timeout
+    last_error = None
+    try:
+        for attempt in range(RETRY_ATTEMPTS):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                if idempotent:
+                    result = await hedged_post(session, url, data, remaining, tracker)
+                else:
+                    result = await post_once(session, url, data, remaining, tracker)
+                breaker.record_success()
+                probing = False
+                return result
+            except Exception as e:
+                if not is_agent_failure(e):
+                    # The agent answered, so it is up; the request itself is bad
+                    breaker.record_success()
+                    probing = False
+                    raise
+                breaker.record_failure()
+                probing = False
+                if not is_retryable(e, idempotent):
+                    raise
+                last_error = e
+                logging.warning(f"[Retry] Attempt {attempt + 1}/{RETRY_ATTEMPTS} for {url} failed: {e}")
+                if breaker.is_open or attempt == RETRY_ATTEMPTS - 1:
+                    break
+                await asyncio.sleep(min(backoff_delay(attempt), max(0.0, deadline - time.monotonic())))
+    finally:
+        if probing:
+            breaker.release_probe()
+
+    raise last_error or asyncio.TimeoutError(f"Budget of {timeout}s exhausted for {url}")
+
+def resilience_stats():
+    agents = set(breakers) | set(latencies)
+    return {
+        agent: {
+            "breaker": get_breaker(agent).state,
+            "consecutive_failures": get_breaker(agent).failures,
+            "p50_seconds": get_tracker(agent).percentile(50),
+            "p95_seconds": get_tracker(agent).percentile(95),
+            "samples": len(get_tracker(agent).samples),
+        }
+        for agent in sorted(agents)
+    }
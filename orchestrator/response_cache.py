@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+class ResponseCache:
+    """
+    Byte-bounded LRU cache of finished briefs with a TTL and a stale-while-revalidate
+    window: entries older than `ttl` are still served for up to `stale_ttl` more
+    seconds while a single background refresh replaces them. `accept(value)` decides
+    whether a refreshed value may replace the entry; a rejected one leaves it as is.
+    """
+    def __init__(self, max_bytes, ttl, stale_ttl, accept=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.accept = accept or (lambda value: True)
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def entry_size(value):
+        size = 0
+        for field in value.values():
+            if isinstance(field, str):
+                size += len(field)
+            elif isinstance(field, list):
+                size += sum(len(item or "") for item in field)
+        return size
+
+    def get(self, key, usable=None):
+        """
+        Returns (value, "fresh" | "stale"), or (None, "miss"). An entry that
+        `usable(value)` rejects (one this caller cannot serve) counts as a miss.
+        """
+        entry = self.entries.get(key)
+        if entry is None or (usable is not None and not usable(entry[0])):
+            self.misses += 1
+            return None, "miss"
+
+        value, size, stored_at = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            self._remove(key)
+            self.misses += 1
+            return None, "miss"
+
+        self.entries.move_to_end(key)
+        if age > self.ttl:
+            self.stale_hits += 1
+            return value, "stale"
+        self.hits += 1
+        return value, "fresh"
+
+    def put(self, key, value):
+        size = self.entry_size(value)
+        if size > self.max_bytes:
+            logging.info(f"[Response Cache] Entry of {size} bytes exceeds cache size, not cached")
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (value, size, time.monotonic())
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def revalidate(self, key, refresh):
+        """
+        Schedules `refresh()` (a coroutine function returning the new value, or None to
+        keep the old one) unless a refresh for `key` is already running. A value that
+        fails `accept` keeps the stale entry too.
+        """
+        if key in self.refreshing:
+            return
+
+        async def run():
+            try:
+                value = await refresh()
+                if value is not None and self.accept(value):
+                    self.put(key, value)
+                    logging.info(f"[Response Cache] Revalidated {key}")
+                elif value is not None:
+                    logging.warning(f"[Response Cache] Refresh for {key} returned an unusable brief, keeping the stale one")
+            except Exception as e:
+                logging.error(f"[Response Cache] Revalidation failed for {key}: {e}")
+            finally:
+                self.refreshing.pop(key, None)
+
+        self.refreshing[key] = asyncio.create_task(run())
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.total_bytes -= size
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refreshing": len(self.refreshing),
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
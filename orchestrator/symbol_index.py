@@ -0,0 +1,199 @@
+import csv
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from orchestrator.text_matcher import MultiPatternMatcher
+
+# Corporate suffixes dropped from company names to derive their spoken alias
+NAME_SUFFIXES = {"inc", "corp", "corporation", "co", "company", "ltd", "limited", "plc", "holdings", "group", "sa", "ag", "nv", "class", "a", "b"}
+MAX_PREFIX_LENGTH = 8
+MIN_PREFIX_LENGTH = 5
+# A partial word must cover most of the alias it completes: "nvid" no, "micro" for "microsoft" no
+MIN_PREFIX_COVERAGE = 0.6
+MIN_FUZZY_LENGTH = 5
+FUZZY_THRESHOLD = 0.7
+# Misspellings differ from the alias by a letter or two, not by whole words
+MAX_FUZZY_LENGTH_DIFFERENCE = 2
+
+def normalize(text):
+    text = re.sub(r"[^a-z0-9.&\-\s]", " ", text.lower())
+    # Keep dots inside symbols like 005930.ks, drop sentence/abbreviation dots
+    return " ".join(re.sub(r"\.(?=\s|$)", " ", text).split())
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SymbolIndex:
+    """
+    In-memory symbol universe. Exact aliases resolve through a dict, partial words through
+    a prefix index and misspellings through a trigram index scored by Dice similarity.
+    """
+    def __init__(self):
+        self.names = {}
+        self.aliases = {}
+        self.prefixes = defaultdict(set)
+        self.trigram_index = defaultdict(set)
+        self.alias_matcher = None
+
+    def add(self, symbol, name="", aliases=()):
+        symbol = symbol.strip().upper()
+        if not symbol:
+            return
+        if name:
+            self.names[symbol] = name
+        else:
+            self.names.setdefault(symbol, "")
+
+        candidates = set(aliases)
+        if name:
+            candidates.add(name)
+            words = normalize(name).split()
+            while words and words[-1] in NAME_SUFFIXES:
+                words.pop()
+            if words:
+                candidates.add(" ".join(words))
+
+        for alias in candidates:
+            alias = normalize(alias)
+            if not alias:
+                continue
+            self.aliases[alias] = symbol
+            self.alias_matcher = None
+            for length in range(MIN_PREFIX_LENGTH, min(len(alias), MAX_PREFIX_LENGTH) + 1):
+                self.prefixes[alias[:length]].add(alias)
+            for gram in trigrams(alias):
+                self.trigram_index[gram].add(alias)
+
+    def load_csv(self, path):
+        """
+        Loads `symbol,name,aliases` rows, with aliases separated by '|'.
+        """
+        count = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                aliases = [a for a in (row.get("aliases") or "").split("|") if a.strip()]
+                self.add(row["symbol"], row.get("name", ""), aliases)
+                count += 1
+        logging.info(f"[Symbol Index] Loaded {count} symbols from {path}")
+        return count
+
+    def has_symbol(self, symbol):
+        return symbol.upper() in self.names
+
+    def lookup(self, phrase):
+        return self.aliases.get(normalize(phrase))
+
+    def complete(self, prefix):
+        """
+        Returns the symbol when `prefix` completes to exactly one symbol, else None. The
+        prefix has to cover at least MIN_PREFIX_COVERAGE of the alias.
+        """
+        prefix = normalize(prefix)
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return None
+        matches = self.prefixes.get(prefix[:MAX_PREFIX_LENGTH], set())
+        symbols = {self.aliases[alias] for alias in matches
+                   if alias.startswith(prefix) and len(prefix) >= MIN_PREFIX_COVERAGE * len(alias)}
+        return symbols.pop() if len(symbols) == 1 else None
+
+    def fuzzy(self, term, threshold=FUZZY_THRESHOLD):
+        term = normalize(term)
+        if len(term) < MIN_FUZZY_LENGTH:
+            return None
+        grams = trigrams(term)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigram_index.get(gram, ()))
+        best, best_score = None, 0.0
+        for alias, overlap in shared.items():
+            if abs(len(alias) - len(term)) > MAX_FUZZY_LENGTH_DIFFERENCE:
+                continue
+            score = 2 * overlap / (len(grams) + len(trigrams(alias)))
+            if score > best_score:
+                best, best_score = alias, score
+        return self.aliases[best] if best is not None and best_score >= threshold else None
+
+    def resolve(self, text):
+        """
+        Finds company aliases in `text` in one pass (longest alias wins). Only when there
+        is no exact alias at all are the words tried as alias prefixes and then fuzzily, so
+        a guess never adds to (or masks the Yahoo fallback for) a query it has no part in.
+        Returns [(phrase, symbol), ...].
+        """
+        if self.alias_matcher is None:
+            # Rebuilt lazily after add(), so loading a universe builds the automaton once
+            self.alias_matcher = MultiPatternMatcher(self.aliases, whole_words=True)
+
+        text = normalize(text)
+        found = [(text[start:end], symbol) for start, end, symbol in self.alias_matcher.find_all(text)]
+        return found or self._resolve_words(text)
+
+    def _resolve_words(self, text):
+        found = []
+        for word in text.split():
+            symbol = self.complete(word) or self.fuzzy(word)
+            if symbol:
+                found.append((word, symbol))
+        return found
+
+class TickerSearchCache:
+    """
+    Persistent LRU + TTL cache of remote ticker searches, including misses (None),
+    stored as a small JSON file.
+    """
+    def __init__(self, path, max_entries=5000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for phrase, entry in json.load(f).items():
+                    self.entries[phrase] = entry
+            logging.info(f"[Ticker Cache] Loaded {len(self.entries)} entries from {self.path}")
+        except (OSError, ValueError) as e:
+            logging.error(f"[Ticker Cache] Failed to load {self.path}: {e}")
+
+    def get(self, phrase):
+        """
+        Returns (found, symbol); `found` is False when the phrase is unknown or expired.
+        """
+        entry = self.entries.get(phrase)
+        if entry is None:
+            return False, None
+        if time.time() - entry["at"] > self.ttl:
+            del self.entries[phrase]
+            self.dirty = True
+            return False, None
+        self.entries.move_to_end(phrase)
+        return True, entry["symbol"]
+
+    def put(self, phrase, symbol):
+        self.entries[phrase] = {"symbol": symbol, "at": time.time()}
+        self.entries.move_to_end(phrase)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty or not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            logging.error(f"[Ticker Cache] Failed to save {self.path}: {e}")
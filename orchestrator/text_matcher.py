@@ -0,0 +1,110 @@
+from collections import deque
+
+class MultiPatternMatcher:
+    """
+    Aho-Corasick automaton over a {pattern: value} table. Built once, it finds every
+    pattern in a single left-to-right pass over the text, so the cost is linear in the
+    text length plus the number of hits instead of patterns x text length.
+
+    Matches are leftmost-longest and non-overlapping. With `whole_words=True` a hit must
+    start and end on a word boundary.
+    """
+    def __init__(self, patterns, whole_words=False):
+        self.whole_words = whole_words
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for pattern, value in patterns.items():
+            if pattern:
+                self._insert(pattern, value)
+        self._link()
+
+    def _insert(self, pattern, value):
+        node = 0
+        for char in pattern:
+            nxt = self.goto[node].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = nxt
+        self.outputs[node] = [(len(pattern), value)]
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                # Inherit shorter patterns that end here through the failure link
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def _is_boundary(self, text, index):
+        return index < 0 or index >= len(text) or not text[index].isalnum()
+
+    def find_all(self, text):
+        """
+        Returns [(start, end, value), ...] for leftmost-longest non-overlapping hits.
+        """
+        hits = []
+        node = 0
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, value in outputs[node]:
+                start = end - length
+                if self.whole_words and not (self._is_boundary(text, start - 1) and self._is_boundary(text, end)):
+                    continue
+                hits.append((start, end, value))
+
+        hits.sort(key=lambda hit: (hit[0], hit[0] - hit[1]))
+        selected = []
+        position = 0
+        for start, end, value in hits:
+            if start >= position:
+                selected.append((start, end, value))
+                position = end
+        return selected
+
+    def replace(self, text):
+        parts = []
+        position = 0
+        for start, end, value in self.find_all(text):
+            parts.append(text[position:start])
+            parts.append(value)
+            position = end
+        parts.append(text[position:])
+        return "".join(parts)
+
+# Common STT corrections, shared by the orchestrator and the Streamlit transcription path
+STT_CORRECTIONS = {
+    "shared tech": "asia tech",
+    "shared text": "asia tech",
+    "text talks": "tech stocks",
+    "stalk": "stock",
+    "tesla.": "tesla",
+    "appy": "apple",
+    "stokes": "stocks",
+    "talk": "stock",
+    "surerning": "surprising",
+    "aca text talk": "asia tech stock",
+    "warning": "earning",
+    "asian": "asia",
+    "tatar": "tata",
+    "samsun": "samsung",
+    "appley": "apple"
+}
+
+STT_CORRECTOR = MultiPatternMatcher(STT_CORRECTIONS)
+
+def correct_transcript(text):
+    return STT_CORRECTOR.replace(text.lower())
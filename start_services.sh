@@ -22,9 +22,15 @@ uvicorn agents.retriever_agent:app --host 0.0.0.0 --port 8003 --timeout-keepaliv
 echo "Starting Orchestrator on port 8010"
 uvicorn orchestrator.app:app --host 0.0.0.0 --port 8010 --log-level debug &
 
-# Wait for critical services
+# Wait for critical services: the retriever reloads its snapshot, so poll instead of sleeping
 echo "Waiting for critical services to initialize..."
-sleep 45
+for i in $(seq 1 ${RETRIEVER_STARTUP_TIMEOUT:-120}); do
+    if curl -sf http://localhost:8003/health >/dev/null; then
+        echo "Retriever Agent ready after ${i}s"
+        break
+    fi
+    sleep 1
+done
 
 # Start other agents (optional, staggered to reduce memory spike)
 echo "Starting API Agent on port 8001"
@@ -37,6 +43,11 @@ uvicorn agents.scraping_agent:app --host 0.0.0.0 --port 8002 --log-level debug &
 
 sleep 2
 
+echo "Starting News Crawler"
+python -m data_ingestion.news_crawler &
+
+sleep 2
+
 echo "Starting Language Agent on port 8004"
 uvicorn agents.language_agent:app --host 0.0.0.0 --port 8004 --log-level debug &
 
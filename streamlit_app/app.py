@@ -1,10 +1,11 @@
 import streamlit as st
 import os
 import requests
-from utils import autoplay_audio, speech_to_text
+from utils import autoplay_audio, queue_audio_segment, speech_to_text
 from audio_recorder_streamlit import audio_recorder
 from streamlit_float import *
 import base64
+import json
 
 float_init()
 st.title("🤖 Multi Agent Finance Assistant")
@@ -46,28 +47,39 @@ if audio_bytes:
 if st.session_state.messages[-1]["role"] == "user":
     query = st.session_state.messages[-1]["content"]
     with st.chat_message("assistant"):
+        narrative_placeholder = st.empty()
+        narrative = ""
+        audio_segments = 0
+        complete = True
         with st.spinner("Processing..."):
             try:
-                res = requests.post("http://localhost:8010/process", json={"query": query}, timeout=90)
-                res.raise_for_status()
-                result = res.json()
-                narrative = result.get("narrative")
-                audio_base64 = result.get("audio_base64")
+                # Render the narrative and play each sentence's audio as soon as it arrives
+                with requests.post("http://localhost:8010/process/stream", json={"query": query}, stream=True, timeout=90) as res:
+                    res.raise_for_status()
+                    for line in res.iter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event["type"] == "narrative":
+                            narrative += event["delta"]
+                            narrative_placeholder.write(narrative)
+                        elif event["type"] == "audio" and event.get("audio_base64"):
+                            queue_audio_segment(event["audio_base64"])
+                            audio_segments += 1
+                        elif event["type"] == "done":
+                            narrative = event["narrative"]
+                            complete = event.get("complete", True)
+                        elif event["type"] == "error":
+                            narrative = event["narrative"]
             except Exception as e:
                 narrative = f"Failed to get response from backend: {e}"
-                audio_base64 = None
 
         st.session_state.messages.append({"role": "assistant", "content": narrative})
-        st.write(narrative)
+        narrative_placeholder.write(narrative)
 
-        if audio_base64:
-            audio_html = f"""
-            <audio autoplay>
-                <source src="data:audio/mp3;base64,{audio_base64}" type="audio/mp3">
-            </audio>
-            """
-            st.markdown(audio_html, unsafe_allow_html=True)
-        else:
+        if not complete:
+            st.warning("The response was cut off. Please ask again for the full brief.")
+        if not audio_segments:
             st.error("Audio generation failed. Please check the backend Voice Agent.")
 
 footer_container.float("bottom: 0rem;")
\ No newline at end of file
@@ -1,6 +1,8 @@
 import os
 import base64
+import requests
 import streamlit as st
+import streamlit.components.v1 as components
 import whisper
 import imageio_ffmpeg
 import subprocess
@@ -76,6 +78,18 @@ whisper.audio.load_audio = patched_load_audio
 whisper_model = whisper.load_model("base")
 print("[DEBUG] Whisper model loaded.")
 
+ORCHESTRATOR_URL = os.getenv("ORCHESTRATOR_URL", "http://localhost:8010")
+
+def correct_transcript(transcript):
+    # The correction table lives in the orchestrator, which applies it to every query anyway
+    try:
+        res = requests.post(f"{ORCHESTRATOR_URL}/correct", json={"text": transcript}, timeout=3)
+        res.raise_for_status()
+        return res.json()["text"]
+    except Exception as e:
+        print(f"[DEBUG] Transcript correction unavailable, showing raw text: {e}")
+        return transcript.lower()
+
 def speech_to_text(audio_data):
     print(f"[DEBUG] Transcribing audio file: {audio_data}")
     try:
@@ -86,16 +100,7 @@ def speech_to_text(audio_data):
 
         transcript = unicodedata.normalize("NFKD", transcript).encode("ascii", "ignore").decode("ascii")
 
-        corrections = {
-            "shared tech": "asia tech",
-            "shared text": "asia tech",
-            "text talks": "tech stocks",
-            "stalk": "stock",
-            "tesla.": "tesla"
-        }
-        transcript_lower = transcript.lower()
-        for wrong, right in corrections.items():
-            transcript_lower = transcript_lower.replace(wrong, right)
+        transcript_lower = correct_transcript(transcript)
         print(f"[DEBUG] Transcription result: {transcript_lower}")
         return transcript_lower
     except Exception as e:
@@ -111,4 +116,25 @@ def autoplay_audio(file_path: str):
         <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
     </audio>
     """
-    st.markdown(audio_html, unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown(audio_html, unsafe_allow_html=True)
+
+def queue_audio_segment(audio_base64: str):
+    """
+    Queues an mp3 segment to play after the segments already queued, so streamed
+    sentences play back-to-back. The queue lives on the parent page, not the iframe.
+    """
+    components.html(f"""
+    <script>
+    const host = window.parent;
+    const player = host.__briefPlayer = host.__briefPlayer || {{queue: [], playing: false}};
+    player.queue.push("data:audio/mp3;base64,{audio_base64}");
+    player.next = player.next || function () {{
+        if (player.playing || !player.queue.length) return;
+        player.playing = true;
+        const audio = new host.Audio(player.queue.shift());
+        audio.onended = audio.onerror = function () {{ player.playing = false; player.next(); }};
+        audio.play().catch(function () {{ player.playing = false; }});
+    }};
+    player.next();
+    </script>
+    """, height=0)
\ No newline at end of file
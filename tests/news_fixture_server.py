@@ -0,0 +1,62 @@
+"""
+Serves the saved news pages in tests/fixtures/news as if they were finance.yahoo.com,
+with ETags so conditional GETs get 304s. Pages missing from the directory are 404s.
+
+    python tests/news_fixture_server.py [port]
+    NEWS_BASE_URL=http://127.0.0.1:<port> python -m data_ingestion.news_crawler --once
+"""
+import contextlib
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "news")
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # /quote/TSM/news -> quote/TSM/news.html; /news/x.html as it is
+        path = os.path.normpath(self.path.split("?")[0].lstrip("/"))
+        if not path.endswith(".html"):
+            path += ".html"
+        file_path = os.path.join(FIXTURE_DIR, path)
+        if path.startswith("..") or not os.path.isfile(file_path):
+            self.send_error(404)
+            return
+        with open(file_path, "rb") as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@contextlib.contextmanager
+def serve(port=0):
+    """
+    Runs the server on a background thread; yields its base URL.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    with serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8765) as url:
+        print(f"Serving {FIXTURE_DIR} at {url}")
+        threading.Event().wait()
@@ -0,0 +1,32 @@
+import pytest
+
+from agents.earnings import extract_earnings_details
+
+@pytest.mark.parametrize("text", [
+    "Samsung shares traded below their 50-day moving average on Monday.",
+    "Samsung topped the smartphone shipment rankings in the third quarter.",
+    "Xiaomi lagged peers as Hong Kong tech stocks slipped.",
+    "TSMC trailed the broader index and closed short of its record high.",
+    "Alibaba shares rose ahead of earnings due on Thursday.",
+    "Xiaomi beat rivals to launch the first phone with the new chip.",
+])
+def test_price_and_ranking_sentences_are_not_surprises(text):
+    details = extract_earnings_details(text)
+    assert details["eps_surprise"] is None
+    assert details["revenue_surprise"] is None
+    assert details["summary"] == "no earnings data"
+
+def test_surprise_without_a_metric_is_not_filed_as_eps():
+    details = extract_earnings_details("The company beat analyst estimates by 4%.")
+    assert details["eps_surprise"] is None
+    assert details["summary"] == "no earnings data"
+
+def test_metric_surprises_are_kept():
+    details = extract_earnings_details("TSMC beat EPS estimates by 5%. Revenue fell short of expectations.")
+    assert details["eps_surprise"] == {"direction": "beat", "magnitude": "5%"}
+    assert details["revenue_surprise"] == {"direction": "miss", "magnitude": None}
+    assert details["summary"] == "beat earnings estimates by 5%"
+
+def test_topped_counts_only_next_to_an_estimate():
+    assert extract_earnings_details("Quarterly revenue topped consensus estimates.")["revenue_surprise"]["direction"] == "beat"
+    assert extract_earnings_details("Samsung topped smartphone sales rankings.")["revenue_surprise"] is None
@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from agents import analysis_agent
+from agents.exposure import ClassificationIndex, ExposureBook, Holdings
+from agents.indicators import IndicatorStore
+
+def test_todays_snapshot_follows_the_latest_prices(tmp_path):
+    book = ExposureBook(ClassificationIndex(), str(tmp_path), write_delay=0)
+    book.upload("p", [{"ticker": "TSM", "quantity": 10}])
+    closes = IndicatorStore()
+
+    # Priced before any close arrived, e.g. right after a restart
+    assert book.exposure("p", closes, day="2025-05-29")["total_value"] == 0
+    closes.push("TSM", 200.0, "2025-05-29")
+    assert book.exposure("p", closes, day="2025-05-29")["total_value"] == 2000
+    assert book.snapshots["p"]["2025-05-29"]["total"] == 2000
+
+    closes.push("TSM", 210.0, "2025-05-30")
+    exposure = book.exposure("p", closes, day="2025-05-30")
+    assert exposure["previous_date"] == "2025-05-29"
+    assert exposure["total_value"] == 2100
+
+    book.writer.shutdown(wait=True)
+    with open(os.path.join(str(tmp_path), "snapshots.json"), encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["p"]["2025-05-29"]["total"] == 2000
+    assert saved["p"]["2025-05-30"]["total"] == 2100
+
+@pytest.mark.parametrize("position", [
+    {"ticker": "TSM", "quantity": "ten"},
+    {"ticker": "TSM", "quantity": 10, "price": [1]},
+    {"ticker": "TSM", "quantity": float("nan")},
+    {"ticker": "TSM", "quantity": True},
+    "TSM",
+])
+def test_bad_positions_are_rejected(position):
+    with pytest.raises(ValueError):
+        Holdings.from_positions([position], ClassificationIndex())
+
+def test_numeric_strings_are_accepted():
+    holdings = Holdings.from_positions([{"ticker": "tsm", "quantity": "10", "price": "200.5"}], ClassificationIndex())
+    assert holdings.quantities.tolist() == [10.0]
+    assert holdings.prices.tolist() == [200.5]
+
+def test_holdings_upload_rejects_bad_quantities_with_422(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis_agent, "exposure_book", ExposureBook(ClassificationIndex(), str(tmp_path)))
+    response = TestClient(analysis_agent.app).post(
+        "/portfolio/holdings", json={"portfolio_id": "p", "holdings": [{"ticker": "TSM", "quantity": "ten"}]})
+    assert response.status_code == 422
+    assert "quantity" in response.json()["error"]
+    assert "p" not in analysis_agent.exposure_book.holdings
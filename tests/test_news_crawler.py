@@ -0,0 +1,62 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from data_ingestion import news_crawler
+from data_ingestion.news_store import NewsStore
+from news_fixture_server import serve
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="module")
+def crawled_store(tmp_path_factory):
+    """
+    Runs one `--once` crawl of TSM and 9988.HK against the fixture server; returns the store path.
+    """
+    store_path = str(tmp_path_factory.mktemp("crawler") / "news.sqlite3")
+    with serve() as base_url:
+        env = {**os.environ, "NEWS_BASE_URL": base_url, "NEWS_STORE_PATH": store_path,
+               "CRAWLER_SEED_TICKERS": "TSM,9988.HK"}
+        subprocess.run([sys.executable, "-m", "data_ingestion.news_crawler", "--once"],
+                       cwd=REPO_ROOT, env=env, check=True, timeout=60, capture_output=True)
+    return store_path
+
+def stored_news(store_path):
+    with sqlite3.connect(store_path) as conn:
+        return {ticker: json.loads(articles) for ticker, articles in conn.execute("SELECT ticker, articles FROM ticker_news")}
+
+def test_crawl_once_stores_article_snippets(crawled_store):
+    articles = stored_news(crawled_store)["TSM"]
+    assert [article["url"].rsplit("/", 1)[1] for article in articles] == [
+        "tsm-raises-capex-guidance-ai-demand-093000123.html",
+        "tsm-arizona-fab-second-phase-141500456.html",
+    ]
+    assert articles[0]["snippet"].startswith("Taiwan Semiconductor Manufacturing Co. raised")
+    assert articles[0]["snippet"].endswith("...")
+    assert "volume production of 3-nanometer chips" in articles[1]["snippet"]
+
+def test_crawl_once_skips_tickers_with_failed_articles(crawled_store):
+    # One 9988.HK article is a 404, so the ticker is left for the next cycle
+    assert "9988.HK" not in stored_news(crawled_store)
+
+def test_crawl_once_records_validators_for_revalidation(crawled_store):
+    with sqlite3.connect(crawled_store) as conn:
+        pages = dict(conn.execute("SELECT url, etag FROM pages WHERE extractor = 'scraper_links'"))
+    assert {url.split("/quote/")[1] for url in pages} == {"TSM/news", "9988.HK/news"}
+    assert all(etag for etag in pages.values())
+
+def test_failed_tickers_back_off_instead_of_staying_most_urgent(crawled_store, monkeypatch):
+    with sqlite3.connect(crawled_store) as conn:
+        failures = {ticker: count for ticker, count in conn.execute("SELECT ticker, failures FROM crawl_failures")}
+    assert failures == {"9988.HK": 1}
+
+    monkeypatch.setattr(news_crawler, "SEED_TICKERS", ["TSM", "9988.HK"])
+    store = NewsStore(crawled_store)
+    assert news_crawler.due_tickers(store) == []
+
+    store.clear_crawl_failures("9988.HK")
+    assert news_crawler.due_tickers(store) == ["9988.HK"]
@@ -0,0 +1,63 @@
+import asyncio
+
+import pandas as pd
+
+from agents.api_agent import latest_bar
+from data_ingestion.api_data_fetcher import OHLCVStore, fetch_alphavantage_bars, frame_to_bars, get_stored_stock_data
+
+def seoul_frame():
+    # YFinance stamps daily bars at local midnight in the exchange timezone
+    index = pd.DatetimeIndex(["2025-05-28", "2025-05-29"]).tz_localize("Asia/Seoul")
+    return pd.DataFrame({"Open": [55000.0, 56000.0], "High": [56500.0, 57000.0], "Low": [54800.0, 55500.0],
+                         "Close": [56000.0, 56800.0], "Volume": [1.2e7, 1.4e7]}, index=index)
+
+class FakeResponse:
+    def __init__(self, lines):
+        self.content = self.stream(lines)
+
+    @staticmethod
+    async def stream(lines):
+        for line in lines:
+            yield line.encode("utf-8") + b"\n"
+
+    def raise_for_status(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeSession:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def get(self, url, timeout=None):
+        return FakeResponse(self.lines)
+
+def test_latest_bar_uses_the_exchange_session_date(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    store.set_timezone("005930.KS", "Asia/Seoul")
+    store.append("005930.KS", frame_to_bars(seoul_frame()))
+    records = get_stored_stock_data(["005930.KS"], store=store)["005930.KS"]
+    assert latest_bar(records)["Date"] == "2025-05-29"
+    assert [str(record["Date"].date()) for record in records] == ["2025-05-28", "2025-05-29"]
+
+def test_exchange_timezone_comes_from_the_suffix_until_known(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    assert store.timezone("9988.HK") == "Asia/Hong_Kong"
+    assert store.timezone("TSM") == "America/New_York"
+    store.set_timezone("TSM", "America/Chicago")
+    assert OHLCVStore(str(tmp_path)).timezone("TSM") == "America/Chicago"
+
+def test_alpha_vantage_bars_replace_the_same_session(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    store.append("005930.KS", frame_to_bars(seoul_frame()))
+    session = FakeSession(["timestamp,open,high,low,close,adjusted_close,volume,dividend_amount,split_coefficient",
+                           "2025-05-29,56000,57200,55500,57000,57000,15000000,0,1"])
+    bars = asyncio.run(fetch_alphavantage_bars(session, "005930.KS", tz=store.timezone("005930.KS")))
+    store.append("005930.KS", bars)
+    records = get_stored_stock_data(["005930.KS"], store=store)["005930.KS"]
+    assert [str(record["Date"].date()) for record in records] == ["2025-05-28", "2025-05-29"]
+    assert records[-1]["Close"] == 57000.0
@@ -0,0 +1,46 @@
+import asyncio
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from orchestrator import resilience
+
+class FailingResponse:
+    def __init__(self, url):
+        self.url = url
+
+    async def __aenter__(self):
+        request = aiohttp.RequestInfo(URL(self.url), "POST", CIMultiDictProxy(CIMultiDict()), URL(self.url))
+        raise aiohttp.ClientResponseError(request, (), status=503)
+
+    async def __aexit__(self, *exc):
+        return False
+
+class CountingSession:
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append(url)
+        return FailingResponse(url)
+
+@pytest.fixture(autouse=True)
+def fresh_agents(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(resilience, "breakers", {})
+    monkeypatch.setattr(resilience, "latencies", {})
+
+@pytest.mark.parametrize("url, idempotent, attempts", [
+    ("http://localhost:8004/generate", None, 1),
+    ("http://localhost:8006/speak", None, 1),
+    ("http://localhost:8001/run", None, resilience.RETRY_ATTEMPTS),
+    ("http://localhost:8005/analyze", True, resilience.RETRY_ATTEMPTS),
+    ("http://localhost:8003/query", False, 1),
+])
+def test_only_idempotent_calls_are_retried(url, idempotent, attempts):
+    session = CountingSession()
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(resilience.resilient_post(session, url, {}, 5, idempotent))
+    assert len(session.posts) == attempts
@@ -0,0 +1,55 @@
+import hashlib
+import importlib
+import re
+import sys
+import types
+
+import numpy as np
+import pytest
+
+class HashedBagOfWords:
+    """
+    Deterministic stand-in for the sentence model: unit-normalised hashed word counts.
+    """
+    def __init__(self, name):
+        pass
+
+    def get_sentence_embedding_dimension(self):
+        return 64
+
+    def encode(self, texts, batch_size=32):
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, text in zip(vectors, texts):
+            for word in re.findall(r"\w+", text.lower()):
+                row[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1
+            row /= np.linalg.norm(row) or 1
+        return vectors
+
+@pytest.fixture
+def retriever(tmp_path, monkeypatch):
+    monkeypatch.setenv("RETRIEVER_DATA_DIR", str(tmp_path))
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=HashedBagOfWords))
+    sys.modules.pop("agents.retriever_agent", None)
+    module = importlib.import_module("agents.retriever_agent")
+    yield module
+    module.store.close()
+    sys.modules.pop("agents.retriever_agent", None)
+
+def add(retriever, texts):
+    retriever.store.add(retriever.model.encode(texts), texts, [f"doc-{i}" for i in range(len(texts))])
+
+def test_min_score_drops_lexical_only_hits_in_hybrid_mode(retriever):
+    add(retriever, [
+        "TSMC capex guidance raised",
+        "capex memo covering office chairs printers parking lunch travel badges",
+    ])
+    query = "TSMC capex guidance"
+    similarities = retriever.model.encode([query]) @ retriever.model.encode(["capex memo covering office chairs printers parking lunch travel badges"]).T
+    assert similarities[0, 0] < 0.5
+
+    unfiltered = retriever.retrieve([query], 5, mode="hybrid")[0]
+    assert len(unfiltered["chunks"]) == 2
+
+    result = retriever.retrieve([query], 5, min_score=0.5, mode="hybrid")[0]
+    assert result["retrieval"] == "hybrid"
+    assert result["chunks"] == ["TSMC capex guidance raised"]
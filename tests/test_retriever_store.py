@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+
+from agents.retriever_store import RetrieverStore
+
+def embeddings(count, dimension=8):
+    vectors = np.random.default_rng(count).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def current_snapshot(root):
+    with open(os.path.join(root, "CURRENT"), encoding="utf-8") as f:
+        return f.read().strip()
+
+def test_snapshot_after_link_only_changes_gets_a_new_generation(tmp_path):
+    root = str(tmp_path)
+    store = RetrieverStore(root, 8)
+    store.add(embeddings(2), ["Alpha chunk text.", "Beta chunk text."], ["a", "a"])
+    store.snapshot()
+    first = current_snapshot(root)
+
+    # Same chunk count, so a count-named snapshot would have replaced the live directory
+    assert store.link(["Alpha chunk text."], ["b"], {"b": ["TSM"]}) == 1
+    store.snapshot()
+    second = current_snapshot(root)
+    assert second != first
+    assert sorted(entry for entry in os.listdir(root) if entry.startswith("snapshot-")) == [second]
+    store.close()
+
+    reopened = RetrieverStore(root, 8)
+    assert len(reopened) == 2
+    assert reopened.filter_ids(sources=["b"]).tolist() == [0]
+    assert reopened.filter_ids(tickers=["TSM"]).tolist() == [0]
+    reopened.close()
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from orchestrator.symbol_index import SymbolIndex
+
+SYMBOLS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orchestrator", "symbols.csv")
+
+@pytest.fixture(scope="module")
+def index():
+    index = SymbolIndex()
+    index.load_csv(SYMBOLS_CSV)
+    return index
+
+@pytest.mark.parametrize("query", [
+    "micro caps rally",
+    "news on semiconductor companies",
+])
+def test_generic_words_resolve_to_nothing(index, query):
+    # Left unresolved so the Yahoo fallback still gets a chance
+    assert index.resolve(query) == []
+
+@pytest.mark.parametrize("query, symbol", [
+    ("microsoft earnings", "MSFT"),
+    ("microsft earnings", "MSFT"),
+    ("taiwan semiconductor results", "TSM"),
+])
+def test_aliases_and_misspellings(index, query, symbol):
+    assert [s for _, s in index.resolve(query)] == [symbol]
+
+def test_fuzzy_words_are_ignored_next_to_an_exact_alias(index):
+    assert [s for _, s in index.resolve("microsoft and semiconductr stocks")] == ["MSFT"]
+
+def test_prefix_must_cover_most_of_the_alias(index):
+    assert index.complete("micro") is None
+    assert index.complete("microso") == "MSFT"